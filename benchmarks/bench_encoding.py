@@ -0,0 +1,116 @@
+"""エンコーディング判定(EncodingUtil)のベンチマーク
+
+UTF-8、Shift_JIS、EUC-JP、ISO-2022-JPなどで保存した日本語テキストのコーパスに対して、
+ファイル全体をchardetで判定する方法、先頭8KBを毎回新しいchardetの判定器で判定する従来の方法、
+EncodingUtilの判定時間と、判定したエンコーディングで元のテキストを復元できた割合を計測します。
+
+    python benchmarks/bench_encoding.py --size 1024 --files 20
+"""
+import argparse
+import os
+import random
+import sys
+import time
+import warnings
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from chardet import UniversalDetector  # noqa: E402
+
+from corpus import make_japanese_text, random_words  # noqa: E402
+from file_util.util.encoding_util import EncodingUtil  # noqa: E402
+
+# (表示名, エンコーディング, 先頭のASCIIのみの部分のバイト数)
+# 先頭にASCIIのみの部分があるものは、英語のヘッダーが続いた後に日本語が現れるログを想定している
+ENCODINGS = [
+    ("utf-8", "utf-8", 0),
+    ("shift_jis", "shift_jis", 0),
+    ("euc-jp", "euc-jp", 0),
+    ("iso-2022-jp", "iso-2022-jp", 0),
+    ("utf-8-sig", "utf-8-sig", 0),
+    ("utf-16", "utf-16", 0),
+    ("ascii", "ascii", 0),
+    ("sjis/12KB hd", "shift_jis", 12 * 1024),
+    ("utf-8/12KB hd", "utf-8", 12 * 1024),
+]
+
+
+def chardet_full(data: bytes) -> str | None:
+    detector = UniversalDetector()
+    detector.feed(data)
+    detector.close()
+    return detector.result["encoding"]
+
+
+def chardet_sample(data: bytes) -> str | None:
+    # 変更前のFileUtilDocument.get_encoding_from_bytes
+    detector = UniversalDetector()
+    detector.feed(data[:8192])
+    detector.close()
+    return detector.result["encoding"]
+
+
+def make_corpus(size_kb: int, files: int) -> list[tuple[str, bytes, str]]:
+    corpus = []
+    for i in range(files):
+        label, encoding, ascii_head = ENCODINGS[i % len(ENCODINGS)]
+        rng = random.Random(i)
+        head = "".join(" ".join(random_words(rng, 12)) + "\n" for _ in range(ascii_head // 80))
+        if encoding == "ascii":
+            text = head + "".join(" ".join(random_words(rng, 12)) + "\n" for _ in range(size_kb * 1024 // 80))
+        else:
+            text = head + make_japanese_text(size_kb * 1024 // 2, seed=i)
+        corpus.append((label, text.encode(encoding), text))
+    return corpus
+
+
+def restored(data: bytes, encoding: str | None, text: str) -> bool:
+    if encoding is None:
+        return False
+    try:
+        return data.decode(encoding) == text
+    except (LookupError, UnicodeDecodeError):
+        return False
+
+
+def measure(func: Callable[[bytes], str | None], corpus: list[tuple[str, bytes, str]]) -> dict[str, tuple[float, int, int]]:
+    results: dict[str, tuple[float, int, int]] = {}
+    for label, data, text in corpus:
+        start = time.perf_counter()
+        detected = func(data)
+        elapsed = time.perf_counter() - start
+        total, correct, count = results.get(label, (0.0, 0, 0))
+        results[label] = (total + elapsed, correct + restored(data, detected, text), count + 1)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark encoding detection.")
+    parser.add_argument("--size", type=int, default=1024, help="Size of each file in KB.")
+    parser.add_argument("--files", type=int, default=27, help="Number of files. Encodings are assigned in rotation.")
+    parser.add_argument("--skip-full", action="store_true", help="Skip detecting the whole file with chardet (slow on large files).")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+
+    corpus = make_corpus(args.size, args.files)
+    cases: list[tuple[str, Callable[[bytes], str | None]]] = [("chardet 8KB (legacy)", chardet_sample), ("EncodingUtil", EncodingUtil.detect)]
+    if not args.skip_full:
+        cases.insert(0, ("chardet whole file", chardet_full))
+
+    print(f"sample size: {EncodingUtil.get_sample_size()} bytes, file size: {args.size} KB")
+    print(f"{'encoding':<14} " + " ".join(f"{name:>22}" for name, _ in cases))
+    measured = [measure(func, corpus) for _, func in cases]
+    for label, _, _ in ENCODINGS:
+        cells = []
+        for results in measured:
+            total, correct, count = results.get(label, (0.0, 0, 0))
+            if count:
+                cells.append(f"{total / count * 1000:>9.2f} ms {correct:>3}/{count:<3}   ")
+        print(f"{label:<14} " + " ".join(f"{cell:>22}" for cell in cells))
+    totals = [sum(total for total, _, _ in results.values()) for results in measured]
+    print(f"{'total':<14} " + " ".join(f"{total * 1000:>16.1f} ms    " for total in totals))
+
+
+if __name__ == "__main__":
+    main()
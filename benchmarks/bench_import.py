@@ -0,0 +1,94 @@
+"""サーバーのモジュールの読み込み時間のベンチマーク
+
+MCPサーバーはクライアントのセッションごとにstdioで起動されるため、モジュールの読み込み時間がそのまま応答の遅延になります。
+`python -X importtime`で各モジュールを新しいプロセスで読み込み、以下を確認します。
+
+* 読み込み時間(中央値)が予算を超えていないか
+* 初回の使用時に読み込むべきパーサー・モデル(magika、pdfminer、openpyxlなど)が起動時に読み込まれていないか
+
+いずれかに違反した場合は終了コード1で終了します。
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --repeat 10 --budget-ms file_util.mcp.mcp_server=2000
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+# モジュールごとの読み込み時間の予算(ミリ秒)
+DEFAULT_BUDGETS_MS = {
+    "file_util.core.app": 500,
+    "file_util.api.api_server": 1100,
+    "file_util.mcp.mcp_server": 2000,
+}
+
+# 起動時に読み込まれてはいけないパッケージ。各形式の初回の処理時に読み込む
+LAZY_PACKAGES = ("magika", "onnxruntime", "numpy", "pdfminer", "openpyxl", "docx", "pptx", "pyzipper", "bs4", "chardet")
+
+
+def import_once(module: str) -> tuple[float, dict[str, float]]:
+    """新しいプロセスでモジュールを読み込み、読み込み時間(ミリ秒)とモジュールごとの累積時間を返す"""
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [SRC_DIR, os.environ.get("PYTHONPATH", "")])))
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"Failed to import {module}: {completed.stderr.strip().splitlines()[-1]}")
+    cumulative: dict[str, float] = {}
+    for line in completed.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        cumulative[name.strip()] = int(cumulative_us) / 1000
+    return cumulative[module], cumulative
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark module import time of the servers.")
+    parser.add_argument("--modules", nargs="+", default=list(DEFAULT_BUDGETS_MS), help="Modules to import.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of measured imports per module after one warm-up import.")
+    parser.add_argument("--budget-ms", nargs="*", default=[], metavar="MODULE=MS", help="Override the import time budget of a module.")
+    parser.add_argument("--top", type=int, default=10, help="Number of the slowest imports to show per module.")
+    args = parser.parse_args()
+
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for item in args.budget_ms:
+        module, _, budget = item.partition("=")
+        budgets[module] = float(budget)
+
+    violations = []
+    for module in args.modules:
+        # 1回目は.pycの作成を含むため、計測から除外する
+        import_once(module)
+        runs = [import_once(module) for _ in range(args.repeat)]
+        median = statistics.median(elapsed for elapsed, _ in runs)
+        budget = budgets.get(module)
+        print(f"{module}: median {median:.1f} ms, min {min(elapsed for elapsed, _ in runs):.1f} ms"
+              + (f" (budget {budget:.0f} ms)" if budget else ""))
+
+        _, cumulative = runs[-1]
+        # 読み込まれたモジュールのうち、累積時間の長いもの(対象のモジュール自身を除く)
+        slowest = sorted(((ms, name) for name, ms in cumulative.items() if name != module), reverse=True)[:args.top]
+        for ms, name in slowest:
+            print(f"    {ms:8.1f} ms  {name}")
+
+        if budget and median > budget:
+            violations.append(f"{module}: import took {median:.1f} ms, budget {budget:.0f} ms")
+        eager = sorted({name.split(".")[0] for name in cumulative} & set(LAZY_PACKAGES))
+        if eager:
+            violations.append(f"{module}: imports {', '.join(eager)} at startup")
+
+    if violations:
+        print("\nViolations:")
+        for violation in violations:
+            print(f"  {violation}")
+        sys.exit(1)
+    print("\nAll modules are within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""テキスト正規化(TextNormalizer)のベンチマーク
+
+生成した抽出結果相当のテキストに対して、従来のsanitize_text(re.subを2回)と
+TextNormalizerの一括処理・ストリーミング処理、および任意の正規化を有効にした場合のMB/秒を計測します。
+
+    python benchmarks/bench_normalize.py --sizes 1 8 32 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from typing import Callable
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_extracted_text  # noqa: E402
+from file_util.util.normalize_util import TextNormalizer  # noqa: E402
+
+STREAM_CHUNK_CHARS = 64 * 1024
+
+
+def legacy_sanitize_text(text: str) -> str:
+    # 変更前のFileUtil.sanitize_text
+    if not text or len(text) == 0:
+        return ""
+    import re
+    text = re.sub(r'\n+', '\n', text)
+    text = re.sub(r' +', ' ', text)
+    return text
+
+
+def stream(normalizer: TextNormalizer, text: str) -> str:
+    output = [normalizer.feed(text[i:i + STREAM_CHUNK_CHARS]) for i in range(0, len(text), STREAM_CHUNK_CHARS)]
+    output.append(normalizer.flush())
+    return "".join(output)
+
+
+def measure(func: Callable[[str], str], text: str, repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark text normalization.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 8, 32], help="Input sizes in MB (characters / 2**20).")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of runs per input. The best time is reported.")
+    args = parser.parse_args()
+
+    cases: list[tuple[str, Callable[[str], str]]] = [
+        ("legacy sanitize_text", legacy_sanitize_text),
+        ("normalize", lambda text: TextNormalizer().normalize(text)),
+        ("stream 64K", lambda text: stream(TextNormalizer(), text)),
+        ("stream +nfkc", lambda text: stream(TextNormalizer(nfkc=True), text)),
+        ("stream +control", lambda text: stream(TextNormalizer(strip_control=True), text)),
+        ("stream +headers", lambda text: stream(TextNormalizer(remove_headers_footers=True), text)),
+    ]
+
+    print(f"{'MB':>4} {'case':<22} {'MB/s':>8} {'vs legacy':>10} {'same output':>12}")
+    for size in args.sizes:
+        text = make_extracted_text(size * 1024 * 1024, seed=size)
+        legacy_time, expected = measure(legacy_sanitize_text, text, args.repeat)
+        for name, func in cases:
+            elapsed, result = measure(func, text, args.repeat)
+            print(
+                f"{size:>4} {name:<22} {len(text) / 2 ** 20 / elapsed:>8.1f} "
+                f"{legacy_time / elapsed:>9.2f}x {str(result == expected):>12}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""PDF抽出モード(accurate/fast)のベンチマーク
+
+生成したPDFコーパスに対して、モードごとのページ/秒と、
+accurateモードの出力に対するfastモードの出力の類似度(単語列の一致率)を計測します。
+
+    python benchmarks/bench_pdf_modes.py --pages 20 100 --repeat 3
+"""
+import argparse
+import difflib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import make_pdf  # noqa: E402
+from file_util.util.pdf_util import PDFUtil  # noqa: E402
+
+
+def measure(filename: str, mode: str, repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    text = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = PDFUtil.extract_text_from_pdf(filename, max_workers=1, mode=mode)
+        best = min(best, time.perf_counter() - start)
+    return best, text
+
+
+def similarity(expected: str, actual: str) -> float:
+    return difflib.SequenceMatcher(None, expected.split(), actual.split(), autojunk=False).ratio()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark PDF extraction modes.")
+    parser.add_argument("--pages", type=int, nargs="+", default=[10, 50], help="Page counts of the generated PDFs.")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of runs per file. The best time is reported.")
+    args = parser.parse_args()
+
+    print(f"{'pages':>6} {'accurate p/s':>13} {'fast p/s':>10} {'speedup':>8} {'similarity':>11}")
+    with tempfile.TemporaryDirectory() as work_dir:
+        for pages in args.pages:
+            filename = os.path.join(work_dir, f"corpus_{pages}.pdf")
+            make_pdf(filename, pages, seed=pages)
+            accurate_time, accurate_text = measure(filename, PDFUtil.MODE_ACCURATE, args.repeat)
+            fast_time, fast_text = measure(filename, PDFUtil.MODE_FAST, args.repeat)
+            print(
+                f"{pages:>6} {pages / accurate_time:>13.1f} {pages / fast_time:>10.1f} "
+                f"{accurate_time / fast_time:>7.1f}x {similarity(accurate_text, fast_text):>11.3f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
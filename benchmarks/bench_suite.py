@@ -0,0 +1,223 @@
+"""抽出処理のベンチマークスイート
+
+生成したコーパス(docx、pptx、xlsx、PDF、HTML、Markdown、ZIP、Shift_JIS・EUC-JPなどのテキスト)に対して、
+抽出処理・種類の判定・Excelの入出力・ZIPの作成と展開の性能を計測します。
+ケースごとに別のプロセスで実行し、以下を出力します。
+
+* レイテンシのパーセンタイル(p50、p95、最大)
+* スループット(入力のMB/秒)
+* ピークRSSと、処理の実行前(モジュールの読み込み後)からの増加分
+
+保存したベースラインと比較し、しきい値を超えて遅く(または大きく)なったケースがあれば終了コード1で終了します。
+
+    # ベースラインを保存する
+    python benchmarks/bench_suite.py --sizes small medium --save-baseline benchmarks/baseline.json
+    # ベースラインと比較する
+    python benchmarks/bench_suite.py --sizes small medium --baseline benchmarks/baseline.json
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from corpus import CORPUS_SIZES, build_corpus  # noqa: E402
+
+# 既定のしきい値。ベースラインに保存し、比較時にはベースラインの値を使用する
+DEFAULT_THRESHOLDS = {"p50_ms": 0.25, "p95_ms": 0.5, "peak_rss_mb": 0.25}
+# 増加量がこの値未満の場合は、割合がしきい値を超えても回帰とみなさない(計測誤差)
+MIN_REGRESSION = {"p50_ms": 10.0, "p95_ms": 20.0, "peak_rss_mb": 8.0}
+
+# 抽出処理を呼び出し元のプロセスで実行し、キャッシュを無効にして毎回抽出させる
+CASE_ENV = {
+    "ENABLE_EXTRACTION_CACHE": "false",
+    "EXTRACTOR_EXECUTOR_MODE": "inline",
+    "PDF_MAX_WORKERS": "1",
+    "TEXT_CHUNK_CACHE_MAX_BYTES": "0",
+    "LOGLEVEL": "WARNING",
+}
+
+
+def max_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linuxはキロバイト、macOSはバイト単位
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def build_operation(spec: dict, work_dir: str):
+    """計測する処理を引数なしの関数として返す"""
+    import asyncio
+    from file_util.model import FileUtilDocument
+    from file_util.util.excel_util import ExcelUtil
+    from file_util.util.file_util import FileUtil
+    from file_util.util.zip_util import ZipUtil
+
+    op, path = spec["op"], spec.get("path", "")
+    loop = asyncio.new_event_loop()
+    if op == "extract":
+        return lambda: loop.run_until_complete(FileUtil.extract_text_from_file_async(path))
+    if op == "extract_zip_text":
+        async def extract_zip_text():
+            return [result async for result in FileUtil.extract_text_from_zip_async(path)]
+        return lambda: loop.run_until_complete(extract_zip_text())
+    if op == "detect":
+        return lambda: FileUtilDocument.from_file(path).mime_type
+    if op == "excel_import":
+        return lambda: ExcelUtil.import_data_from_excel(path, "Sheet1")
+    if op == "excel_export":
+        from corpus import make_xlsx_rows
+        rows = make_xlsx_rows(spec["rows"])
+        output = os.path.join(work_dir, "export.xlsx")
+        return lambda: ExcelUtil.export_data_to_excel(rows, output)
+    if op == "zip_create":
+        output = os.path.join(work_dir, "create.zip")
+        return lambda: ZipUtil.create_zip(spec["members"], output, compression="deflated")
+    if op == "zip_extract":
+        output = os.path.join(work_dir, "extract")
+        return lambda: ZipUtil.extract_zip(path, output)
+    raise ValueError(f"Unknown operation: {op}")
+
+
+def run_case(spec: dict) -> dict:
+    """1ケースを計測する。子プロセスで実行される"""
+    with tempfile.TemporaryDirectory() as work_dir:
+        operation = build_operation(spec, work_dir)
+        rss_before = max_rss_mb()
+        # 1回目はモデルの読み込みなどを含むため、計測から除外する
+        operation()
+        latencies = []
+        for _ in range(spec["repeat"]):
+            start = time.perf_counter()
+            operation()
+            latencies.append((time.perf_counter() - start) * 1000)
+        peak = max_rss_mb()
+        return {"latencies_ms": latencies, "peak_rss_mb": peak, "rss_growth_mb": peak - rss_before}
+
+
+def percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def list_cases(corpus: list[tuple[str, str, str]]) -> list[dict]:
+    cases = []
+    for kind, size, path in corpus:
+        op = "extract_zip_text" if kind == "zip" else "extract"
+        cases.append({"name": f"{op}:{kind}:{size}", "op": op, "path": path})
+        cases.append({"name": f"detect:{kind}:{size}", "op": "detect", "path": path})
+        if kind == "xlsx":
+            cases.append({"name": f"excel_import:{size}", "op": "excel_import", "path": path})
+            cases.append({"name": f"excel_export:{size}", "op": "excel_export", "rows": CORPUS_SIZES[size]["xlsx"] // 2})
+        if kind == "zip":
+            members = [member for member_kind, member_size, member in corpus if member_size == size and member_kind != "zip"]
+            cases.append({"name": f"zip_create:{size}", "op": "zip_create", "members": members})
+            cases.append({"name": f"zip_extract:{size}", "op": "zip_extract", "path": path})
+    return cases
+
+
+def measure(case: dict, repeat: int) -> dict:
+    spec = dict(case, repeat=repeat)
+    env = dict(os.environ, **CASE_ENV)
+    completed = subprocess.run([sys.executable, os.path.abspath(__file__), "--run-case", json.dumps(spec)],
+                               env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return {"error": completed.stderr.strip().splitlines()[-1] if completed.stderr.strip() else "failed"}
+    raw = json.loads(completed.stdout.strip().splitlines()[-1])
+    latencies = raw["latencies_ms"]
+    input_paths = case.get("members") or ([case["path"]] if "path" in case else [])
+    input_bytes = sum(os.path.getsize(path) for path in input_paths)
+    p50 = percentile(latencies, 50)
+    return {
+        "p50_ms": round(p50, 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "max_ms": round(max(latencies), 3),
+        "mb_per_s": round(input_bytes / (1024 * 1024) / (p50 / 1000), 3) if input_bytes and p50 > 0 else None,
+        "peak_rss_mb": round(raw["peak_rss_mb"], 1),
+        "rss_growth_mb": round(raw["rss_growth_mb"], 1),
+        "input_bytes": input_bytes,
+    }
+
+
+def compare(results: dict, baseline: dict) -> list[str]:
+    thresholds = dict(DEFAULT_THRESHOLDS, **baseline.get("thresholds", {}))
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None or "error" in result or "error" in base:
+            continue
+        for metric, threshold in thresholds.items():
+            current, previous = result.get(metric), base.get(metric)
+            if current is None or previous is None:
+                continue
+            if current > previous * (1 + threshold) and current - previous >= MIN_REGRESSION.get(metric, 0):
+                regressions.append(f"{name}: {metric} {previous} -> {current} (+{(current / max(previous, 1e-9) - 1) * 100:.0f}%, threshold {threshold * 100:.0f}%)")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the extraction benchmark suite.")
+    parser.add_argument("--sizes", nargs="+", default=["small", "medium"], choices=["small", "medium", "large"], help="Corpus sizes to generate and measure.")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of measured runs per case after one warm-up run.")
+    parser.add_argument("--filter", default="", help="Only run cases whose name contains this string.")
+    parser.add_argument("--corpus-dir", default="", help="Directory to generate the corpus in. A temporary directory if not specified.")
+    parser.add_argument("--baseline", default="", help="Baseline JSON to compare against. Exits with 1 if a case regressed beyond its threshold.")
+    parser.add_argument("--save-baseline", default="", help="Save the results as a baseline JSON.")
+    parser.add_argument("--output", default="", help="Save the results as JSON.")
+    parser.add_argument("--run-case", default="", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_case:
+        print(json.dumps(run_case(json.loads(args.run_case))))
+        return
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        corpus_dir = args.corpus_dir or temp_dir
+        corpus = build_corpus(corpus_dir, args.sizes)
+        cases = [case for case in list_cases(corpus) if args.filter in case["name"]]
+
+        print(f"{'case':<32} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10} {'MB/s':>8} {'RSS MB':>8} {'+RSS MB':>8}")
+        results = {}
+        for case in cases:
+            result = measure(case, args.repeat)
+            results[case["name"]] = result
+            if "error" in result:
+                print(f"{case['name']:<32} error: {result['error']}")
+                continue
+            mb_per_s = f"{result['mb_per_s']:.2f}" if result["mb_per_s"] is not None else "-"
+            print(f"{case['name']:<32} {result['p50_ms']:>10.2f} {result['p95_ms']:>10.2f} {result['max_ms']:>10.2f} "
+                  f"{mb_per_s:>8} {result['peak_rss_mb']:>8.1f} {result['rss_growth_mb']:>8.1f}")
+
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "thresholds": DEFAULT_THRESHOLDS,
+        "cases": results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""ベンチマーク用の合成ドキュメントを生成するモジュール
+
+乱数のシードを固定しているため、同じ引数からは常に同じ内容のファイルが生成されます。
+"""
+import random
+
+WORDS = (
+    "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+    "incididunt ut labore et dolore magna aliqua enim ad minim veniam quis nostrud "
+    "exercitation ullamco laboris nisi aliquip ex ea commodo consequat"
+).split()
+
+
+def random_words(rng: random.Random, count: int) -> list[str]:
+    return [rng.choice(WORDS) for _ in range(count)]
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _pdf_page_content(rng: random.Random, page_index: int, lines: int) -> str:
+    # ページごとにレイアウトを変えて、抽出モードの差が出やすいようにする
+    layout = page_index % 3
+    ops = ["BT", "/F1 10 Tf", "12 TL"]
+    if layout == 0:
+        # 1段組。行ごとに ' で改行
+        ops.append("50 780 Td")
+        for _ in range(lines):
+            ops.append(f"({_pdf_escape(' '.join(random_words(rng, 10)))}) '")
+    elif layout == 1:
+        # 2段組。左の段を書いてから右の段を書く
+        for column_x in (50, 320):
+            ops.append(f"1 0 0 1 {column_x} 780 Tm")
+            for _ in range(lines):
+                ops.append(f"({_pdf_escape(' '.join(random_words(rng, 5)))}) '")
+    else:
+        # 単語ごとにTJの字間調整で区切る
+        ops.append("50 780 Td")
+        for _ in range(lines):
+            parts = " -350 ".join(f"({_pdf_escape(word)})" for word in random_words(rng, 10))
+            ops.append(f"[{parts}] TJ 0 -12 Td")
+    ops.append("ET")
+    return "\n".join(ops)
+
+
+def make_pdf(path: str, pages: int, lines: int = 40, seed: int = 0) -> None:
+    """テキストのみのPDFを生成する
+
+    Args:
+        path: 出力先のファイルパス
+        pages: ページ数
+        lines: 1ページあたりの行数
+        seed: 乱数のシード
+    """
+    rng = random.Random(seed)
+    objects: list[bytes] = [b"<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + i * 2} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>".encode())
+    font_id = 3 + pages * 2
+    for i in range(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + i * 2} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>".encode()
+        )
+        content = _pdf_page_content(rng, i, lines).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n" % len(content) + content + b"\nendstream")
+    objects.append(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + obj + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def make_extracted_text(size: int, seed: int = 0, page_lines: int = 40) -> str:
+    """抽出結果に近いテキストを生成する
+
+    空白・改行の連続、ヘッダー・フッター、改ページ文字を含むテキストを約size文字生成します。
+    """
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    page = 0
+    while length < size:
+        page += 1
+        lines = ["Annual Report 2024", ""]
+        for _ in range(page_lines):
+            words = random_words(rng, rng.randint(4, 12))
+            spaces = [" " * rng.choice((1, 1, 1, 2, 4)) for _ in words]
+            lines.append("".join(word + space for word, space in zip(words, spaces)))
+            lines.extend([""] * rng.choice((0, 0, 1, 3)))
+        lines.append(f"Page {page}")
+        text = "\n".join(lines) + "\n\f"
+        parts.append(text)
+        length += len(text)
+    return "".join(parts)
+
+
+JAPANESE_WORDS = (
+    "日本語 文書 抽出 処理 ファイル 検索 結果 会議 資料 報告 売上 計画 担当 確認 変更 対応 "
+    "システム データ サーバー 設定 は が を に で と の です ます した。 する。 について、 による"
+).split()
+
+
+def make_japanese_text(size: int, seed: int = 0, ascii_ratio: float = 0.2) -> str:
+    """日本語と英数字が混在するテキストを約size文字生成する
+
+    Shift_JIS、EUC-JPで表現できる文字のみを使用します。
+    """
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    while length < size:
+        words = [rng.choice(WORDS) + " " if rng.random() < ascii_ratio else rng.choice(JAPANESE_WORDS)
+                 for _ in range(rng.randint(8, 30))]
+        line = "".join(words) + "\n"
+        parts.append(line)
+        length += len(line)
+    return "".join(parts)
+
+
+def _sentence(rng: random.Random, japanese: bool = False) -> str:
+    if japanese:
+        return "".join(rng.choice(JAPANESE_WORDS) for _ in range(rng.randint(8, 20)))
+    return " ".join(random_words(rng, rng.randint(6, 18))).capitalize() + "."
+
+
+def make_docx(path: str, paragraphs: int, seed: int = 0) -> None:
+    """見出し・段落・表を含むdocxを生成する"""
+    from docx import Document
+    rng = random.Random(seed)
+    document = Document()
+    for i in range(paragraphs):
+        if i % 20 == 0:
+            document.add_heading(_sentence(rng), level=1)
+        document.add_paragraph(" ".join(_sentence(rng, japanese=i % 5 == 0) for _ in range(3)))
+        if i % 50 == 49:
+            table = document.add_table(rows=5, cols=4)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = " ".join(random_words(rng, 3))
+    document.save(path)
+
+
+def make_pptx(path: str, slides: int, seed: int = 0) -> None:
+    """タイトルと箇条書きのスライドからなるpptxを生成する"""
+    from pptx import Presentation
+    rng = random.Random(seed)
+    presentation = Presentation()
+    layout = presentation.slide_layouts[1]
+    for i in range(slides):
+        slide = presentation.slides.add_slide(layout)
+        slide.shapes.title.text = _sentence(rng)
+        body = slide.placeholders[1].text_frame
+        body.text = _sentence(rng, japanese=i % 3 == 0)
+        for _ in range(5):
+            body.add_paragraph().text = _sentence(rng)
+    presentation.save(path)
+
+
+def make_xlsx_rows(rows: int, seed: int = 0) -> list[list]:
+    """xlsxに書き込む行データ(見出し行を含む)を生成する"""
+    rng = random.Random(seed)
+    data: list[list] = [["id", "name", "category", "amount", "note"]]
+    for i in range(rows):
+        data.append([i, " ".join(random_words(rng, 2)), rng.choice(JAPANESE_WORDS), round(rng.random() * 10000, 2), _sentence(rng)])
+    return data
+
+
+def make_xlsx(path: str, rows: int, seed: int = 0, sheets: int = 2) -> None:
+    """数値と文字列が混在する複数シートのxlsxを生成する"""
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    for index in range(sheets):
+        sheet = workbook.create_sheet(f"Sheet{index + 1}")
+        for row in make_xlsx_rows(rows // sheets, seed=seed + index):
+            sheet.append(row)
+    workbook.save(path)
+
+
+def make_html(path: str, size: int, seed: int = 0) -> None:
+    """見出し・段落・表・スクリプトを含むHTMLを約sizeバイト生成する"""
+    rng = random.Random(seed)
+    parts = ["<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Report</title>",
+             "<style>td { padding: 2px; }</style><script>var data = {\"a\": 1};</script></head><body>"]
+    length = sum(len(part) for part in parts)
+    section = 0
+    while length < size:
+        section += 1
+        rows = "".join(f"<tr><td>{i}</td><td>{' '.join(random_words(rng, 3))}</td><td>{rng.random():.4f}</td></tr>" for i in range(10))
+        part = (f"<h2>Section {section}</h2><p>{_sentence(rng)} <a href=\"/doc/{section}\">{_sentence(rng)}</a> &amp; "
+                f"{_sentence(rng, japanese=True)}</p><table>{rows}</table>\n")
+        parts.append(part)
+        length += len(part.encode("utf-8"))
+    parts.append("</body></html>")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+
+
+def make_markdown(path: str, size: int, seed: int = 0) -> None:
+    """見出し・リスト・コードブロック・表・リンクを含むMarkdownを約sizeバイト生成する"""
+    rng = random.Random(seed)
+    parts = []
+    length = 0
+    section = 0
+    while length < size:
+        section += 1
+        part = (
+            f"## Section {section}\n\n{_sentence(rng)} **{' '.join(random_words(rng, 2))}** and "
+            f"[{' '.join(random_words(rng, 2))}](https://example.com/{section}).\n\n"
+            f"- {_sentence(rng)}\n- {_sentence(rng, japanese=True)}\n\n"
+            f"```python\nvalue = {section}\n```\n\n| a | b |\n|---|---|\n| {section} | {rng.random():.3f} |\n\n"
+        )
+        parts.append(part)
+        length += len(part.encode("utf-8"))
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("".join(parts))
+
+
+def make_text(path: str, size: int, encoding: str, seed: int = 0) -> None:
+    """日本語と英数字が混在するテキストを指定のエンコーディングで約sizeバイト生成する"""
+    # 日本語の文字は多くのエンコーディングで2バイト以上になるため、文字数はバイト数の半分を目安にする
+    text = make_japanese_text(size // 2, seed=seed)
+    with open(path, "wb") as f:
+        f.write(text.encode(encoding))
+
+
+def make_zip(path: str, member_paths: list[str]) -> None:
+    """ファイルをまとめたZIPを生成する"""
+    import os
+    import zipfile
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        for member_path in member_paths:
+            archive.write(member_path, os.path.basename(member_path))
+
+
+# コーパスのサイズごとの生成パラメーター
+CORPUS_SIZES: dict[str, dict[str, int]] = {
+    "small": {"docx": 40, "pptx": 5, "xlsx": 500, "pdf": 2, "html": 32 * 1024, "md": 16 * 1024, "txt": 16 * 1024},
+    "medium": {"docx": 400, "pptx": 40, "xlsx": 10000, "pdf": 20, "html": 1024 * 1024, "md": 512 * 1024, "txt": 1024 * 1024},
+    "large": {"docx": 4000, "pptx": 300, "xlsx": 100000, "pdf": 100, "html": 16 * 1024 * 1024, "md": 8 * 1024 * 1024, "txt": 16 * 1024 * 1024},
+}
+
+# テキストファイルを生成するエンコーディング
+CORPUS_TEXT_ENCODINGS = ("utf-8", "shift_jis", "euc-jp")
+
+
+def build_corpus(directory: str, sizes: list[str], seed: int = 0) -> list[tuple[str, str, str]]:
+    """ベンチマーク用のコーパスを生成する
+
+    同じ引数からは常に同じ内容のファイルを生成します。生成済みのファイルは作り直しません。
+
+    Args:
+        directory: 出力先のディレクトリ
+        sizes: 生成するサイズ。CORPUS_SIZESのキー
+        seed: 乱数のシード
+
+    Returns:
+        list[tuple[str, str, str]]: (種類, サイズ, ファイルパス)のリスト
+    """
+    import os
+    os.makedirs(directory, exist_ok=True)
+    corpus = []
+
+    def add(kind: str, size: str, filename: str, make) -> str:
+        path = os.path.join(directory, filename)
+        if not os.path.exists(path):
+            make(path)
+        corpus.append((kind, size, path))
+        return path
+
+    for size in sizes:
+        params = CORPUS_SIZES[size]
+        docx = add("docx", size, f"{size}.docx", lambda p: make_docx(p, params["docx"], seed))
+        add("pptx", size, f"{size}.pptx", lambda p: make_pptx(p, params["pptx"], seed))
+        add("xlsx", size, f"{size}.xlsx", lambda p: make_xlsx(p, params["xlsx"], seed))
+        pdf = add("pdf", size, f"{size}.pdf", lambda p: make_pdf(p, params["pdf"], seed=seed))
+        html = add("html", size, f"{size}.html", lambda p: make_html(p, params["html"], seed))
+        add("md", size, f"{size}.md", lambda p: make_markdown(p, params["md"], seed))
+        texts = [
+            add(f"txt-{encoding}", size, f"{size}-{encoding}.txt", lambda p, e=encoding: make_text(p, params["txt"], e, seed))
+            for encoding in CORPUS_TEXT_ENCODINGS
+        ]
+        add("zip", size, f"{size}.zip", lambda p: make_zip(p, [docx, pdf, html, *texts]))
+    return corpus
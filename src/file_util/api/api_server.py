@@ -1,25 +1,69 @@
-from fastapi import FastAPI, APIRouter
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, APIRouter, Request
 
 from file_util.core.app import (
     get_document_type,
     get_mime_type,
+    get_mime_types,
     get_sheet_names,
     extract_excel_sheet,
     extract_text_from_file,
     extract_base64_to_text,
     extract_text_from_file,
+    extract_text_from_pdf,
+    get_text_chunk,
+    get_cache_stats,
+    get_extraction_stats,
+    metrics,
+    extract_text_from_file_stream,
+    extract_text_from_upload,
+    extract_texts_from_paths,
+    extract_texts_from_paths_stream,
+    extract_texts_from_directory,
+    extract_texts_from_directory_stream,
+    extract_text_from_zip,
+    extract_text_from_zip_stream,
     list_zip_contents,
     extract_zip,
     create_zip,
     export_data_to_excel,
+    export_sheets_to_excel,
+    export_ndjson_to_excel,
     import_data_from_excel,
+    import_data_page_from_excel,
 )
-app = FastAPI()
+from file_util.config.file_util_config import FileUtilConfig
+from file_util.util.file_util import FileUtil
+from file_util.util.metrics_util import FileUtilMetrics
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # リクエストを受け付けながら、パーサーとMagikaのモデルを読み込んでおく
+    if FileUtilConfig().warm_up_on_start:
+        FileUtil.start_warm_up()
+    yield
+
+app = FastAPI(lifespan=lifespan)
 router = APIRouter()
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    # ストリーミングレスポンスはレスポンスの送信開始までの時間を記録する
+    start = time.perf_counter()
+    with FileUtilMetrics.track_in_flight("http_request"):
+        response = await call_next(request)
+    route = request.scope.get("route")
+    FileUtilMetrics.observe_http_request(getattr(route, "path", "unmatched"), response.status_code, time.perf_counter() - start)
+    return response
+
 # get_document_type
 router.add_api_route(path='/get_document_type', endpoint=get_document_type, methods=['GET'])
 # get_mime_type
 router.add_api_route(path='/get_mime_type', endpoint=get_mime_type, methods=['GET'])
+# get_mime_types
+router.add_api_route(path='/get_mime_types', endpoint=get_mime_types, methods=['POST'])
  
 # get_sheet_names
 router.add_api_route(path='/get_sheet_names', endpoint=get_sheet_names, methods=['GET'])
@@ -29,12 +73,42 @@ router.add_api_route(path='/extract_excel_sheet', endpoint=extract_excel_sheet,
 # extract_text_from_file
 router.add_api_route(path='/extract_text_from_file', endpoint=extract_text_from_file, methods=['POST'])
 
+# get_text_chunk
+router.add_api_route(path='/get_text_chunk', endpoint=get_text_chunk, methods=['POST'])
+
+# extract_text_from_file_stream
+router.add_api_route(path='/extract_text_from_file_stream', endpoint=extract_text_from_file_stream, methods=['POST'])
+
 # extract_base64_to_text
 router.add_api_route(path='/extract_base64_to_text', endpoint=extract_base64_to_text, methods=['GET'])
+# extract_text_from_upload
+router.add_api_route(path='/extract_text_from_upload', endpoint=extract_text_from_upload, methods=['POST'])
 
 # extract_text_from_file
 router.add_api_route(path='/extract_text_from_file', endpoint=extract_text_from_file, methods=['POST'])
 
+# extract_text_from_pdf
+router.add_api_route(path='/extract_text_from_pdf', endpoint=extract_text_from_pdf, methods=['POST'])
+
+# get_cache_stats
+router.add_api_route(path='/get_cache_stats', endpoint=get_cache_stats, methods=['GET'])
+# get_extraction_stats
+router.add_api_route(path='/get_extraction_stats', endpoint=get_extraction_stats, methods=['GET'])
+
+# extract_texts_from_paths
+router.add_api_route(path='/extract_texts_from_paths', endpoint=extract_texts_from_paths, methods=['POST'])
+# extract_texts_from_paths_stream
+router.add_api_route(path='/extract_texts_from_paths_stream', endpoint=extract_texts_from_paths_stream, methods=['POST'])
+# extract_texts_from_directory
+router.add_api_route(path='/extract_texts_from_directory', endpoint=extract_texts_from_directory, methods=['POST'])
+# extract_texts_from_directory_stream
+router.add_api_route(path='/extract_texts_from_directory_stream', endpoint=extract_texts_from_directory_stream, methods=['POST'])
+
+# extract_text_from_zip
+router.add_api_route(path='/extract_text_from_zip', endpoint=extract_text_from_zip, methods=['POST'])
+# extract_text_from_zip_stream
+router.add_api_route(path='/extract_text_from_zip_stream', endpoint=extract_text_from_zip_stream, methods=['POST'])
+
 # ZIPファイルの内容をリストする関数
 router.add_api_route(path='/list_zip_contents', endpoint=list_zip_contents, methods=['GET'])
 
@@ -46,11 +120,20 @@ router.add_api_route(path='/create_zip', endpoint=create_zip, methods=['POST'])
 
 # export_data_to_excel
 router.add_api_route(path='/export_data_to_excel', endpoint=export_data_to_excel, methods=['POST'])
+# export_sheets_to_excel
+router.add_api_route(path='/export_sheets_to_excel', endpoint=export_sheets_to_excel, methods=['POST'])
+
+# export_ndjson_to_excel
+router.add_api_route(path='/export_ndjson_to_excel', endpoint=export_ndjson_to_excel, methods=['POST'])
 
 # import_data_from_excel
-router.add_api_route(path='/import_data_from_excel', endpoint=import_data_from_excel, methods=['GET'])
+router.add_api_route(path='/import_data_from_excel', endpoint=import_data_from_excel, methods=['GET', 'POST'])
+# import_data_page_from_excel
+router.add_api_route(path='/import_data_page_from_excel', endpoint=import_data_page_from_excel, methods=['POST'])
 
 app.include_router(router, prefix="/api/file_util")
+# Prometheusから収集するため、メトリクスは/metricsで公開する
+app.add_api_route(path='/metrics', endpoint=metrics, methods=['GET'])
 if __name__ == "__main__":
     import uvicorn
     from dotenv import load_dotenv
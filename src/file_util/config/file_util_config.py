@@ -21,3 +21,74 @@ class FileUtilConfig:
         # SMB_CIFS_PASSWORD
         self.smb_cifs_password = os.getenv("SMB_CIFS_PASSWORD", "password")
 
+        # ENABLE_EXTRACTION_CACHE
+        self.enable_extraction_cache = os.getenv("ENABLE_EXTRACTION_CACHE", "true").lower() == "true"
+
+        # EXTRACTION_CACHE_MEMORY_MAX_BYTES
+        self.extraction_cache_memory_max_bytes = int(os.getenv("EXTRACTION_CACHE_MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+
+        # EXTRACTION_CACHE_DB_PATH
+        self.extraction_cache_db_path = os.getenv("EXTRACTION_CACHE_DB_PATH", "")
+
+        # EXTRACTION_CACHE_DISK_MAX_BYTES
+        self.extraction_cache_disk_max_bytes = int(os.getenv("EXTRACTION_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))
+
+        # EXTRACTION_CACHE_VERIFY_HASH
+        self.extraction_cache_verify_hash = os.getenv("EXTRACTION_CACHE_VERIFY_HASH", "false").lower() == "true"
+
+        # EXTRACTOR_EXECUTOR_MODE (process, thread, inline)
+        self.extractor_executor_mode = os.getenv("EXTRACTOR_EXECUTOR_MODE", "process").lower()
+
+        # EXTRACTOR_MAX_WORKERS (0の場合はCPU数)
+        self.extractor_max_workers = int(os.getenv("EXTRACTOR_MAX_WORKERS", "0"))
+
+        # EXTRACTOR_TASK_TIMEOUT (秒。0の場合はタイムアウトなし)
+        self.extractor_task_timeout = float(os.getenv("EXTRACTOR_TASK_TIMEOUT", "300"))
+
+        # EXTRACTOR_MAX_QUEUE_SIZE (0の場合はワーカー数の4倍)
+        self.extractor_max_queue_size = int(os.getenv("EXTRACTOR_MAX_QUEUE_SIZE", "0"))
+
+        # EXTRACTOR_MAX_TASKS_PER_WORKER (0の場合はワーカーを再起動しない)
+        self.extractor_max_tasks_per_worker = int(os.getenv("EXTRACTOR_MAX_TASKS_PER_WORKER", "100"))
+
+        # PDF_MAX_WORKERS (ページ数の多いPDFを並列抽出するワーカー数。0の場合はCPU数、1の場合は並列化しない)
+        self.pdf_max_workers = int(os.getenv("PDF_MAX_WORKERS", "0"))
+
+        # ZIP_EXTRACT_MAX_DEPTH (ZIP内のテキスト抽出で展開するネストしたZIPの深さ。0の場合はネストしたZIPを展開しない)
+        self.zip_extract_max_depth = int(os.getenv("ZIP_EXTRACT_MAX_DEPTH", "2"))
+
+        # ZIP_EXTRACT_MAX_MEMBER_SIZE (ZIP内のテキスト抽出でメモリに読み込むメンバーの最大サイズ(バイト)。0の場合は制限なし)
+        self.zip_extract_max_member_size = int(os.getenv("ZIP_EXTRACT_MAX_MEMBER_SIZE", str(100 * 1024 * 1024)))
+
+        # UPLOAD_MAX_SIZE (アップロードで受け付ける最大サイズ(バイト)。0の場合は制限なし)
+        self.upload_max_size = int(os.getenv("UPLOAD_MAX_SIZE", str(100 * 1024 * 1024)))
+
+        # UPLOAD_MAX_MEMORY_SIZE (アップロードをメモリに保持する最大サイズ(バイト)。超えた場合は一時ファイルに書き出す)
+        self.upload_max_memory_size = int(os.getenv("UPLOAD_MAX_MEMORY_SIZE", str(8 * 1024 * 1024)))
+
+        # ENCODING_DETECTION_SAMPLE_SIZE (エンコーディングの判定に使用する先頭のバイト数)
+        self.encoding_detection_sample_size = int(os.getenv("ENCODING_DETECTION_SAMPLE_SIZE", str(32 * 1024)))
+
+        # STRICT_TYPE_DETECTION (シグネチャによる判定を行わず、ファイルの種類を常にMagikaで判定する)
+        self.strict_type_detection = os.getenv("STRICT_TYPE_DETECTION", "false").lower() == "true"
+
+        # TEXT_NORMALIZE_NFKC (抽出したテキストにUnicode NFKC正規化を行う)
+        self.text_normalize_nfkc = os.getenv("TEXT_NORMALIZE_NFKC", "false").lower() == "true"
+
+        # TEXT_NORMALIZE_STRIP_CONTROL (抽出したテキストからタブ・改行・改ページ以外の制御文字を削除する)
+        self.text_normalize_strip_control = os.getenv("TEXT_NORMALIZE_STRIP_CONTROL", "false").lower() == "true"
+
+        # TEXT_NORMALIZE_REMOVE_HEADERS_FOOTERS (PDFのページの先頭・末尾で繰り返されるヘッダー・フッターを削除する)
+        self.text_normalize_remove_headers_footers = os.getenv("TEXT_NORMALIZE_REMOVE_HEADERS_FOOTERS", "false").lower() == "true"
+
+        # TEXT_CHUNK_CACHE_MAX_BYTES (チャンクに分割したテキストを保持するキャッシュの最大サイズ(バイト)。0の場合はキャッシュしない)
+        self.text_chunk_cache_max_bytes = int(os.getenv("TEXT_CHUNK_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+        # ENABLE_METRICS (処理段階ごとの処理時間などのメトリクスを記録する)
+        self.enable_metrics = os.getenv("ENABLE_METRICS", "true").lower() == "true"
+
+        # METRICS_SLOWEST_DOCUMENTS (メトリクスに記録する処理時間の長いドキュメントの件数。0の場合は記録しない)
+        self.metrics_slowest_documents = int(os.getenv("METRICS_SLOWEST_DOCUMENTS", "10"))
+
+        # WARM_UP_ON_START (サーバーの起動後に、抽出処理で使用するパーサーとMagikaのモデルをバックグラウンドで読み込む)
+        self.warm_up_on_start = os.getenv("WARM_UP_ON_START", "false").lower() == "true"
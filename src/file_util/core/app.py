@@ -1,9 +1,29 @@
-from typing import Annotated, Optional, Literal
+import asyncio
+import binascii
+import json
+import os
+import queue
+import threading
+import uuid
+from typing import Annotated, AsyncIterator, Optional, Literal, Union
+from fastapi import HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import Field
+from file_util.config.file_util_config import FileUtilConfig
 from file_util.util.file_util import FileUtil
-from file_util.model import FileUtilDocumentType, FileUtilDocument
+from file_util.model import FileUtilDocumentType, FileUtilDocument, FileUtilExtractionResult, FileUtilExcelPage, FileUtilTextChunk, FileUtilTextChunkPage
 from file_util.util.excel_util import ExcelUtil
 from file_util.util.zip_util import ZipUtil
+from file_util.util.cache_util import ExtractionCache
+from file_util.util.executor_util import ExtractorExecutor
+from file_util.util.metrics_util import FileUtilMetrics
+from file_util.util.source_util import Base64StreamDecoder
+from file_util.util.upload_util import MultipartFileReader, UploadSpool, UploadTooLargeError
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+# テキスト形式のストリームで抽出中のエラーを示す行の先頭
+TEXT_STREAM_ERROR_MARKER = "[file_util error]"
 
 
 async def get_document_type(
@@ -12,7 +32,7 @@ async def get_document_type(
     """
     This function gets the type of a file at the specified path.
     """
-    document_type = FileUtilDocument.from_file(document_path=file_path)
+    document_type = await FileUtil.get_document_async(file_path)
     return document_type.get_document_type()
 
 async def get_mime_type(
@@ -21,9 +41,18 @@ async def get_mime_type(
     """
     This function gets the MIME type of a file at the specified path.
     """
-    document_type = FileUtilDocument.from_file(document_path=file_path)
+    document_type = await FileUtil.get_document_async(file_path)
     return document_type.mime_type
 
+async def get_mime_types(
+    file_paths: Annotated[list[str], Field(description="Paths to the files to get MIME types for")]
+    ) -> Annotated[list[Optional[str]], Field(description="MIME types of the files in the same order as file_paths. None if undetectable")]:
+    """
+    This function gets the MIME types of multiple files at once.
+    """
+    results = FileUtilDocument.identify_many(file_paths)
+    return [mime_type for mime_type, _ in results]
+
 # get_sheet_names
 async def get_sheet_names(
     file_path: Annotated[str, Field(description="Path to the Excel file to get sheet names for")]
@@ -42,7 +71,7 @@ async def extract_excel_sheet(
     """
     This function extracts text from a specified sheet in an Excel file.
     """
-    response = ExcelUtil.extract_text_from_sheet(file_path, sheet_name)
+    response = await ExtractorExecutor.get_instance().run(ExcelUtil.extract_text_from_sheet, file_path, sheet_name)
     return response
 
 # extract_base64_to_text
@@ -57,13 +86,262 @@ async def extract_base64_to_text(
     return response
 
 
+async def _iter_upload_chunks(request: Request, body_encoding: str, spool: UploadSpool) -> AsyncIterator[bytes]:
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        try:
+            reader = MultipartFileReader(content_type)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        async for data in request.stream():
+            for chunk in reader.feed(data):
+                yield chunk
+            if reader.filename and not spool.identifier:
+                spool.identifier = reader.filename
+            if reader.done:
+                return
+        if not reader.found:
+            raise HTTPException(status_code=400, detail="No file part in multipart/form-data")
+        return
+
+    decoder = Base64StreamDecoder() if body_encoding == "base64" else None
+    async for data in request.stream():
+        yield decoder.feed(data) if decoder else data
+    if decoder:
+        yield decoder.flush()
+
+def _has_no_text(mime_type: str | None) -> bool:
+    # 画像・音声・動画はテキストを抽出できないため、受信の途中でも打ち切る
+    return bool(mime_type) and mime_type.split("/")[0] in ("image", "audio", "video") # type: ignore
+
+# extract_text_from_upload
+async def extract_text_from_upload(
+    request: Request,
+    filename: Annotated[Optional[str], Field(description="Name of the uploaded file, used for logging. Taken from the multipart file part if not specified")] = None,
+    body_encoding: Annotated[Literal["binary", "base64"], Field(description="Encoding of a raw request body. Ignored for multipart/form-data")] = "binary",
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate"
+    ) -> Annotated[str, Field(description="Extracted text from the uploaded file")]:
+    """
+    This function extracts text from a file uploaded as multipart/form-data (the first file part) or as the raw request body.
+    The upload is received in chunks, kept in memory up to a threshold and spooled to a temporary file above it.
+    Responds with 413 if the upload exceeds the size limit, and with 415 if the beginning of the upload shows a type without text.
+    """
+    config = FileUtilConfig()
+    content_length = request.headers.get("content-length", "")
+    if config.upload_max_size > 0 and content_length.isdigit() and int(content_length) > config.upload_max_size:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {config.upload_max_size} bytes")
+
+    with UploadSpool(config.upload_max_size, config.upload_max_memory_size, filename or "") as spool:
+        detection: asyncio.Task | None = None
+        try:
+            async for chunk in _iter_upload_chunks(request, body_encoding, spool):
+                spool.write(chunk)
+                # 先頭部分が揃った時点で、受信を続けながら種類の判定を開始する
+                if detection is None and len(spool.head) >= UploadSpool.HEAD_SIZE:
+                    detection = asyncio.create_task(asyncio.to_thread(FileUtilDocument.identify_data_type, spool.head))
+                if detection is not None and detection.done() and _has_no_text(detection.result()[0]):
+                    break
+        except UploadTooLargeError as e:
+            raise HTTPException(status_code=413, detail=str(e))
+        except binascii.Error as e:
+            raise HTTPException(status_code=400, detail=f"Invalid base64 data: {e}")
+
+        if detection is None:
+            detection = asyncio.create_task(asyncio.to_thread(FileUtilDocument.identify_data_type, spool.head))
+        mime_type, _ = await detection
+        if _has_no_text(mime_type):
+            raise HTTPException(status_code=415, detail=f"Unsupported media type: {mime_type}")
+        return await FileUtil.extract_text_from_upload_async(spool, pdf_mode)
+
+
 async def extract_text_from_file(
-    file_path: Annotated[str, Field(description="Path to the file to extract text from")]
+    file_path: Annotated[str, Field(description="Path to the file to extract text from")],
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate"
     ) -> Annotated[str, Field(description="Extracted text from the file")]:
     """
     This function extracts text from a file at the specified path.
     """
-    return await FileUtil.extract_text_from_file_async(file_path)
+    return await FileUtil.extract_text_from_file_async(file_path, pdf_mode)
+
+# extract_text_from_file_stream
+async def extract_text_from_file_stream(
+    file_path: Annotated[str, Field(description="Path to the file to extract text from")],
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate",
+    output_format: Annotated[Literal["text", "ndjson"], Field(description="'text' streams the plain text. If extraction fails after streaming has started, the stream ends with a line starting with '[file_util error]'. 'ndjson' streams one JSON object per chunk with progress information, and reports failures in the 'error' field of the last object")] = "text"
+    ) -> StreamingResponse:
+    """
+    This function extracts text from a file and streams it as the extractor produces it, instead of returning the whole text at once.
+    The response status cannot be changed once streaming has started, so use 'ndjson' to detect failures reliably.
+    """
+    if not os.path.isfile(file_path):
+        raise HTTPException(status_code=404, detail=f"File not found: {file_path}")
+    chunks = FileUtil.iter_text_from_file_async(file_path, pdf_mode)
+
+    async def to_text() -> AsyncIterator[str]:
+        try:
+            async for chunk in chunks:
+                yield chunk.text
+        except Exception as e:
+            # 送信済みのレスポンスのステータスは変更できないため、エラーを示す行で終了する
+            logger.error(f"Failed to extract text from {file_path}: {type(e).__name__}: {e}")
+            yield f"\n{TEXT_STREAM_ERROR_MARKER} {type(e).__name__}: {e}\n"
+
+    async def to_ndjson() -> AsyncIterator[str]:
+        index = 0
+        try:
+            async for chunk in chunks:
+                index = chunk.index + 1
+                with FileUtilMetrics.measure(FileUtilMetrics.STAGE_SERIALIZE):
+                    line = chunk.model_dump_json() + "\n"
+                yield line
+        except Exception as e:
+            # 送信済みのレスポンスのステータスは変更できないため、エラーを最後の行で返す
+            yield FileUtilTextChunk(index=index, error=f"{type(e).__name__}: {e}").model_dump_json() + "\n"
+
+    if output_format == "ndjson":
+        return StreamingResponse(to_ndjson(), media_type="application/x-ndjson")
+    return StreamingResponse(to_text(), media_type="text/plain; charset=utf-8")
+
+# get_text_chunk
+async def get_text_chunk(
+    file_path: Annotated[Optional[str], Field(description="Path to the file to extract text from. Not needed when cursor is specified")] = None,
+    cursor: Annotated[Optional[str], Field(description="next_cursor of the previous chunk. Other parameters are taken from the cursor when specified")] = None,
+    chunk_size: Annotated[int, Field(description="Maximum length of a chunk in the specified unit", ge=1)] = 4000,
+    overlap: Annotated[int, Field(description="Length of text shared with the previous chunk in the specified unit. Must be less than chunk_size", ge=0)] = 200,
+    unit: Annotated[Literal["chars", "tokens"], Field(description="Unit of chunk_size and overlap. 'tokens' uses an estimated token count")] = "chars",
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate"
+    ) -> Annotated[FileUtilTextChunkPage, Field(description="One chunk of the extracted text, its position and the cursor of the next chunk")]:
+    """
+    This function extracts text from a file and returns it one chunk at a time. Chunks end at page, sheet, paragraph or sentence boundaries where possible.
+    Pass next_cursor of the result to get the next chunk. The chunked text is cached on the server, so later chunks are not extracted again.
+    """
+    return await FileUtil.get_text_chunk_async(file_path, cursor, chunk_size, overlap, unit, pdf_mode)
+
+# get_cache_stats
+async def get_cache_stats(
+    ) -> Annotated[dict, Field(description="Hit/miss statistics and usage of the extraction cache. Empty if the cache is disabled")]:
+    """
+    This function gets the statistics of the extraction result cache.
+    """
+    cache = ExtractionCache.get_instance()
+    if cache is None:
+        return {}
+    return cache.stats()
+
+# get_extraction_stats
+async def get_extraction_stats(
+    ) -> Annotated[dict, Field(description="Timing per extraction stage and MIME type (count, mean, estimated p50/p95, max), document/byte/character counts per MIME type, operations in progress and the slowest documents. Empty if metrics are disabled")]:
+    """
+    This function gets the metrics of the extraction pipeline: time spent in file reading, type detection, encoding detection, extraction, sanitization and response serialization.
+    """
+    metrics = FileUtilMetrics.get_instance()
+    if metrics is None:
+        return {}
+    return metrics.stats()
+
+# metrics
+async def metrics() -> PlainTextResponse:
+    """
+    This function returns the metrics of the extraction pipeline in the Prometheus text exposition format.
+    """
+    file_util_metrics = FileUtilMetrics.get_instance()
+    if file_util_metrics is None:
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return PlainTextResponse(file_util_metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+# extract_texts_from_paths
+async def extract_texts_from_paths(
+    file_paths: Annotated[list[str], Field(description="Paths to the files to extract text from")],
+    concurrency: Annotated[int, Field(description="Maximum number of files processed at the same time", ge=1)] = 8
+    ) -> Annotated[list[FileUtilExtractionResult], Field(description="Extraction results per file (path, mime type, text or error, timing) in completion order")]:
+    """
+    This function extracts text from multiple files concurrently. A failure on one file does not stop the others.
+    """
+    return [result async for result in FileUtil.extract_texts_from_paths_async(file_paths, concurrency)]
+
+async def _to_ndjson(results: AsyncIterator[FileUtilExtractionResult]) -> AsyncIterator[str]:
+    async for result in results:
+        with FileUtilMetrics.measure(FileUtilMetrics.STAGE_SERIALIZE, result.mime_type or ""):
+            line = result.model_dump_json() + "\n"
+        yield line
+
+# extract_texts_from_paths_stream
+async def extract_texts_from_paths_stream(
+    file_paths: Annotated[list[str], Field(description="Paths to the files to extract text from")],
+    concurrency: Annotated[int, Field(description="Maximum number of files processed at the same time", ge=1)] = 8
+    ) -> StreamingResponse:
+    """
+    This function extracts text from multiple files concurrently and streams each result as an NDJSON line as soon as it finishes.
+    """
+    results = FileUtil.extract_texts_from_paths_async(file_paths, concurrency)
+    return StreamingResponse(_to_ndjson(results), media_type="application/x-ndjson")
+
+# extract_texts_from_directory
+async def extract_texts_from_directory(
+    directory: Annotated[str, Field(description="Path to the directory to extract text from. **Absolute path required**")],
+    pattern: Annotated[str, Field(description="Glob pattern for file names, e.g. '*.pdf'")] = "*",
+    recursive: Annotated[bool, Field(description="Whether to include files in subdirectories")] = True,
+    concurrency: Annotated[int, Field(description="Maximum number of files processed at the same time", ge=1)] = 8
+    ) -> Annotated[list[FileUtilExtractionResult], Field(description="Extraction results per file (path, mime type, text or error, timing) in completion order")]:
+    """
+    This function extracts text from the files in a directory concurrently. A failure on one file does not stop the others.
+    """
+    file_paths = FileUtil.list_files(directory, pattern, recursive)
+    return [result async for result in FileUtil.extract_texts_from_paths_async(file_paths, concurrency)]
+
+# extract_texts_from_directory_stream
+async def extract_texts_from_directory_stream(
+    directory: Annotated[str, Field(description="Path to the directory to extract text from. **Absolute path required**")],
+    pattern: Annotated[str, Field(description="Glob pattern for file names, e.g. '*.pdf'")] = "*",
+    recursive: Annotated[bool, Field(description="Whether to include files in subdirectories")] = True,
+    concurrency: Annotated[int, Field(description="Maximum number of files processed at the same time", ge=1)] = 8
+    ) -> StreamingResponse:
+    """
+    This function extracts text from the files in a directory concurrently and streams each result as an NDJSON line as soon as it finishes.
+    """
+    file_paths = FileUtil.list_files(directory, pattern, recursive)
+    results = FileUtil.extract_texts_from_paths_async(file_paths, concurrency)
+    return StreamingResponse(_to_ndjson(results), media_type="application/x-ndjson")
+
+# extract_text_from_pdf
+async def extract_text_from_pdf(
+    file_path: Annotated[str, Field(description="Path to the PDF file to extract text from")],
+    page_numbers: Annotated[Optional[list[int]], Field(description="0-based page numbers to extract. All pages if not specified")] = None,
+    max_pages: Annotated[int, Field(description="Maximum number of pages to extract. 0 means no limit", ge=0)] = 0,
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate"
+    ) -> Annotated[str, Field(description="Extracted text from the PDF file. Pages are separated by form feed characters")]:
+    """
+    This function extracts text from specified pages of a PDF file.
+    """
+    text = await FileUtil.extract_text_from_pdf_async(file_path, page_numbers, max_pages, pdf_mode)
+    return FileUtil.sanitize_text(text)
+
+# extract_text_from_zip
+async def extract_text_from_zip(
+    file_path: Annotated[str, Field(description="Path to the ZIP file to extract text from. **Absolute path required**")],
+    password: Annotated[Optional[str], Field(description="Password for the ZIP file, if any")] = None,
+    max_depth: Annotated[Optional[int], Field(description="Depth of nested ZIP archives to descend into. 0 does not descend into nested archives. Server default if not specified", ge=0)] = None,
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate"
+    ) -> Annotated[list[FileUtilExtractionResult], Field(description="Extraction results per member (path in the archive, mime type, text or error, timing) in archive order")]:
+    """
+    This function extracts text from each file in a ZIP archive without unpacking it to disk.
+    Nested ZIP archives are processed recursively. A failure on one member does not stop the others.
+    """
+    return [result async for result in FileUtil.extract_text_from_zip_async(file_path, password, max_depth, pdf_mode)]
+
+# extract_text_from_zip_stream
+async def extract_text_from_zip_stream(
+    file_path: Annotated[str, Field(description="Path to the ZIP file to extract text from. **Absolute path required**")],
+    password: Annotated[Optional[str], Field(description="Password for the ZIP file, if any")] = None,
+    max_depth: Annotated[Optional[int], Field(description="Depth of nested ZIP archives to descend into. 0 does not descend into nested archives. Server default if not specified", ge=0)] = None,
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate"
+    ) -> StreamingResponse:
+    """
+    This function extracts text from each file in a ZIP archive without unpacking it to disk and streams each result as an NDJSON line.
+    """
+    results = FileUtil.extract_text_from_zip_async(file_path, password, max_depth, pdf_mode)
+    return StreamingResponse(_to_ndjson(results), media_type="application/x-ndjson")
 
 # ZIPファイルの内容をリストする関数
 async def list_zip_contents(
@@ -78,29 +356,35 @@ async def list_zip_contents(
 async def extract_zip(
     file_path: Annotated[str, Field(description="Path to the ZIP file to extract. **Absolute path required**")],
     extract_to: Annotated[str, Field(description="Directory to extract the ZIP contents to. **Absolute path required**")],
-    password: Annotated[Optional[str], Field(description="Password for the ZIP file, if any")] = None
+    password: Annotated[Optional[str], Field(description="Password for the ZIP file, if any")] = None,
+    members: Annotated[Optional[list[str]], Field(description="Names of the members to extract, as returned by list_zip_contents. All members if not specified")] = None,
+    include: Annotated[Optional[list[str]], Field(description="Glob patterns of member names to extract, e.g. ['docs/*.pdf']")] = None,
+    exclude: Annotated[Optional[list[str]], Field(description="Glob patterns of member names not to extract")] = None
     ) -> Annotated[bool, Field(description="True if extraction was successful")]:
 
     """
-    This function extracts a ZIP file at the specified path.
+    This function extracts a ZIP file at the specified path. Members are extracted in parallel.
     """
-    return ZipUtil.extract_zip(file_path, extract_to, password)
+    return await asyncio.to_thread(ZipUtil.extract_zip, file_path, extract_to, password, members, include, exclude)
 
 # ZIPファイルを作成する関数
 async def create_zip(
     file_paths: Annotated[list[str], Field(description="List of file or directory paths to include in the ZIP. **Absolute paths required**")],
     output_zip: Annotated[str, Field(description="Path to the output ZIP file. **Absolute path required**")],
-    password: Annotated[Optional[str], Field(description="Password for the ZIP file, if any")] = None
+    password: Annotated[Optional[str], Field(description="Password for the ZIP file, if any. The members are encrypted with AES-256")] = None,
+    compression: Annotated[Literal["stored", "deflated", "bzip2", "lzma"], Field(description="Compression method. 'stored' (no compression) by default")] = "stored",
+    compresslevel: Annotated[Optional[int], Field(description="Compression level. Default level of the method if not specified")] = None,
+    store_compressed: Annotated[bool, Field(description="Store already compressed files such as JPEG, PDF and ZIP without recompressing them")] = True
     ) -> Annotated[bool, Field(description="True if ZIP creation was successful")]:
 
     """
-    This function creates a ZIP file at the specified path.
+    This function creates a ZIP file at the specified path. Members of a password-protected archive are compressed and encrypted in parallel.
     """
-    return ZipUtil.create_zip(file_paths, output_zip, password)
+    return await asyncio.to_thread(ZipUtil.create_zip, file_paths, output_zip, password, compression, compresslevel, store_compressed)
 
 # export_data_to_excel
 async def export_data_to_excel(
-    data: Annotated[dict[str, list], Field(description="Data to export to Excel, with keys as column headers and values as lists of column data")],
+    data: Annotated[Union[dict[str, list], list[list]], Field(description="Data to export to Excel. Either a dict with keys as column headers and values as lists of column data, or a list of rows")],
     output_file: Annotated[str, Field(description="Path to the output Excel file")],
     sheet_name: Annotated[Optional[str], Field(description="Name of the sheet to create in the Excel file")] = "Sheet1"
     ) -> Annotated[bool, Field(description="True if data export was successful")]:
@@ -108,17 +392,126 @@ async def export_data_to_excel(
     """
     This function exports data to an Excel file at the specified path.
     """
-    ExcelUtil.export_data_to_excel(data, output_file, sheet_name)
+    # 書き込みはイベントループ外で行う
+    await asyncio.to_thread(ExcelUtil.export_sheets_to_excel, {sheet_name or "Sheet1": data}, output_file)
+    return True
+
+# export_sheets_to_excel
+async def export_sheets_to_excel(
+    sheets: Annotated[dict[str, Union[dict[str, list], list[list]]], Field(description="Sheets to create, with sheet names as keys and data as values. Data is either a dict with keys as column headers and values as lists of column data, or a list of rows")],
+    output_file: Annotated[str, Field(description="Path to the output Excel file")]
+    ) -> Annotated[bool, Field(description="True if data export was successful")]:
+
+    """
+    This function exports data of multiple sheets to an Excel file at the specified path.
+    """
+    if not sheets:
+        raise HTTPException(status_code=400, detail="At least one sheet is required")
+    # 書き込みはイベントループ外で行う
+    await asyncio.to_thread(ExcelUtil.export_sheets_to_excel, sheets, output_file)
+    return True
+
+# export_ndjson_to_excel
+async def export_ndjson_to_excel(
+    request: Request,
+    output_file: Annotated[str, Field(description="Path to the output Excel file")],
+    sheet_name: Annotated[str, Field(description="Name of the sheet to create in the Excel file")] = "Sheet1"
+    ) -> Annotated[bool, Field(description="True if data export was successful")]:
+    """
+    This function exports rows sent as an NDJSON request body (one JSON array per line, including the header row) to an Excel file.
+    Rows are written as they arrive, so the memory usage does not depend on the number of rows.
+    """
+    # 書き込みスレッドの開始後に失敗しないように、シート名と出力先は受信を始める前に確認する
+    try:
+        ExcelUtil.validate_sheet_name(sheet_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    output_dir = os.path.dirname(os.path.abspath(output_file))
+    if not os.path.isdir(output_dir) or os.path.isdir(output_file) or not os.access(output_dir, os.W_OK):
+        raise HTTPException(status_code=400, detail=f"Cannot write to the output file: {output_file}")
+
+    # 受信した行のチャンクを書き込みスレッドに渡す。キューの上限で受信側を待たせる
+    chunks: queue.Queue = queue.Queue(maxsize=16)
+    end_of_rows = None
+    aborted = threading.Event()
+
+    def iter_chunks():
+        while (chunk := chunks.get()) is not end_of_rows and not aborted.is_set():
+            yield chunk
+        # 中断した場合は保存せずに終了させる
+        if aborted.is_set():
+            raise RuntimeError("Export was aborted")
+
+    async def put(item):
+        # 書き込みスレッドが失敗するとキューが空かないため、キューの空きと書き込みスレッドの終了の両方を待つ
+        while True:
+            if writer.done():
+                writer.result()
+                raise RuntimeError("Excel writer finished before all rows were received")
+            try:
+                chunks.put_nowait(item)
+                return
+            except queue.Full:
+                await asyncio.wait({writer}, timeout=0.05)
+
+    # 途中までの内容が出力先に残らないように、同じディレクトリの一時ファイルに書き込んでから置き換える
+    temp_file = os.path.join(output_dir, f".{os.path.basename(output_file)}.{uuid.uuid4().hex}.tmp")
+    writer = asyncio.create_task(asyncio.to_thread(ExcelUtil.export_sheets_to_excel, {sheet_name: iter_chunks()}, temp_file))
+    try:
+        buffer = b""
+        async for data in request.stream():
+            lines = (buffer + data).split(b"\n")
+            buffer = lines.pop()
+            rows = [json.loads(line) for line in lines if line.strip()]
+            if rows:
+                await put(rows)
+        if buffer.strip():
+            await put([json.loads(buffer)])
+        await put(end_of_rows)
+        await writer
+        os.replace(temp_file, output_file)
+    except BaseException as e:
+        if not writer.done():
+            # 書き込みスレッドが待機中の場合に備えて、キューを空けてから起こす
+            aborted.set()
+            while not chunks.empty():
+                chunks.get_nowait()
+            chunks.put_nowait(end_of_rows)
+        await asyncio.gather(writer, return_exceptions=True)
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        if isinstance(e, json.JSONDecodeError):
+            raise HTTPException(status_code=400, detail=f"Invalid NDJSON line: {e}")
+        raise
     return True
 
 # import_data_from_excel
 async def import_data_from_excel(
     input_file: Annotated[str, Field(description="Path to the Excel file to import data from")],
-    sheet_name: Annotated[Optional[str], Field(description="Name of the sheet to import data from")] = "Sheet1"
+    sheet_name: Annotated[Optional[str], Field(description="Name of the sheet to import data from")] = "Sheet1",
+    offset: Annotated[int, Field(description="Number of data rows to skip", ge=0)] = 0,
+    limit: Annotated[Optional[int], Field(description="Maximum number of data rows to import. All rows if not specified", ge=0)] = None,
+    columns: Annotated[Optional[list[str]], Field(description="Column headers to import. All columns if not specified")] = None,
+    header_row: Annotated[int, Field(description="1-based row number of the header row. 0 means no header row (column letters are used as keys)", ge=0)] = 1
     ) -> Annotated[dict[str, list], Field(description="Imported data from the Excel file, with keys as column headers and values as lists of column data")]:
 
     """
     This function imports data from an Excel file at the specified path.
     """
-    data = ExcelUtil.import_data_from_excel(input_file, sheet_name)
+    data = await asyncio.to_thread(ExcelUtil.import_data_from_excel, input_file, sheet_name, offset, limit, columns, header_row)
     return data
+
+# import_data_page_from_excel
+async def import_data_page_from_excel(
+    input_file: Annotated[str, Field(description="Path to the Excel file to import data from")],
+    sheet_name: Annotated[Optional[str], Field(description="Name of the sheet to import data from")] = "Sheet1",
+    offset: Annotated[int, Field(description="Number of data rows to skip. Use next_offset of the previous page to get the next page", ge=0)] = 0,
+    limit: Annotated[int, Field(description="Maximum number of data rows to import", ge=1)] = 100,
+    columns: Annotated[Optional[list[str]], Field(description="Column headers to import. All columns if not specified")] = None,
+    header_row: Annotated[int, Field(description="1-based row number of the header row. 0 means no header row (column letters are used as keys)", ge=0)] = 1
+    ) -> Annotated[FileUtilExcelPage, Field(description="One page of imported data, the offset of the next page and the number of data rows if known")]:
+
+    """
+    This function imports one page of rows from an Excel sheet, reading only as many rows as needed.
+    """
+    return await asyncio.to_thread(ExcelUtil.import_data_page_from_excel, input_file, sheet_name, offset, limit, columns, header_row)
@@ -1,23 +1,53 @@
 import asyncio
 from dotenv import load_dotenv
 import argparse
-from fastmcp import FastMCP
+from typing import Annotated, Literal
+from pydantic import Field
+from fastmcp import Context, FastMCP
 from file_util.core.app import (
     get_document_type,
     get_mime_type,
+    get_mime_types,
     get_sheet_names,
     extract_excel_sheet,
     extract_text_from_file,
     extract_base64_to_text,
     extract_text_from_file,
+    extract_text_from_pdf,
+    get_text_chunk,
+    get_cache_stats,
+    get_extraction_stats,
+    extract_texts_from_paths,
+    extract_texts_from_directory,
+    extract_text_from_zip,
     list_zip_contents,
     extract_zip,
     create_zip,
     export_data_to_excel,
+    export_sheets_to_excel,
     import_data_from_excel,
+    import_data_page_from_excel,
 )
+from file_util.config.file_util_config import FileUtilConfig
+from file_util.util.file_util import FileUtil
 mcp = FastMCP("file_util") #type :ignore
 
+# extract_text_from_file_with_progress
+async def extract_text_from_file_with_progress(
+    file_path: Annotated[str, Field(description="Path to the file to extract text from")],
+    ctx: Context,
+    pdf_mode: Annotated[Literal["accurate", "fast"], Field(description="PDF extraction mode. 'fast' skips layout analysis and is suited for search indexing")] = "accurate"
+    ) -> Annotated[str, Field(description="Extracted text from the file")]:
+    """
+    This function extracts text from a file at the specified path, sending progress notifications while a long extraction runs.
+    For PDF files the progress is the number of extracted pages.
+    """
+    texts = []
+    async for chunk in FileUtil.iter_text_from_file_async(file_path, pdf_mode):
+        texts.append(chunk.text)
+        await ctx.report_progress(progress=chunk.progress, total=chunk.total)
+    return "".join(texts)
+
 # 引数解析用の関数
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(description="Run MCP server with specified mode and APP_DATA_PATH.")
@@ -53,15 +83,30 @@ async def main():
         # デフォルトのツールを登録
         mcp.tool()(get_document_type)
         mcp.tool()(get_mime_type)
+        mcp.tool()(get_mime_types)
         mcp.tool()(get_sheet_names)
         mcp.tool()(extract_excel_sheet)
         mcp.tool()(extract_text_from_file)
+        mcp.tool()(extract_text_from_file_with_progress)
+        mcp.tool()(get_text_chunk)
+        mcp.tool()(extract_text_from_pdf)
+        mcp.tool()(extract_texts_from_paths)
+        mcp.tool()(extract_texts_from_directory)
+        mcp.tool()(extract_text_from_zip)
         mcp.tool()(list_zip_contents)
+        mcp.tool()(get_cache_stats)
+        mcp.tool()(get_extraction_stats)
         mcp.tool()(extract_zip)
         mcp.tool()(create_zip)
         mcp.tool()(extract_base64_to_text)
         mcp.tool()(export_data_to_excel)
+        mcp.tool()(export_sheets_to_excel)
         mcp.tool()(import_data_from_excel)
+        mcp.tool()(import_data_page_from_excel)
+
+    # クライアントとの接続を待つ間に、パーサーとMagikaのモデルを読み込んでおく
+    if FileUtilConfig().warm_up_on_start:
+        FileUtil.start_warm_up()
 
     if mode == "stdio":
         await mcp.run_async()
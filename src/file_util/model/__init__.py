@@ -1,12 +1,23 @@
-from magika import Magika
-from magika.types import MagikaResult 
-from chardet.universaldetector import UniversalDetector
+import io
+import mmap
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Sequence
 from pathlib import Path
 
-from pydantic import BaseModel, Field, PrivateAttr
+from pydantic import BaseModel, Field
+from file_util.util.encoding_util import EncodingUtil
+from file_util.util.metrics_util import FileUtilMetrics
+from file_util.util.signature_util import SignatureUtil
 import file_util.log.log_settings as log_settings
 logger = log_settings.getLogger(__name__)
 
+# magikaはonnxruntime・numpyを読み込み、読み込みに時間がかかるため、最初の判定時に読み込む
+if TYPE_CHECKING:
+    from magika import Magika
+    from magika.types import MagikaResult
+
 from enum import StrEnum
 
 class FileUtilDocumentType(StrEnum):
@@ -19,48 +30,214 @@ class FileUtilDocumentType(StrEnum):
     UNSUPPORTED = "unsupported"
 
 
-class FileUtilDocument(BaseModel):
-    
-    data: bytes = Field(..., description="Document data as bytes")
-    identifier: str = Field(..., description="Identifier of the document")
-    __mime_type: str = PrivateAttr("")
-    __encoding: str | None = PrivateAttr(None)
+class MagikaSession:
+    """プロセス内で共有するMagikaセッション
+
+    Magika()の生成時にONNXモデルが読み込まれるため、プロセスごとに1回だけ遅延生成して使い回します。
+    fork後の子プロセスでは親のセッションを引き継がず、改めて生成します。
+    """
+    _magika: "Magika | None" = None
+    _pid: int | None = None
+    _lock = threading.Lock()
+    # 内部APIが利用できず、1件ずつの判定にフォールバックしたことを記録済みかどうか
+    _fallback_logged = False
+
+    @classmethod
+    def get(cls) -> "Magika":
+        """共有Magikaインスタンスを取得する
+
+        Returns:
+            Magika: プロセス内で共有されるMagikaインスタンス
+        """
+        pid = os.getpid()
+        if cls._magika is None or cls._pid != pid:
+            with cls._lock:
+                if cls._magika is None or cls._pid != pid:
+                    from magika import Magika
+                    cls._magika = Magika()
+                    cls._pid = pid
+        return cls._magika
+
+    @classmethod
+    def identify_bytes_batch(cls, data_list: Sequence[bytes]) -> "list[MagikaResult]":
+        """複数のバイト列をまとめてMagikaで判定する
+
+        モデル推論が必要な入力は1回のバッチ推論にまとめます。
+        Magikaの内部APIが利用できない場合は1件ずつ判定します。
+        内部APIはrequirements.txtで固定したバージョンのMagikaで確認しています。
+
+        Args:
+            data_list: 判定対象のバイト列のリスト
+
+        Returns:
+            list[MagikaResult]: 入力順の判定結果
+        """
+        m = cls.get()
+        try:
+            from magika.types.seekable import Seekable
+            results: dict[str, MagikaResult] = {}
+            features = []
+            for i, data in enumerate(data_list):
+                key = Path(str(i))
+                res, feature = m._get_result_or_features_from_seekable(Seekable(io.BytesIO(data)), path=key)
+                if res is not None:
+                    results[str(key)] = res
+                else:
+                    features.append((key, feature))
+            results.update(m._get_results_from_features(features))
+            return [results[str(i)] for i in range(len(data_list))]
+        except (ImportError, AttributeError) as e:
+            # 1件ずつの判定はバッチ推論より遅いため、性能の低下に気付けるように最初の1回は警告する
+            if not cls._fallback_logged:
+                cls._fallback_logged = True
+                logger.warning(f"Magika internal batch API is not available, identifying bytes one by one: {e}")
+            else:
+                logger.debug(e)
+            return [m.identify_bytes(data) for data in data_list]
+
+
+class FileUtilDocument:
+    """ドキュメントのハンドル
+
+    ファイルパスまたはバイト列を保持し、MIMEタイプとエンコーディングは初回参照時に判定します。
+    ファイルパスの場合は判定に必要な先頭・末尾などのバイト範囲のみを読み込み、
+    ファイル全体はdataを参照した時点で初めて読み込みます。
+    """
+    __slots__ = ("identifier", "path", "_data", "_detected", "_mime_type", "_encoding")
+
+    def __init__(self, data: bytes | None = None, identifier: str = "", path: str | None = None,
+                 mime_type: str | None = None, encoding: str | None = None):
+        """
+        Args:
+            data: ドキュメントのバイト列
+            identifier: ドキュメントの識別子
+            path: ドキュメントのファイルパス。dataと同時に指定した場合はdataを優先
+            mime_type: 判定済みのMIMEタイプ。指定した場合は判定を省略する
+            encoding: 判定済みのエンコーディング
+        """
+        if data is None and path is None:
+            raise ValueError("Either data or path must be specified")
+        self.identifier = identifier if identifier else (path or "")
+        self.path = path
+        self._data = data
+        self._detected = mime_type is not None
+        self._mime_type = mime_type if mime_type else ""
+        self._encoding = encoding
+
+    def __repr__(self) -> str:
+        return f"FileUtilDocument(identifier={self.identifier!r})"
+
+    @property
+    def data(self) -> bytes:
+        """ドキュメントのバイト列を取得する。ファイルパスの場合は初回参照時に読み込む"""
+        if self._data is None:
+            with FileUtilMetrics.measure(FileUtilMetrics.STAGE_READ, self._mime_type):
+                with open(self.path, "rb") as f: # type: ignore
+                    self._data = f.read()
+        return self._data
+
+    @property
+    def size(self) -> int:
+        """ドキュメントのバイト数を取得する"""
+        if self._data is not None:
+            return len(self._data)
+        return os.path.getsize(self.path) # type: ignore
 
     @property
     def mime_type(self) -> str:
         """MIMEタイプを取得する"""
-        return self.__mime_type
+        self.__detect()
+        return self._mime_type
+
     @property
     def encoding(self) -> str | None:
         """エンコーディングを取得する"""
-        return self.__encoding
-    
-    def __init__(self, **data):
-        super().__init__(**data)
-        mime_type, encoding = self.identify_data_type(self.data)
-        self.__mime_type = mime_type if mime_type else ""
-        self.__encoding = encoding
+        self.__detect()
+        return self._encoding
+
+    def __detect(self):
+        if self._detected:
+            return
+        if self._data is not None:
+            mime_type, encoding = self.identify_data_type(self._data)
+        else:
+            mime_type, encoding = self.identify_file_type(self.path)
+        self._mime_type = mime_type if mime_type else ""
+        self._encoding = encoding
+        self._detected = True
+
+    def read_range(self, offset: int, size: int) -> bytes:
+        """指定したバイト範囲のみを読み込む
+
+        Args:
+            offset: 読み込み開始位置
+            size: 読み込むバイト数
+
+        Returns:
+            bytes: 読み込んだバイト列
+        """
+        if self._data is not None:
+            return self._data[offset:offset + size]
+        with open(self.path, "rb") as f: # type: ignore
+            f.seek(offset)
+            return f.read(size)
+
+    def open(self) -> io.BufferedIOBase:
+        """ドキュメントを読み込み用のバイナリストリームとして開く
+
+        ファイル全体をメモリに読み込まずに抽出処理へ渡すために使用します。
+        呼び出し側でcloseしてください。
+
+        Returns:
+            io.BufferedIOBase: バイナリストリーム
+        """
+        if self._data is not None:
+            return io.BytesIO(self._data)
+        return open(self.path, "rb") # type: ignore
+
+    def mmap(self) -> mmap.mmap | memoryview:
+        """ドキュメントの内容を読み取り専用でメモリマップする
+
+        ファイルパスの場合はmmapを返し、OSのページキャッシュ経由で必要な部分のみが読み込まれます。
+        バイト列の場合はコピーせずにmemoryviewを返します。
+        mmapは呼び出し側でcloseしてください。
+
+        Returns:
+            mmap.mmap | memoryview: ドキュメントの内容
+        """
+        if self._data is not None:
+            return memoryview(self._data)
+        with open(self.path, "rb") as f: # type: ignore
+            if os.fstat(f.fileno()).st_size == 0:
+                return memoryview(b"")
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
     @classmethod
     def from_file(cls, document_path: str) -> "FileUtilDocument":
         """ファイルパスからDocumentTypeインスタンスを作成する
 
+        ファイルの内容はこの時点では読み込みません。
+        種類の判定は読み込みに失敗しても例外を送出しないため、ファイルを開けることをここで確認します。
+
         Args:
             document_path: ドキュメントのファイルパス
 
         Returns:
             DocumentType: 作成されたDocumentTypeインスタンス
+
+        Raises:
+            OSError: ファイルが存在しない、ディレクトリである、読み込み権限がないなど、ファイルを開けない場合
         """
-        # ファイルのバイト列を取得
-        with open(document_path, "rb") as f:
-            byte_data = f.read()
-        
-        return cls(data=byte_data, identifier=document_path)
+        with open(document_path, "rb"):
+            pass
+        return cls(path=document_path, identifier=document_path)
 
     @classmethod
     def identify_data_type(cls, data: bytes) -> tuple[str | None, str | None]:
         """バイト列のMIMEタイプとエンコーディングを判定する
 
+        シグネチャで判定できない場合のみMagikaで判定します。
+
         Args:
             data: 判定対象のバイト列
 
@@ -69,12 +246,18 @@ class FileUtilDocument(BaseModel):
                 MIMEタイプ文字列とエンコーディング文字列のタプル。
                 判定失敗時は(None, None)
         """
-        m = Magika()
+        mime_type = cls.__identify_by_signature(data)
+        if mime_type is not None:
+            return mime_type, None
+        m = MagikaSession.get()
         try:
+            start = time.perf_counter()
             res: MagikaResult = m.identify_bytes(data) # type: ignore
+            FileUtilMetrics.observe_stage(FileUtilMetrics.STAGE_DETECT, res.output.mime_type, time.perf_counter() - start)
             encoding = None
             if res.dl.is_text:
-                encoding = cls.get_encoding_from_bytes(data)
+                with FileUtilMetrics.measure(FileUtilMetrics.STAGE_ENCODING, res.output.mime_type):
+                    encoding = cls.get_encoding_from_bytes(data)
 
         except Exception as e:
             logger.debug(e)
@@ -86,6 +269,8 @@ class FileUtilDocument(BaseModel):
     def identify_file_type(cls, filename) -> tuple[str | None, str | None]:
         """ファイルのMIMEタイプとエンコーディングを判定する
 
+        シグネチャで判定できない場合のみMagikaで判定します。
+
         Args:
             filename: 判定対象のファイルパス
 
@@ -94,14 +279,20 @@ class FileUtilDocument(BaseModel):
                 MIMEタイプ文字列とエンコーディング文字列のタプル。
                 判定失敗時は(None, None)
         """
-        m = Magika()
+        mime_type = cls.__identify_by_signature(filename)
+        if mime_type is not None:
+            return mime_type, None
+        m = MagikaSession.get()
         # ファイルの種類を判定
         path = Path(filename)
         try:
+            start = time.perf_counter()
             res: MagikaResult = m.identify_path(path) # type: ignore
+            FileUtilMetrics.observe_stage(FileUtilMetrics.STAGE_DETECT, res.output.mime_type, time.perf_counter() - start)
             encoding = None
             if res.dl.is_text:
-                encoding = cls.get_encoding(filename)
+                with FileUtilMetrics.measure(FileUtilMetrics.STAGE_ENCODING, res.output.mime_type):
+                    encoding = cls.get_encoding(filename)
 
         except Exception as e:
             logger.debug(e)
@@ -109,11 +300,94 @@ class FileUtilDocument(BaseModel):
 
         return res.output.mime_type , encoding
 
+    @classmethod
+    def identify_many(cls, inputs: Sequence[str | os.PathLike | bytes]) -> list[tuple[str | None, str | None]]:
+        """複数のファイルパスまたはバイト列のMIMEタイプとエンコーディングをまとめて判定する
+
+        シグネチャで判定できないファイルパスとバイト列を、それぞれ1回のMagika呼び出しにまとめて判定します。
+
+        Args:
+            inputs: 判定対象のファイルパスまたはバイト列のリスト。混在可
+
+        Returns:
+            list[tuple[str | None, str | None]]:
+                入力順のMIMEタイプ文字列とエンコーディング文字列のタプルのリスト。
+                判定失敗時の要素は(None, None)
+        """
+        results: list[tuple[str | None, str | None]] = [(None, None)] * len(inputs)
+        path_indexes, bytes_indexes = [], []
+        for i, item in enumerate(inputs):
+            mime_type = cls.__identify_by_signature(item)
+            if mime_type is not None:
+                results[i] = (mime_type, None)
+            elif isinstance(item, (bytes, bytearray)):
+                bytes_indexes.append(i)
+            else:
+                path_indexes.append(i)
+
+        if path_indexes:
+            start = time.perf_counter()
+            try:
+                path_results = MagikaSession.get().identify_paths([inputs[i] for i in path_indexes]) # type: ignore
+            except Exception as e:
+                logger.debug(e)
+                path_results = []
+            cls.__observe_batch_detection(path_results, time.perf_counter() - start)
+            for i, res in zip(path_indexes, path_results):
+                results[i] = cls.__to_type_tuple(res, lambda: cls.get_encoding(inputs[i]))
+
+        if bytes_indexes:
+            start = time.perf_counter()
+            try:
+                bytes_results = MagikaSession.identify_bytes_batch([bytes(inputs[i]) for i in bytes_indexes]) # type: ignore
+            except Exception as e:
+                logger.debug(e)
+                bytes_results = []
+            cls.__observe_batch_detection(bytes_results, time.perf_counter() - start)
+            for i, res in zip(bytes_indexes, bytes_results):
+                results[i] = cls.__to_type_tuple(res, lambda: cls.get_encoding_from_bytes(inputs[i])) # type: ignore
+
+        return results
+
+    @classmethod
+    def __identify_by_signature(cls, source: str | os.PathLike | bytes | bytearray) -> str | None:
+        # シグネチャで一意に決まる形式はMagikaのモデル推論を省略する。シグネチャはいずれもテキスト以外の形式
+        if not SignatureUtil.is_enabled():
+            return None
+        start = time.perf_counter()
+        if isinstance(source, (bytes, bytearray)):
+            mime_type = SignatureUtil.identify_bytes(source)
+        else:
+            mime_type = SignatureUtil.identify_file(source)
+        FileUtilMetrics.observe_stage(FileUtilMetrics.STAGE_SIGNATURE, mime_type or "", time.perf_counter() - start)
+        return mime_type
+
+    @classmethod
+    def __observe_batch_detection(cls, batch_results: "list[MagikaResult]", seconds: float):
+        # バッチ全体の判定時間を件数で割り、1件ごとの判定時間として記録する
+        for res in batch_results:
+            mime_type = res.output.mime_type if res.ok else ""
+            FileUtilMetrics.observe_stage(FileUtilMetrics.STAGE_DETECT, mime_type, seconds / len(batch_results))
+
+    @classmethod
+    def __to_type_tuple(cls, res: "MagikaResult", get_encoding) -> tuple[str | None, str | None]:
+        try:
+            if not res.ok:
+                return None, None
+            encoding = None
+            if res.dl.is_text:
+                with FileUtilMetrics.measure(FileUtilMetrics.STAGE_ENCODING, res.output.mime_type):
+                    encoding = get_encoding()
+            return res.output.mime_type, encoding
+        except Exception as e:
+            logger.debug(e)
+            return None, None
+
     @classmethod
     def get_encoding(cls, filename) -> str | None:
         """ファイルのエンコーディングを判定する
 
-        ファイルの先頭8192バイトを読み込んで、エンコーディングを判定します。
+        ファイルの先頭のみを読み込んで、エンコーディングを判定します。
 
         Args:
             filename: 判定対象のファイルパス
@@ -121,30 +395,21 @@ class FileUtilDocument(BaseModel):
         Returns:
             str | None: エンコーディング文字列。判定失敗時はNone
         """
-        # ファイルのbyte列を取得
-        # アクセスできない場合は例外をキャッチ
-        with open(filename, "rb") as f:
-            # 1KB読み込む
-            byte_data = f.read(8192)
-            # エンコーディング判定
-            encoding = cls.get_encoding_from_bytes(byte_data)
-            return encoding
+        return EncodingUtil.detect_file(filename)
     
     @classmethod
     def get_encoding_from_bytes(cls, byte_data: bytes) -> str | None:
         """バイト列からエンコーディングを判定する
 
+        バイト列の先頭のみを判定に使用します。
+
         Args:
             byte_data: 判定対象のバイト列
 
         Returns:
             str | None: エンコーディング文字列。判定失敗時はNone
         """
-        detector = UniversalDetector()
-        detector.feed(byte_data)
-        detector.close()
-        encoding = detector.result['encoding']  
-        return encoding
+        return EncodingUtil.detect(byte_data)
 
     def get_document_type(self) -> FileUtilDocumentType:
         """Determine the document type based on its MIME type.
@@ -192,6 +457,10 @@ class FileUtilDocument(BaseModel):
         """Check if the document type is an image type based on its MIME type."""
         return self.mime_type.startswith("image/")
     
+    def is_zip(self) -> bool:
+        """Check if the document type is a ZIP archive based on its MIME type."""
+        return self.mime_type in ("application/zip", "application/x-zip-compressed")
+    
     def is_office_document(self) -> bool:
         """Check if the document type is any Office document type based on its MIME type."""
         return self.is_excel() or self.is_word() or self.is_ppt()
@@ -199,4 +468,40 @@ class FileUtilDocument(BaseModel):
     def is_unsupported(self) -> bool:
         """Check if the document type is unsupported based on its MIME type."""
         return not (self.is_text() or self.is_pdf() or self.is_office_document() or self.is_image())
-    
+
+
+class FileUtilExtractionResult(BaseModel):
+    """1ファイル分のテキスト抽出結果"""
+    path: str = Field(..., description="Path of the extracted file")
+    mime_type: str | None = Field(default=None, description="Detected MIME type of the file")
+    text: str | None = Field(default=None, description="Extracted text. None if extraction failed")
+    error: str | None = Field(default=None, description="Error message if extraction failed")
+    elapsed_ms: float = Field(default=0.0, description="Time spent on detection and extraction in milliseconds")
+
+
+class FileUtilTextChunk(BaseModel):
+    """ストリーミング抽出で返すテキストの断片"""
+    index: int = Field(..., description="0-based index of the chunk")
+    text: str = Field(default="", description="Text of the chunk")
+    progress: int = Field(default=0, description="Number of units processed so far. Pages for PDF, chunks otherwise")
+    total: int | None = Field(default=None, description="Total number of units if known. Pages for PDF")
+    error: str | None = Field(default=None, description="Error message if the extraction failed. Sent as the last chunk")
+
+
+class FileUtilTextChunkPage(BaseModel):
+    """カーソルで取得する、分割したテキストの1チャンク"""
+    path: str = Field(..., description="Path of the extracted file")
+    text: str = Field(default="", description="Text of the chunk")
+    index: int = Field(..., description="0-based index of the chunk")
+    total_chunks: int = Field(..., description="Number of chunks in the document")
+    start: int = Field(..., description="Start offset of the chunk in the extracted text, in characters")
+    end: int = Field(..., description="End offset (exclusive) of the chunk in the extracted text, in characters")
+    tokens: int = Field(..., description="Estimated number of tokens in the chunk")
+    next_cursor: str | None = Field(default=None, description="Cursor to pass to get the next chunk. None if this is the last chunk")
+
+
+class FileUtilExcelPage(BaseModel):
+    """Excelシートから取得した1ページ分のデータ"""
+    data: dict[str, list] = Field(..., description="Imported data with column headers as keys and lists of column data as values")
+    next_offset: int | None = Field(default=None, description="Offset to pass to get the next page. None if there are no more rows")
+    total_rows: int | None = Field(default=None, description="Number of data rows in the sheet. Estimated from the sheet dimension when the end of the sheet was not read. None if unknown")
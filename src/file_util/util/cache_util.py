@@ -0,0 +1,310 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from file_util.config.file_util_config import FileUtilConfig
+
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+
+class ExtractionCacheEntry:
+    """キャッシュエントリ
+
+    判定済みのMIMEタイプ・エンコーディングと、抽出済みテキストを保持します。
+    テキストが未抽出の場合はtextがNoneになります。
+    """
+    __slots__ = ("mime_type", "encoding", "text")
+
+    def __init__(self, mime_type: str | None, encoding: str | None, text: str | None = None):
+        self.mime_type = mime_type
+        self.encoding = encoding
+        self.text = text
+
+    def size(self) -> int:
+        """メモリ上のおおよそのサイズ(バイト)を返す"""
+        size = 64 + len(self.mime_type or "") + len(self.encoding or "")
+        if self.text is not None:
+            size += len(self.text) * (1 if self.text.isascii() else 4)
+        return size
+
+
+class ExtractionCache:
+    """抽出結果のキャッシュ
+
+    メモリ上のLRUと、任意のSQLiteによるディスクキャッシュの2段構成です。
+    キーはコンテンツのハッシュ、またはファイルパス・サイズ・更新日時から生成します。
+    どちらの段もサイズ上限を超えると古いエントリから削除します。
+    """
+    _instance: "ExtractionCache | None" = None
+    _initialized = False
+    _instance_lock = threading.Lock()
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, memory_max_bytes: int, db_path: str = "", disk_max_bytes: int = 0, verify_hash: bool = False):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_max_bytes = disk_max_bytes
+        self.verify_hash = verify_hash
+        self._memory: OrderedDict[str, ExtractionCacheEntry] = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._db: sqlite3.Connection | None = None
+        # ディスクキャッシュの合計サイズ。書き込みのたびに全体を集計しないよう、増減を記録する
+        self._disk_bytes = 0
+        if db_path:
+            self._db = self.__open_db(db_path)
+            self._disk_bytes = self.__sum_db_size()
+
+    @classmethod
+    def get_instance(cls) -> "ExtractionCache | None":
+        """設定に基づくプロセス共有のキャッシュを取得する
+
+        Returns:
+            ExtractionCache | None: キャッシュ。無効化されている場合はNone
+        """
+        if not cls._initialized:
+            with cls._instance_lock:
+                if not cls._initialized:
+                    config = FileUtilConfig()
+                    if config.enable_extraction_cache:
+                        cls._instance = cls(
+                            memory_max_bytes=config.extraction_cache_memory_max_bytes,
+                            db_path=config.extraction_cache_db_path,
+                            disk_max_bytes=config.extraction_cache_disk_max_bytes,
+                            verify_hash=config.extraction_cache_verify_hash,
+                        )
+                    cls._initialized = True
+        return cls._instance
+
+    @classmethod
+    def key_for_bytes(cls, data: bytes) -> str:
+        """バイト列の内容からキャッシュキーを生成する
+
+        Args:
+            data: 対象のバイト列
+
+        Returns:
+            str: キャッシュキー
+        """
+        return cls.key_for_sha256(hashlib.sha256(data).hexdigest())
+
+    @classmethod
+    def key_for_sha256(cls, hexdigest: str) -> str:
+        """計算済みの内容のSHA-256からキャッシュキーを生成する
+
+        Args:
+            hexdigest: SHA-256(16進数)
+
+        Returns:
+            str: キャッシュキー。同じ内容のkey_for_bytesと同じ値
+        """
+        return "sha256:" + hexdigest
+
+    def key_for_path(self, filename: str) -> str:
+        """ファイルからキャッシュキーを生成する
+
+        verify_hashが有効な場合はファイル内容のハッシュ、
+        それ以外の場合はファイルパス・サイズ・更新日時をキーにします。
+
+        Args:
+            filename: 対象のファイルパス
+
+        Returns:
+            str: キャッシュキー
+        """
+        if self.verify_hash:
+            h = hashlib.sha256()
+            with open(filename, "rb") as f:
+                while chunk := f.read(self.HASH_CHUNK_SIZE):
+                    h.update(chunk)
+            return "sha256:" + h.hexdigest()
+
+        stat = os.stat(filename)
+        return f"path:{os.path.abspath(filename)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+    def get(self, key: str) -> ExtractionCacheEntry | None:
+        """キャッシュエントリを取得する
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            ExtractionCacheEntry | None: エントリ。存在しない場合はNone
+        """
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return entry
+
+            entry = self.__get_from_db(key)
+            if entry is not None:
+                self._stats["disk_hits"] += 1
+                self.__put_to_memory(key, entry)
+                return entry
+
+            self._stats["misses"] += 1
+            return None
+
+    def get_text(self, key: str) -> str | None:
+        """抽出済みテキストを取得する
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            str | None: 抽出済みテキスト。存在しない場合はNone
+        """
+        entry = self.get(key)
+        if entry is None:
+            return None
+        return entry.text
+
+    def put(self, key: str, mime_type: str | None, encoding: str | None, text: str | None = None):
+        """キャッシュエントリを登録する
+
+        textがNoneの場合、既存エントリの抽出済みテキストは保持します。
+
+        Args:
+            key: キャッシュキー
+            mime_type: MIMEタイプ
+            encoding: エンコーディング
+            text: 抽出済みテキスト
+        """
+        with self._lock:
+            if text is None:
+                current = self._memory.get(key) or self.__get_from_db(key)
+                if current is not None:
+                    text = current.text
+            entry = ExtractionCacheEntry(mime_type, encoding, text)
+            self.__put_to_memory(key, entry)
+            self.__put_to_db(key, entry)
+
+    def clear(self):
+        """キャッシュをすべて削除する"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM extraction_cache")
+                self._db.commit()
+                self._disk_bytes = 0
+
+    def stats(self) -> dict:
+        """キャッシュの統計情報を取得する
+
+        Returns:
+            dict: ヒット数、ミス数、エントリ数、使用バイト数など
+        """
+        with self._lock:
+            stats: dict = dict(self._stats)
+            lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+            stats["hit_ratio"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+            stats["memory_max_bytes"] = self.memory_max_bytes
+            if self._db is not None:
+                count, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()
+                stats["disk_entries"] = count
+                stats["disk_bytes"] = size
+                stats["disk_max_bytes"] = self.disk_max_bytes
+            return stats
+
+    def __put_to_memory(self, key: str, entry: ExtractionCacheEntry):
+        size = entry.size()
+        # 上限を超えるエントリはメモリには載せない
+        if size > self.memory_max_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old is not None:
+            self._memory_bytes -= old.size()
+        self._memory[key] = entry
+        self._memory_bytes += size
+        while self._memory_bytes > self.memory_max_bytes and self._memory:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= evicted.size()
+            self._stats["evictions"] += 1
+
+    def __open_db(self, db_path: str) -> sqlite3.Connection:
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+        db = sqlite3.connect(db_path, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS extraction_cache ("
+            "key TEXT PRIMARY KEY, mime_type TEXT, encoding TEXT, text TEXT, "
+            "size INTEGER NOT NULL, accessed REAL NOT NULL)"
+        )
+        db.execute("CREATE INDEX IF NOT EXISTS extraction_cache_accessed ON extraction_cache (accessed)")
+        db.commit()
+        return db
+
+    def __get_from_db(self, key: str) -> ExtractionCacheEntry | None:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                "SELECT mime_type, encoding, text FROM extraction_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE extraction_cache SET accessed = ? WHERE key = ?", (time.time(), key))
+            self._db.commit()
+            return ExtractionCacheEntry(row[0], row[1], row[2])
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read extraction cache: {e}")
+            return None
+
+    def __put_to_db(self, key: str, entry: ExtractionCacheEntry):
+        if self._db is None:
+            return
+        size = entry.size()
+        if self.disk_max_bytes and size > self.disk_max_bytes:
+            return
+        try:
+            row = self._db.execute("SELECT size FROM extraction_cache WHERE key = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO extraction_cache (key, mime_type, encoding, text, size, accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, entry.mime_type, entry.encoding, entry.text, size, time.time()),
+            )
+            self._disk_bytes += size - (row[0] if row is not None else 0)
+            if self.disk_max_bytes and self._disk_bytes > self.disk_max_bytes:
+                self.__evict_db()
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to write extraction cache: {e}")
+            # 書き込みに失敗した場合は記録したサイズがずれるため、集計し直す
+            self._disk_bytes = self.__sum_db_size()
+
+    def __sum_db_size(self) -> int:
+        assert self._db is not None
+        try:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM extraction_cache").fetchone()[0]
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to read extraction cache: {e}")
+            return 0
+
+    def __evict_db(self):
+        assert self._db is not None
+        # 他のプロセスと共有するDBでは記録したサイズがずれるため、削除する前に集計し直す
+        total = self.__sum_db_size()
+        self._disk_bytes = total
+        if total <= self.disk_max_bytes:
+            return
+        # 上限の9割になるまで最終アクセスが古いものから削除
+        target = self.disk_max_bytes * 9 // 10
+        rows = self._db.execute("SELECT key, size FROM extraction_cache ORDER BY accessed").fetchall()
+        for key, size in rows:
+            if total <= target:
+                break
+            self._db.execute("DELETE FROM extraction_cache WHERE key = ?", (key,))
+            total -= size
+            self._stats["evictions"] += 1
+        self._disk_bytes = total
@@ -0,0 +1,249 @@
+import base64
+import bisect
+import json
+import re
+import threading
+from collections import OrderedDict
+
+from file_util.config.file_util_config import FileUtilConfig
+
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+# トークン数の見積もりに使用するパターン
+# 英数字の連続を1トークン、それ以外の空白以外の文字(日本語、記号など)を1文字1トークンとみなす
+_TOKEN_PATTERN = re.compile(r"[0-9A-Za-z]+|\S")
+
+# チャンクの区切りとする位置。優先度の高い順
+# ページ・シートの区切り、段落(行)の区切り、文の区切り、単語の区切り
+_BOUNDARIES: tuple[tuple[str, ...], ...] = (
+    ("\f",),
+    ("\n",),
+    ("。", "．", "！", "？", ". ", "! ", "? "),
+    (" ", "\t", "、", "，"),
+)
+
+
+class ChunkUtil:
+    """抽出したテキストをチャンクに分割するユーティリティ"""
+
+    UNIT_CHARS = "chars"
+    UNIT_TOKENS = "tokens"
+
+    @classmethod
+    def split_text(cls, text: str, chunk_size: int, overlap: int = 0, unit: str = UNIT_CHARS) -> list[tuple[int, int]]:
+        """テキストをチャンクに分割する
+
+        チャンクの末尾は、ページ・シート、段落、文、単語の区切りの順に、
+        チャンクの後半にある最も優先度の高い区切りに合わせます。
+        区切りが見つからない場合はchunk_sizeの位置で分割します。
+
+        Args:
+            text: 分割するテキスト
+            chunk_size: チャンクの最大の長さ。unitで指定した単位
+            overlap: 前のチャンクと重複させる長さ。unitで指定した単位
+            unit: 長さの単位。"chars"(文字数)または"tokens"(見積もりのトークン数)
+
+        Returns:
+            list[tuple[int, int]]: チャンクの(開始位置, 終了位置)のリスト。位置は文字単位
+
+        Raises:
+            ValueError: chunk_sizeが1未満、overlapがchunk_size以上、unitが不正な場合
+        """
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        if overlap < 0 or overlap >= chunk_size:
+            raise ValueError("overlap must be between 0 and chunk_size - 1")
+        if unit == cls.UNIT_CHARS:
+            offsets = None
+        elif unit == cls.UNIT_TOKENS:
+            # トークンの開始位置。文字位置とトークン数の変換に使用する
+            offsets = [match.start() for match in _TOKEN_PATTERN.finditer(text)]
+        else:
+            raise ValueError(f"Unsupported unit: {unit}")
+
+        length = len(text)
+
+        def advance(pos: int, count: int) -> int:
+            # posからcount単位進んだ文字位置
+            if offsets is None:
+                return min(pos + count, length)
+            index = bisect.bisect_left(offsets, pos) + count
+            return offsets[index] if index < len(offsets) else length
+
+        def retreat(pos: int, count: int) -> int:
+            # posからcount単位戻った文字位置
+            if offsets is None:
+                return max(pos - count, 0)
+            index = bisect.bisect_left(offsets, pos) - count
+            return offsets[max(index, 0)]
+
+        spans: list[tuple[int, int]] = []
+        start = 0
+        while start < length:
+            limit = advance(start, chunk_size)
+            if limit >= length:
+                spans.append((start, length))
+                break
+            end = cls.__find_boundary(text, advance(start, chunk_size // 2), limit) or limit
+            spans.append((start, end))
+            next_start = end
+            if overlap > 0:
+                # 重複部分の先頭も単語の区切りに合わせる
+                next_start = retreat(end, overlap)
+                boundary = cls.__find_word_start(text, next_start, end)
+                next_start = max(boundary, start + 1)
+            start = next_start
+        return spans
+
+    @classmethod
+    def count_tokens(cls, text: str) -> int:
+        """テキストのトークン数を見積もる
+
+        Args:
+            text: 対象のテキスト
+
+        Returns:
+            int: 見積もりのトークン数
+        """
+        return sum(1 for _ in _TOKEN_PATTERN.finditer(text))
+
+    @classmethod
+    def encode_cursor(cls, state: dict) -> str:
+        """チャンクの取得位置をカーソル文字列にする
+
+        Args:
+            state: カーソルに含める値
+
+        Returns:
+            str: URLセーフなカーソル文字列
+        """
+        data = json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def decode_cursor(cls, cursor: str) -> dict:
+        """カーソル文字列を元の値に戻す
+
+        Args:
+            cursor: encode_cursorで作成したカーソル文字列
+
+        Returns:
+            dict: カーソルに含めた値
+
+        Raises:
+            ValueError: カーソルが不正な場合
+        """
+        try:
+            data = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            state = json.loads(data)
+        except (ValueError, UnicodeDecodeError) as e:
+            raise ValueError(f"Invalid cursor: {cursor}") from e
+        if not isinstance(state, dict):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        return state
+
+    @classmethod
+    def __find_boundary(cls, text: str, low: int, high: int) -> int | None:
+        # [low, high)の範囲で、最も優先度の高い区切りの直後の位置を返す
+        for separators in _BOUNDARIES:
+            best = -1
+            for separator in separators:
+                pos = text.rfind(separator, low, high)
+                if pos >= 0:
+                    best = max(best, pos + len(separator))
+            if best > low:
+                return min(best, high)
+        return None
+
+    @classmethod
+    def __find_word_start(cls, text: str, low: int, high: int) -> int:
+        # [low, high)の範囲で、最初の空白の直後の位置を返す。見つからない場合はlow
+        if low == 0 or text[low - 1].isspace():
+            return low
+        for pos in range(low, high):
+            if text[pos].isspace():
+                return pos + 1
+        return low
+
+
+class ChunkedText:
+    """チャンクに分割したテキスト"""
+    __slots__ = ("text", "spans")
+
+    def __init__(self, text: str, spans: list[tuple[int, int]]):
+        self.text = text
+        self.spans = spans
+
+    def size(self) -> int:
+        """メモリ上のおおよそのサイズ(バイト)を返す"""
+        return 64 + len(self.text) * (1 if self.text.isascii() else 4) + len(self.spans) * 72
+
+
+class TextChunkCache:
+    """チャンクに分割したテキストのキャッシュ
+
+    カーソルで続きのチャンクを取得する際に、テキストの抽出と分割をやり直さないために使用します。
+    メモリ上のLRUで、サイズ上限を超えると古いエントリから削除します。
+    """
+    _instance: "TextChunkCache | None" = None
+    _initialized = False
+    _instance_lock = threading.Lock()
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, ChunkedText] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "TextChunkCache | None":
+        """設定に基づくプロセス共有のキャッシュを取得する
+
+        Returns:
+            TextChunkCache | None: キャッシュ。無効化されている場合はNone
+        """
+        if not cls._initialized:
+            with cls._instance_lock:
+                if not cls._initialized:
+                    config = FileUtilConfig()
+                    if config.text_chunk_cache_max_bytes > 0:
+                        cls._instance = cls(config.text_chunk_cache_max_bytes)
+                    cls._initialized = True
+        return cls._instance
+
+    def get(self, key: str) -> ChunkedText | None:
+        """キャッシュからチャンクに分割したテキストを取得する
+
+        Args:
+            key: キャッシュキー
+
+        Returns:
+            ChunkedText | None: チャンクに分割したテキスト。存在しない場合はNone
+        """
+        with self._lock:
+            chunked = self._entries.get(key)
+            if chunked is not None:
+                self._entries.move_to_end(key)
+            return chunked
+
+    def put(self, key: str, chunked: ChunkedText):
+        """チャンクに分割したテキストをキャッシュに保存する
+
+        Args:
+            key: キャッシュキー
+            chunked: チャンクに分割したテキスト
+        """
+        size = chunked.size()
+        if size > self.max_bytes:
+            logger.debug(f"Chunked text is too large to cache: {key}")
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.size()
+            self._entries[key] = chunked
+            self._bytes += size
+            while self._bytes > self.max_bytes and self._entries:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size()
@@ -0,0 +1,126 @@
+import codecs
+import re
+import threading
+from typing import TYPE_CHECKING
+
+from file_util.config.file_util_config import FileUtilConfig
+
+# chardetはBOM・ASCII・UTF-8で判定できない場合のみ使用するため、使用する時点で読み込む
+if TYPE_CHECKING:
+    from chardet import UniversalDetector
+
+# BOMとエンコーディングの対応。UTF-32のBOMはUTF-16のBOMで始まるため先に判定する
+_BOMS: tuple[tuple[bytes, str], ...] = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# ASCII以外のバイトまたはエスケープシーケンスの開始
+_NON_ASCII_PATTERN = re.compile(rb"[\x80-\xff\x1b]")
+
+
+class EncodingUtil:
+    """テキストのエンコーディングを判定するユーティリティ
+
+    以下の順に判定し、判定できた時点で終了します。
+    1. BOM
+    2. 先頭のサンプルがASCIIのみ(エスケープシーケンスを含まない)、またはUTF-8として正しいか
+    3. chardetによる判定。サンプルを少しずつ渡し、判定が確定した時点で打ち切る
+
+    1と2は高速なため、サンプル全体を使用します。
+    chardetには最初のASCII以外のバイトの少し前から、最大DETECTOR_MAX_SIZEバイトを渡します。
+    """
+
+    # chardetに1回に渡すバイト数
+    DETECTOR_FEED_SIZE = 4096
+    # chardetに渡す最大バイト数
+    DETECTOR_MAX_SIZE = 8192
+    # chardetに渡す、最初のASCII以外のバイトより前のバイト数
+    DETECTOR_CONTEXT_SIZE = 256
+
+    _sample_size: int | None = None
+    _local = threading.local()
+
+    @classmethod
+    def get_sample_size(cls) -> int:
+        """判定に使用する先頭のバイト数を取得する
+
+        Returns:
+            int: 判定に使用する先頭のバイト数
+        """
+        if cls._sample_size is None:
+            cls._sample_size = max(FileUtilConfig().encoding_detection_sample_size, cls.DETECTOR_FEED_SIZE)
+        return cls._sample_size
+
+    @classmethod
+    def detect_file(cls, filename: str) -> str | None:
+        """ファイルのエンコーディングを判定する
+
+        Args:
+            filename: 判定対象のファイルパス
+
+        Returns:
+            str | None: エンコーディング。判定失敗時はNone
+        """
+        with open(filename, "rb") as f:
+            return cls.detect(f.read(cls.get_sample_size()), complete=f.read(1) == b"")
+
+    @classmethod
+    def detect(cls, data: bytes | bytearray | memoryview, complete: bool | None = None) -> str | None:
+        """バイト列のエンコーディングを判定する
+
+        先頭のサンプルのみを判定に使用します。
+
+        Args:
+            data: 判定対象のバイト列
+            complete: dataがデータ全体かどうか。Noneの場合はサンプルより短ければデータ全体とみなす。
+                データの途中までの場合は、末尾で途切れたマルチバイト文字をエラーとしない
+
+        Returns:
+            str | None: エンコーディング。判定失敗時はNone
+        """
+        sample_size = cls.get_sample_size()
+        sample = bytes(memoryview(data)[:sample_size])
+        # サンプルがデータ全体かどうか
+        complete = (complete is None or complete) and len(data) <= sample_size
+
+        for bom, encoding in _BOMS:
+            if sample.startswith(bom):
+                return encoding
+        if not sample:
+            return None
+        # ISO-2022-JPは7ビットのため、エスケープシーケンスを含む場合はchardetで判定する
+        if b"\x1b" not in sample:
+            if sample.isascii():
+                # サンプルの後に非ASCII文字が続く場合に失われないよう、途中までの場合はASCIIの上位互換のUTF-8とする
+                return "ascii" if complete else "utf-8"
+            try:
+                codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+                return "utf-8"
+            except UnicodeDecodeError:
+                pass
+        return cls.__detect_with_chardet(sample)
+
+    @classmethod
+    def __detect_with_chardet(cls, sample: bytes) -> str | None:
+        # 判定器の生成はコストが高いため、スレッドごとに1つ作成してreset()で使い回す
+        detector: UniversalDetector | None = getattr(cls._local, "detector", None)
+        if detector is None:
+            from chardet import UniversalDetector
+            detector = UniversalDetector()
+            cls._local.detector = detector
+        else:
+            detector.reset()
+        # 先頭のASCIIのみの部分は判定の手がかりにならないため読み飛ばす
+        match = _NON_ASCII_PATTERN.search(sample)
+        offset = max(match.start() - cls.DETECTOR_CONTEXT_SIZE, 0) if match is not None else 0
+        end = min(offset + cls.DETECTOR_MAX_SIZE, len(sample))
+        for start in range(offset, end, cls.DETECTOR_FEED_SIZE):
+            detector.feed(sample[start:min(start + cls.DETECTOR_FEED_SIZE, end)])
+            if detector.done:
+                break
+        detector.close()
+        return detector.result["encoding"]
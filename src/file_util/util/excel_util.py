@@ -1,94 +1,320 @@
 import datetime
-import openpyxl
+import itertools
+import zipfile
 from io import StringIO
+from typing import Iterable, Iterator, Sequence, Union
+from xml.etree import ElementTree
+
+from file_util.model import FileUtilExcelPage
+from file_util.util.source_util import DocumentSource, SourceUtil
+
+# シートのデータ。列の辞書、行のイテラブル、行のチャンクのイテラブルのいずれか
+ExcelSheetData = Union[dict[str, list], Iterable[Sequence], Iterable[Sequence[Sequence]]]
 
 class ExcelUtil:
 
     # application/vnd.openxmlformats-officedocument.spreadsheetml.sheetのファイルを読み込んで文字列として返す関数
     @classmethod
-    def extract_text_from_sheet(cls, filename:str, sheet_name:str=""):
+    def extract_text_from_sheet(cls, filename: DocumentSource, sheet_name:str=""):
         # 出力用のストリームを作成
         output = StringIO()
-        wb = openpyxl.load_workbook(filename)
-        for sheet in wb:
-            # シート名が指定されている場合はそのシートのみ処理
-            if sheet_name and sheet.title != sheet_name:
-                continue
-            for row in sheet.iter_rows(values_only=True):
-                # 1行分のデータを格納するリスト
-                cells = []
-                for cell in row:
-                    # cell.valueがNoneの場合はcontinue
-                    if cell is None:
-                        continue
-                    # cell.valueがdatetime.datetimeの場合はisoformat()で文字列に変換
-                    if isinstance(cell, datetime.datetime):
-                        cells.append(cell.isoformat())
-                    else:
-                        cells.append(str(cell))
-                    
-                output.write("\t".join(cells))
-                output.write("\n")
-        
+        for line in cls.iter_sheet_text(filename, sheet_name):
+            output.write(line)
         return output.getvalue()
 
+    # シートのテキストを1行ずつ返す関数。ストリーミング出力で使用する
+    @classmethod
+    def iter_sheet_text(cls, filename: DocumentSource, sheet_name:str="") -> Iterator[str]:
+        # openpyxlは読み込みに時間がかかるため、使用する時点で読み込む
+        import openpyxl
+        # 読み取り専用モードで開き、行は必要になった時点で1行ずつ読み込む
+        wb = openpyxl.load_workbook(SourceUtil.to_path_or_stream(filename), read_only=True, data_only=True)
+        try:
+            if sheet_name:
+                # シート名が指定されている場合はそのシートのみ処理。他のシートは解析しない
+                sheets = [wb[sheet_name]] if sheet_name in wb.sheetnames else []
+            else:
+                sheets = wb.worksheets
+            for index, sheet in enumerate(sheets):
+                if index > 0:
+                    # シートの区切りはPDFのページと同じく改ページ文字で表す
+                    yield "\f"
+                for row in cls.__iter_used_rows(sheet):
+                    # 1行分のデータを格納するリスト
+                    cells = []
+                    for cell in row:
+                        # cell.valueがNoneの場合はcontinue
+                        if cell is None:
+                            continue
+                        # cell.valueがdatetime.datetimeの場合はisoformat()で文字列に変換
+                        if isinstance(cell, datetime.datetime):
+                            cells.append(cell.isoformat())
+                        else:
+                            cells.append(str(cell))
+
+                    yield "\t".join(cells) + "\n"
+        finally:
+            wb.close()
+
+    @classmethod
+    def __iter_used_rows(cls, sheet) -> Iterator[tuple]:
+        """シートの値が入っている範囲の行を1行ずつ返す
+
+        シートのdimensionに記録された最大行・最大列は実際のデータより大きい場合があるため、
+        dimensionを破棄してシートのXMLに実在する行だけを読み込みます。
+        書式のみが設定された末尾の空行は返しません。
+        """
+        if not hasattr(sheet, "iter_rows"):
+            # チャートシートなど
+            return
+        if hasattr(sheet, "reset_dimensions"):
+            sheet.reset_dimensions()
+        empty_rows: list[tuple] = []
+        for row in sheet.iter_rows(values_only=True):
+            if all(cell is None for cell in row):
+                empty_rows.append(row)
+                continue
+            # 値のある行が続いた場合のみ、途中の空行を返す
+            yield from empty_rows
+            empty_rows.clear()
+            yield row
+
     # excelのシート名一覧を取得する関数
     @classmethod
     def get_sheet_names(cls, filename):
-        import openpyxl
-        wb = openpyxl.load_workbook(filename)
-        return wb.sheetnames
+        # ワークブック全体は読み込まず、zip内のワークブック定義のみを読み込む
+        with zipfile.ZipFile(filename) as archive:
+            workbook_part = cls.__get_workbook_part(archive)
+            sheet_names = []
+            with archive.open(workbook_part) as f:
+                for _, elem in ElementTree.iterparse(f, events=("end",)):
+                    tag = elem.tag.rsplit("}", 1)[-1]
+                    if tag == "sheet":
+                        sheet_names.append(elem.get("name"))
+                    elif tag == "sheets":
+                        # シート一覧の後の定義は不要
+                        break
+            return sheet_names
+
+    @classmethod
+    def __get_workbook_part(cls, archive: zipfile.ZipFile) -> str:
+        # ワークブックのパスはパッケージのリレーションシップから取得する
+        try:
+            with archive.open("_rels/.rels") as f:
+                for _, elem in ElementTree.iterparse(f, events=("end",)):
+                    if elem.tag.rsplit("}", 1)[-1] == "Relationship" and elem.get("Type", "").endswith("/officeDocument"):
+                        return elem.get("Target", "").lstrip("/")
+        except KeyError:
+            pass
+        return "xl/workbook.xml"
 
     # データをExcelファイルにエクスポートする関数
     @classmethod
-    def export_data_to_excel(cls, data: dict[str, list], filename, sheet_name: str| None ="Sheet1"):
+    def export_data_to_excel(cls, data: ExcelSheetData, filename, sheet_name: str| None ="Sheet1"):
+        cls.export_sheets_to_excel({sheet_name or "Sheet1": data}, filename)
+
+    # 複数シートのデータをExcelファイルにエクスポートする関数
+    @classmethod
+    def validate_sheet_name(cls, sheet_name: str):
+        """シート名がExcelのシート名として使用できるかを確認する
+
+        書き込みを開始する前に、シートの作成で失敗しないことを確認するために使用します。
+
+        Args:
+            sheet_name: シート名
+
+        Raises:
+            ValueError: シート名に使用できない文字(\\ * ? : / [ ])を含む場合
+        """
+        from openpyxl.workbook.child import INVALID_TITLE_REGEX
+        if INVALID_TITLE_REGEX.search(sheet_name):
+            raise ValueError(f"Invalid character in sheet name: {sheet_name}")
+
+    @classmethod
+    def export_sheets_to_excel(cls, sheets: dict[str, ExcelSheetData], filename):
+        """複数シートのデータを書き込み専用モードでExcelファイルに出力する
+
+        行は1行ずつ一時ファイルに書き出されるため、行数に関わらずメモリ使用量は一定です。
+        シートのデータには以下のいずれかを指定できます。
+        * 列見出しをキー、列の値のリストを値とする辞書
+        * 行(セルの値のリスト)のイテラブル
+        * 行のリスト(チャンク)のイテラブル
+
+        Args:
+            sheets: シート名をキー、シートのデータを値とする辞書
+            filename: 出力先のファイルパス
+        """
         import openpyxl
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        if ws is None:
-            ws = wb.create_sheet()
-        if sheet_name is not None:
-            ws.title = sheet_name
-
-        # ヘッダー行の追加
-        headers = list(data.keys())
-        ws.append(headers)
-        # データ行の追加
-        num_rows = len(next(iter(data.values()), []))
-        for i in range(num_rows):
-            row = []
-            for header in headers:
-                column_data = data.get(header, [])
-                if i < len(column_data):
-                    row.append(column_data[i])
-                else:
-                    row.append("")
-            ws.append(row)
-        
+        wb = openpyxl.Workbook(write_only=True)
+        for sheet_name, data in sheets.items():
+            ws = wb.create_sheet(title=sheet_name)
+            for row in cls.__iter_export_rows(data):
+                ws.append(row)
         wb.save(filename)
 
+    @classmethod
+    def __iter_export_rows(cls, data: ExcelSheetData) -> Iterator[list]:
+        if isinstance(data, dict):
+            # ヘッダー行の追加
+            headers = list(data.keys())
+            yield headers
+            # データ行の追加
+            num_rows = len(next(iter(data.values()), []))
+            for i in range(num_rows):
+                row = []
+                for header in headers:
+                    column_data = data.get(header, [])
+                    if i < len(column_data):
+                        row.append(column_data[i])
+                    else:
+                        row.append("")
+                yield row
+            return
+
+        for item in data:
+            # セルの値がリストになることはないため、先頭要素がリストであれば行のチャンクとみなす
+            if item and isinstance(item[0], (list, tuple)):
+                for row in item:
+                    yield list(row)
+            else:
+                yield list(item)
+
     # Excelファイルの内容を辞書型で取得する関数
     @classmethod
-    def import_data_from_excel(cls, filename, sheet_name: str | None ="Sheet1") -> dict[str, list]:
+    def import_data_from_excel(cls, filename, sheet_name: str | None ="Sheet1", offset: int = 0, limit: int | None = None,
+                               columns: list[str] | None = None, header_row: int = 1) -> dict[str, list]:
+        """Excelファイルのシートの内容を列見出しをキーとする辞書で取得する
+
+        Args:
+            filename: Excelファイルのパス
+            sheet_name: シート名。存在しない場合はアクティブなシート
+            offset: 読み飛ばすデータ行数
+            limit: 取得する最大データ行数。Noneの場合は制限なし
+            columns: 取得する列の見出しのリスト。Noneの場合は全列
+            header_row: 見出し行の行番号(1始まり)。0の場合は見出し行なしとして列名(A, B, ...)をキーにする
+
+        Returns:
+            dict[str, list]: 列見出しをキー、列の値のリストを値とする辞書
+        """
+        return cls.import_data_page_from_excel(filename, sheet_name, offset, limit, columns, header_row).data
+
+    # Excelファイルの内容をページ単位で取得する関数
+    @classmethod
+    def import_data_page_from_excel(cls, filename, sheet_name: str | None ="Sheet1", offset: int = 0, limit: int | None = None,
+                                    columns: list[str] | None = None, header_row: int = 1) -> FileUtilExcelPage:
+        """Excelファイルのシートの内容をページ単位で取得する
+
+        行は1行ずつ読み込み、ページ分の行を読み込んだ時点で読み込みを終了します。
+
+        Args:
+            filename: Excelファイルのパス
+            sheet_name: シート名。存在しない場合はアクティブなシート
+            offset: 読み飛ばすデータ行数
+            limit: 取得する最大データ行数。Noneの場合は制限なし
+            columns: 取得する列の見出しのリスト。Noneの場合は全列
+            header_row: 見出し行の行番号(1始まり)。0の場合は見出し行なしとして列名(A, B, ...)をキーにする
+
+        Returns:
+            FileUtilExcelPage: 取得したデータ、次のページのoffset、データ行数
+
+        Raises:
+            ValueError: columnsに存在しない列見出しが含まれる場合
+        """
         import openpyxl
-        wb = openpyxl.load_workbook(filename)
-        if sheet_name in wb.sheetnames:
-            ws = wb[sheet_name]
-        else:
-            ws = wb.active
-        if ws is None:
-            return {}
-        
-        data: dict[str, list] = {}
-        rows = list(ws.iter_rows(values_only=True))
-        if not rows:
-            return data
-
-        headers = rows[0]
-        for header in headers:
-            data[str(header)] = []
-        for row in rows[1:]:
-            for header, cell in zip(headers, row):
-                data[str(header)].append(cell)
-        
-        return data          
\ No newline at end of file
+        from openpyxl.utils import get_column_letter
+        wb = openpyxl.load_workbook(filename, read_only=True, data_only=True)
+        try:
+            if sheet_name in wb.sheetnames:
+                ws = wb[sheet_name]
+            else:
+                ws = wb.active
+            if ws is None:
+                return FileUtilExcelPage(data={})
+
+            # dimensionに記録された行数は、末尾の空行を含む場合があるため目安として扱う
+            dimension_rows = ws.max_row if isinstance(ws.max_row, int) else None
+            rows = cls.__iter_used_rows(ws)
+
+            if header_row > 0:
+                # 見出し行より前の行は読み飛ばす
+                headers = next(itertools.islice(rows, header_row - 1, None), None)
+                if headers is None:
+                    return FileUtilExcelPage(data={}, total_rows=0)
+                headers = [str(header) for header in headers]
+            else:
+                headers = None
+
+            page_rows = list(itertools.islice(rows, offset, offset + limit if limit is not None else None))
+            if headers is None:
+                width = max((len(row) for row in page_rows), default=0)
+                headers = [get_column_letter(i + 1) for i in range(width)]
+
+            indexes = list(range(len(headers)))
+            if columns is not None:
+                missing = [column for column in columns if column not in headers]
+                if missing:
+                    raise ValueError(f"Columns not found: {missing}")
+                indexes = [headers.index(column) for column in columns]
+
+            data: dict[str, list] = {headers[i]: [] for i in indexes}
+            for row in page_rows:
+                for i in indexes:
+                    data[headers[i]].append(row[i] if i < len(row) else None)
+
+            # 次の行が存在するかどうかだけを確認する
+            has_next = limit is not None and next(rows, None) is not None
+            next_offset = offset + len(page_rows) if has_next else None
+            if not has_next:
+                total_rows = offset + len(page_rows) if len(page_rows) > 0 or offset == 0 else None
+            elif dimension_rows is not None:
+                total_rows = max(dimension_rows - max(header_row, 0), 0)
+            else:
+                total_rows = None
+            return FileUtilExcelPage(data=data, next_offset=next_offset, total_rows=total_rows)
+        finally:
+            wb.close()
+
+    # Excelファイルの内容を型付きの列データで取得する関数
+    @classmethod
+    def import_columns_from_excel(cls, filename, sheet_name: str | None ="Sheet1", offset: int = 0, limit: int | None = None,
+                                  columns: list[str] | None = None, header_row: int = 1, output: str = "numpy"):
+        """Excelファイルのシートの内容を型付きの列データで取得する
+
+        プログラムから利用するためのAPIです。numpyまたはpyarrowが必要です。
+
+        Args:
+            filename: Excelファイルのパス
+            sheet_name: シート名。存在しない場合はアクティブなシート
+            offset: 読み飛ばすデータ行数
+            limit: 取得する最大データ行数。Noneの場合は制限なし
+            columns: 取得する列の見出しのリスト。Noneの場合は全列
+            header_row: 見出し行の行番号(1始まり)。0の場合は見出し行なし
+            output: "numpy"の場合は列見出しをキーとするnumpy配列の辞書、"arrow"の場合はpyarrow.Table
+
+        Returns:
+            dict[str, numpy.ndarray] | pyarrow.Table: 列データ
+        """
+        data = cls.import_data_from_excel(filename, sheet_name, offset, limit, columns, header_row)
+        if output == "arrow":
+            try:
+                import pyarrow # type: ignore
+            except ImportError as e:
+                raise ImportError("pyarrow is required for output='arrow'. Install it with 'pip install pyarrow'.") from e
+            return pyarrow.table(data)
+        if output == "numpy":
+            try:
+                import numpy # type: ignore
+            except ImportError as e:
+                raise ImportError("numpy is required for output='numpy'. Install it with 'pip install numpy'.") from e
+            return {header: cls.__to_numpy_array(numpy, values) for header, values in data.items()}
+        raise ValueError(f"Unsupported output: {output}")
+
+    @classmethod
+    def __to_numpy_array(cls, numpy, values: list):
+        # 数値のみの列は数値型、空セルを含む数値列は欠損値をnanとしたfloat型、それ以外はobject型
+        non_empty = [value for value in values if value is not None]
+        if non_empty and all(isinstance(value, (int, float)) and not isinstance(value, bool) for value in non_empty):
+            if len(non_empty) == len(values):
+                return numpy.array(values)
+            return numpy.array([numpy.nan if value is None else value for value in values], dtype=float)
+        return numpy.array(values, dtype=object)
@@ -0,0 +1,215 @@
+import asyncio
+import os
+import threading
+import weakref
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable
+
+from file_util.config.file_util_config import FileUtilConfig
+from file_util.util.metrics_util import FileUtilMetrics
+
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+
+class ExtractorExecutor:
+    """CPU負荷の高い抽出処理をイベントループ外で実行するエグゼキューター
+
+    既定ではプロセスプールを使用し、以下を制御します。
+    * ワーカー数
+    * タスクごとのタイムアウト
+    * 同時に受け付けるタスク数の上限(上限に達した場合は空きが出るまで待機)
+    * 一定数のタスクを処理したワーカーの再起動(パーサーのメモリリーク対策)
+
+    プロセスプールでは実行中のタスクを個別に中断できないため、タイムアウトしたタスクがある場合はプールを作り直します。
+    同じプールで実行中・待機中だった他のタスクは失敗させずに、新しいプールに再投入します。
+    """
+    _instance: "ExtractorExecutor | None" = None
+    _instance_lock = threading.Lock()
+
+    MODE_PROCESS = "process"
+    MODE_THREAD = "thread"
+    MODE_INLINE = "inline"
+
+    # プールの作り直しに巻き込まれたタスクを再投入する最大回数
+    MAX_RESUBMITS = 2
+    # タスクの実行開始を確認する間隔(秒)。タイムアウトは実行開始から計測する
+    START_POLL_INTERVAL = 0.05
+
+    def __init__(self, mode: str = MODE_PROCESS, max_workers: int | None = None, task_timeout: float = 0,
+                 max_queue_size: int = 0, max_tasks_per_worker: int = 0):
+        """
+        Args:
+            mode: "process"、"thread"、"inline"(呼び出し元のスレッドで実行)のいずれか
+            max_workers: ワーカー数。Noneの場合はCPU数
+            task_timeout: タスクごとのタイムアウト秒数。ワーカーで実行を開始してから計測する。0以下の場合はタイムアウトなし
+            max_queue_size: 実行中と待機中を合わせたタスク数の上限。0以下の場合はワーカー数の4倍
+            max_tasks_per_worker: ワーカーを再起動するまでのタスク数。0以下の場合は再起動しない
+        """
+        if mode not in (self.MODE_PROCESS, self.MODE_THREAD, self.MODE_INLINE):
+            raise ValueError(f"Unsupported executor mode: {mode}")
+        self.mode = mode
+        self.max_workers = max_workers
+        self.task_timeout = task_timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self._executor: Executor | None = None
+        self._executor_lock = threading.Lock()
+        # タイムアウトなどで停止したプール。このプールのタスクの失敗・キャンセルは再投入の対象とする
+        self._terminated_executors: weakref.WeakSet[Executor] = weakref.WeakSet()
+        workers = max_workers or self.__default_workers()
+        self.max_queue_size = max_queue_size if max_queue_size > 0 else workers * 4
+        # セマフォはイベントループごとに生成する
+        self._semaphores: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore] = weakref.WeakKeyDictionary()
+
+    @property
+    def worker_count(self) -> int:
+        """ワーカー数。max_workersが指定されていない場合はCPU数"""
+        return self.max_workers or self.__default_workers()
+
+    @classmethod
+    def get_instance(cls) -> "ExtractorExecutor":
+        """設定に基づくプロセス共有のエグゼキューターを取得する
+
+        Returns:
+            ExtractorExecutor: エグゼキューター
+        """
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    config = FileUtilConfig()
+                    cls._instance = cls(
+                        mode=config.extractor_executor_mode,
+                        max_workers=config.extractor_max_workers or None,
+                        task_timeout=config.extractor_task_timeout,
+                        max_queue_size=config.extractor_max_queue_size,
+                        max_tasks_per_worker=config.extractor_max_tasks_per_worker,
+                    )
+        return cls._instance
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        """関数をワーカーで実行し、結果を返す
+
+        プロセスモードの場合、funcと引数はpickle可能である必要があります。
+
+        Args:
+            func: 実行する関数
+            *args: 関数の位置引数
+            **kwargs: 関数のキーワード引数
+
+        Returns:
+            Any: 関数の戻り値
+
+        Raises:
+            TimeoutError: タスクがタイムアウトした場合
+        """
+        if self.mode == self.MODE_INLINE:
+            return func(*args, **kwargs)
+
+        # 空きを待っているタスクも実行中の処理数に含める
+        with FileUtilMetrics.track_in_flight("executor_task"):
+            return await self.__run_in_executor(func, *args, **kwargs)
+
+    async def __run_in_executor(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        async with self.__get_semaphore():
+            loop = asyncio.get_running_loop()
+            resubmits = 0
+            while True:
+                executor = self.__get_executor()
+                future = executor.submit(func, *args, **kwargs)
+                try:
+                    return await self.__wait(future, loop)
+                except asyncio.TimeoutError:
+                    logger.error(f"Extractor task timed out after {self.task_timeout} seconds: {getattr(func, '__qualname__', func)}")
+                    # 実行中のタスクは中断できないため、プロセスプールの場合はプールごと作り直す
+                    if self.mode == self.MODE_PROCESS:
+                        self.__reset_executor(executor)
+                    raise TimeoutError(f"Extractor task timed out after {self.task_timeout} seconds")
+                except (BrokenProcessPool, asyncio.CancelledError) as e:
+                    if not self.__is_collateral(executor, future, e) or resubmits >= self.MAX_RESUBMITS:
+                        if isinstance(e, BrokenProcessPool):
+                            self.__reset_executor(executor)
+                        raise
+                    resubmits += 1
+                    logger.warning(f"Resubmitting extractor task after its worker pool was restarted: {getattr(func, '__qualname__', func)}")
+
+    async def __wait(self, future: Future, loop: asyncio.AbstractEventLoop) -> Any:
+        wrapped = asyncio.wrap_future(future, loop=loop)
+        if self.task_timeout <= 0:
+            return await wrapped
+        # プールの空きを待っている時間はタイムアウトに含めない
+        try:
+            while not future.running() and not future.done():
+                await asyncio.wait({wrapped}, timeout=self.START_POLL_INTERVAL)
+        except asyncio.CancelledError:
+            wrapped.cancel()
+            raise
+        return await asyncio.wait_for(wrapped, self.task_timeout)
+
+    def __is_collateral(self, executor: Executor, future: Future, error: BaseException) -> bool:
+        # 他のタスクのタイムアウト・異常終了によるプールの停止で失敗・キャンセルされたかどうか
+        if executor not in self._terminated_executors:
+            return False
+        if isinstance(error, asyncio.CancelledError):
+            # 呼び出し元のタスク自体のキャンセルは再投入しない
+            task = asyncio.current_task()
+            return future.cancelled() and task is not None and task.cancelling() == 0
+        return True
+
+    def shutdown(self, wait: bool = True):
+        """ワーカーを停止する
+
+        Args:
+            wait: 実行中のタスクの完了を待つかどうか
+        """
+        with self._executor_lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=True)
+                self._executor = None
+
+    def __get_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_queue_size)
+            self._semaphores[loop] = semaphore
+        return semaphore
+
+    def __get_executor(self) -> Executor:
+        if self._executor is None:
+            with self._executor_lock:
+                if self._executor is None:
+                    self._executor = self.__create_executor()
+        return self._executor
+
+    def __create_executor(self) -> Executor:
+        workers = self.max_workers or self.__default_workers()
+        if self.mode == self.MODE_THREAD:
+            return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="file_util_extractor")
+        if self.max_tasks_per_worker > 0:
+            import multiprocessing
+            # max_tasks_per_childはforkでは使用できないためspawnを使用する
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                max_tasks_per_child=self.max_tasks_per_worker,
+            )
+        return ProcessPoolExecutor(max_workers=workers)
+
+    def __reset_executor(self, executor: Executor):
+        with self._executor_lock:
+            if self._executor is executor:
+                self._executor = None
+            self._terminated_executors.add(executor)
+        processes = []
+        if isinstance(executor, ProcessPoolExecutor):
+            processes = list((getattr(executor, "_processes", None) or {}).values())
+        executor.shutdown(wait=False, cancel_futures=True)
+        # タイムアウトしたタスクを実行中のワーカープロセスを停止する
+        # 同じプールの他のタスクはBrokenProcessPoolまたはキャンセルとなり、呼び出し元で再投入される
+        for process in processes:
+            process.terminate()
+
+    @classmethod
+    def __default_workers(cls) -> int:
+        return os.cpu_count() or 1
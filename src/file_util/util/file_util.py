@@ -1,20 +1,124 @@
-import base64
+import asyncio
+import glob
+import importlib
 import os
+import threading
+import time
+from typing import IO, AsyncIterator, Awaitable, Callable
 from file_util.util.excel_util import ExcelUtil
 from file_util.util.ppt_util import PPTUtil
 from file_util.util.word_util import WordUtil
 from file_util.util.text_util import TextUtil
 from file_util.util.pdf_util import PDFUtil
+from file_util.util.zip_util import ZipUtil
+from file_util.util.source_util import DocumentSource, SourceUtil
+from file_util.util.upload_util import UploadSpool
+from file_util.util.normalize_util import TextNormalizer
+from file_util.util.chunk_util import ChunkUtil, ChunkedText, TextChunkCache
 
-from file_util.model import FileUtilDocument
+from file_util.util.cache_util import ExtractionCache, ExtractionCacheEntry
+from file_util.util.executor_util import ExtractorExecutor
+from file_util.util.metrics_util import FileUtilMetrics
+from file_util.util.signature_util import MIME_EXCEL, MIME_PDF, MIME_PPT, MIME_WORD
+from file_util.config.file_util_config import FileUtilConfig
+from file_util.model import FileUtilDocument, FileUtilExtractionResult, FileUtilTextChunk, FileUtilTextChunkPage, MagikaSession
 
 import file_util.log.log_settings as log_settings
 logger = log_settings.getLogger(__name__)
 
+# 抽出処理。ドキュメント、ファイルパスまたはバイト列、PDFの抽出モードを受け取り、抽出したテキストを返す
+Extractor = Callable[[FileUtilDocument, DocumentSource, str], Awaitable[str | None]]
+
 
 class FileUtil:
     """ファイル操作のユーティリティクラス"""
 
+    # ストリーミング抽出で1回に返す最大文字数の目安
+    STREAM_CHUNK_CHARS = 64 * 1024
+    # ストリーミング抽出でPDFをワーカーに渡す1回あたりのページ数
+    STREAM_PDF_PAGES = 8
+
+    # ウォームアップで読み込むモジュール。各形式の初回の処理時に読み込まれるパーサー
+    WARM_UP_MODULES = (
+        "chardet",
+        "pdfminer.converter",
+        "pdfminer.layout",
+        "pdfminer.pdfinterp",
+        "pdfminer.pdfpage",
+        "file_util.util.pdf_device_util",
+        "openpyxl",
+        "pyzipper",
+    )
+    _warm_up_thread: threading.Thread | None = None
+    _warm_up_lock = threading.Lock()
+
+    # MIMEタイプごとの抽出処理。"text/*"のように末尾が"/*"のキーは、その種類のすべてのMIMEタイプに使用する
+    _extractors: dict[str, Extractor] = {}
+
+    # 抽出結果の正規化の設定。TextNormalizerの引数名と値
+    _normalize_options: dict[str, bool] | None = None
+
+    @classmethod
+    def register_extractor(cls, mime_type: str, extractor: Extractor):
+        """MIMEタイプの抽出処理を登録する
+
+        登録済みのMIMEタイプの場合は置き換えます。
+        抽出結果のキャッシュは抽出処理を区別しないため、置き換える場合はキャッシュを無効にするか削除してください。
+
+        Args:
+            mime_type: MIMEタイプ。"text/*"のように末尾を"/*"にすると、その種類のすべてのMIMEタイプに使用する
+            extractor: ドキュメント、ファイルパスまたはバイト列、PDFの抽出モードを受け取り、テキストを返すコルーチン関数
+        """
+        cls._extractors[mime_type] = extractor
+
+    @classmethod
+    def get_extractor(cls, mime_type: str) -> Extractor | None:
+        """MIMEタイプの抽出処理を取得する
+
+        MIMEタイプに一致する抽出処理がない場合は、その種類("text/*"など)の抽出処理を返します。
+
+        Args:
+            mime_type: MIMEタイプ
+
+        Returns:
+            Extractor | None: 抽出処理。非対応形式の場合はNone
+        """
+        extractor = cls._extractors.get(mime_type)
+        if extractor is None:
+            extractor = cls._extractors.get(mime_type.split("/", 1)[0] + "/*")
+        return extractor
+
+    @classmethod
+    def warm_up(cls):
+        """抽出処理で使用するパーサーとMagikaのモデルを読み込む
+
+        パーサーとMagikaは起動時間を短くするために初回の使用時に読み込むため、
+        初回の抽出を速くしたい場合に事前に呼び出します。
+        """
+        start = time.perf_counter()
+        for module in cls.WARM_UP_MODULES:
+            try:
+                importlib.import_module(module)
+            except ImportError as e:
+                logger.warning(f"Failed to import {module} during warm-up: {e}")
+        MagikaSession.get()
+        logger.info(f"Warm-up finished in {time.perf_counter() - start:.2f} seconds")
+
+    @classmethod
+    def start_warm_up(cls) -> threading.Thread:
+        """バックグラウンドのスレッドでwarm_upを実行する
+
+        2回目以降の呼び出しでは、最初に開始したスレッドを返します。
+
+        Returns:
+            threading.Thread: ウォームアップを実行するスレッド
+        """
+        with cls._warm_up_lock:
+            if cls._warm_up_thread is None:
+                cls._warm_up_thread = threading.Thread(target=cls.warm_up, name="file_util_warm_up", daemon=True)
+                cls._warm_up_thread.start()
+            return cls._warm_up_thread
+
     @classmethod
     def sanitize_text(cls, text: str) -> str:
         """テキストをサニタイズする
@@ -28,86 +132,667 @@ class FileUtil:
             サニタイズされたテキスト。入力が空の場合は空文字列
         """
         # textが空の場合は空の文字列を返す
-        if not text or len(text) == 0:
+        if not text:
             return ""
-        import re
-        # 1. 複数の改行を1つの改行に変換
-        text = re.sub(r'\n+', '\n', text)
-        # 2. 複数のスペースを1つのスペースに変換
-        text = re.sub(r' +', ' ', text)
+        return TextNormalizer().normalize(text)
 
-        return text
+    @classmethod
+    def get_normalize_options(cls) -> dict[str, bool]:
+        """抽出結果の正規化の設定を取得する
+
+        Returns:
+            dict[str, bool]: TextNormalizerの引数名と値
+        """
+        if cls._normalize_options is None:
+            config = FileUtilConfig()
+            cls._normalize_options = {
+                "nfkc": config.text_normalize_nfkc,
+                "strip_control": config.text_normalize_strip_control,
+                "remove_headers_footers": config.text_normalize_remove_headers_footers,
+            }
+        return cls._normalize_options
 
     @classmethod
-    async def extract_text_from_file_async(cls, filename) -> str:
+    def create_normalizer(cls, mime_type: str | None = None) -> TextNormalizer:
+        """抽出結果の正規化に使用するTextNormalizerを設定に従って作成する
+
+        ヘッダー・フッターの削除はページの区切りが改ページ文字であるPDFのみに適用します。
+        (Excelなどはシートの区切りにも改ページ文字を使うため、見出し行などを削除しないようにする)
+
+        Args:
+            mime_type: 抽出対象のMIMEタイプ
+
+        Returns:
+            TextNormalizer: 空白の整形に加え、設定で有効にした正規化を行うTextNormalizer
+        """
+        options = cls.get_normalize_options()
+        return TextNormalizer(
+            nfkc=options["nfkc"],
+            strip_control=options["strip_control"],
+            remove_headers_footers=options["remove_headers_footers"] and mime_type == MIME_PDF,
+        )
+
+    @classmethod
+    def __text_cache_key(cls, key: str, pdf_mode: str) -> str:
+        # 抽出モードと正規化の設定ごとに結果を分けてキャッシュする
+        if pdf_mode != PDFUtil.MODE_ACCURATE:
+            key = f"{key}|pdf_mode={pdf_mode}"
+        options = [name for name, enabled in cls.get_normalize_options().items() if enabled]
+        if options:
+            key = f"{key}|normalize={','.join(options)}"
+        return key
+
+    @classmethod
+    def get_document(cls, filename: str) -> FileUtilDocument:
+        """ファイルのFileUtilDocumentを取得する
+
+        MIMEタイプとエンコーディングがキャッシュにある場合は判定を省略します。
+
+        Args:
+            filename: 対象のファイルパス
+
+        Returns:
+            FileUtilDocument: ドキュメント
+        """
+        cache = ExtractionCache.get_instance()
+        if cache is None:
+            return FileUtilDocument.from_file(document_path=filename)
+        key = cache.key_for_path(filename)
+        document = cls.__get_document_from_cache(filename, cache.get(key))
+        if document is None:
+            document = FileUtilDocument.from_file(document_path=filename)
+            cache.put(key, document.mime_type, document.encoding)
+        return document
+
+    @classmethod
+    async def get_document_async(cls, filename: str) -> FileUtilDocument:
+        """ファイルのFileUtilDocumentを非同期で取得する
+
+        キャッシュキーの生成(ハッシュの計算)、キャッシュの読み書き、種類の判定はイベントループ外で行います。
+
+        Args:
+            filename: 対象のファイルパス
+
+        Returns:
+            FileUtilDocument: 種類の判定済みのドキュメント
+        """
+        return await asyncio.to_thread(cls.__get_detected_document, filename)
+
+    @classmethod
+    def __get_detected_document(cls, filename: str) -> FileUtilDocument:
+        document = cls.get_document(filename)
+        # MIMEタイプは初回参照時に判定するため、呼び出し元のスレッドで判定しておく
+        document.mime_type
+        return document
+
+    @classmethod
+    def __get_document_from_cache(cls, filename: str, entry: ExtractionCacheEntry | None) -> FileUtilDocument | None:
+        if entry is None:
+            return None
+        return FileUtilDocument(path=filename, identifier=filename, mime_type=entry.mime_type or "", encoding=entry.encoding)
+
+    @classmethod
+    def __get_text_cache_entry(cls, cache: ExtractionCache, filename: str, pdf_mode: str) -> tuple[str, ExtractionCacheEntry | None]:
+        key = cls.__text_cache_key(cache.key_for_path(filename), pdf_mode)
+        return key, cache.get(key)
+
+    @classmethod
+    async def extract_text_from_file_async(cls, filename, pdf_mode: str = PDFUtil.MODE_ACCURATE) -> str:
         """ファイルからテキストを非同期で抽出する
 
         対応形式: テキストファイル、PDF、Excel、Word、PowerPoint
+        抽出結果はキャッシュされ、同じファイルに対する2回目以降の呼び出しではキャッシュを返します。
 
         Args:
             filename: 抽出対象のファイルパス
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
 
         Returns:
             str: 抽出されたテキスト。サニタイズ済み。非対応形式の場合は空文字列
         """
-        document_type = FileUtilDocument.from_file(document_path=filename)
+        document, key, text = await cls.__open_file_async(filename, pdf_mode)
+        if text is None:
+            text = await cls.__extract_file_async(document, key, pdf_mode)
+        return text
+
+    @classmethod
+    async def __open_file_async(cls, filename: str, pdf_mode: str) -> tuple[FileUtilDocument, str | None, str | None]:
+        # ドキュメント、キャッシュキー、キャッシュにある抽出済みテキストを返す
+        # キーの生成(verify_hashが有効な場合はファイル全体のハッシュ)とSQLiteの読み書きはイベントループ外で行う
+        cache = ExtractionCache.get_instance()
+        if cache is None:
+            return await asyncio.to_thread(cls.__open_detected_document, filename), None, None
+        key, entry = await asyncio.to_thread(cls.__get_text_cache_entry, cache, filename, pdf_mode)
+        document = cls.__get_document_from_cache(filename, entry)
+        if document is None:
+            document = await asyncio.to_thread(cls.__open_detected_document, filename)
+        return document, key, entry.text if entry is not None else None
+
+    @classmethod
+    async def __extract_file_async(cls, document: FileUtilDocument, key: str | None, pdf_mode: str) -> str:
+        text = await cls.extract_text_from_document_async(document, pdf_mode)
+        cache = ExtractionCache.get_instance()
+        if cache is not None and key is not None:
+            await asyncio.to_thread(cache.put, key, document.mime_type, document.encoding, text)
+        return text
+
+    @classmethod
+    def __open_detected_document(cls, filename: str) -> FileUtilDocument:
+        document = FileUtilDocument.from_file(document_path=filename)
+        # 種類の判定(Magika)もイベントループ外で行う
+        document.mime_type
+        return document
+
+    @classmethod
+    async def extract_text_from_document_async(cls, document_type: FileUtilDocument, pdf_mode: str = PDFUtil.MODE_ACCURATE) -> str:
+        """FileUtilDocumentからテキストを非同期で抽出する
+
+        ファイルパスを持たないドキュメントはバイト列から抽出します。キャッシュは使用しません。
+
+        Args:
+            document_type: 抽出対象のドキュメント
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
+
+        Returns:
+            str: 抽出されたテキスト。サニタイズ済み。非対応形式の場合は空文字列
+        """
+        filename: DocumentSource = document_type.path if document_type.path is not None else document_type.data
         encoding = document_type.encoding
         mime_type = document_type.mime_type
         
         if mime_type is None:
             return ""
         logger.debug(mime_type)
-        result = None        
-
-        if document_type.is_text():
-            # テキストファイルの場合
-            result = await TextUtil.process_text_async(filename, mime_type, encoding)
-
-        # application/pdf
-        elif document_type.is_pdf():
-            result = PDFUtil.extract_text_from_pdf(filename)
-            
-        # application/vnd.openxmlformats-officedocument.spreadsheetml.sheet
-        elif document_type.is_excel():
-            result = ExcelUtil.extract_text_from_sheet(filename)
-            
-        # application/vnd.openxmlformats-officedocument.wordprocessingml.document
-        elif document_type.is_word():
-            result = WordUtil.extract_text_from_docx(filename)
-            
-        # application/vnd.openxmlformats-officedocument.presentationml.presentation
-        elif document_type.is_ppt():
-            result = PPTUtil.extract_text_from_pptx(filename)
+        start = time.perf_counter()
+        try:
+            with FileUtilMetrics.track_in_flight("extraction"):
+                with FileUtilMetrics.measure(FileUtilMetrics.STAGE_EXTRACT, mime_type):
+                    result = await cls.__run_extractor_async(document_type, filename, mime_type, encoding, pdf_mode)
+                with FileUtilMetrics.measure(FileUtilMetrics.STAGE_SANITIZE, mime_type):
+                    text = cls.create_normalizer(mime_type).normalize(result or "")
+        except Exception as e:
+            FileUtilMetrics.record_document(document_type.identifier, mime_type, time.perf_counter() - start,
+                                            cls.__get_size(document_type), None, f"{type(e).__name__}: {e}")
+            raise
+        FileUtilMetrics.record_document(document_type.identifier, mime_type, time.perf_counter() - start,
+                                        cls.__get_size(document_type), len(text))
+        return text
 
-        else:
+    @classmethod
+    async def __run_extractor_async(cls, document_type: FileUtilDocument, filename: DocumentSource, mime_type: str,
+                                    encoding: str | None, pdf_mode: str) -> str | None:
+        extractor = cls.get_extractor(mime_type)
+        if extractor is None:
             logger.error("Unsupported file type: " + mime_type)
+            return None
+        return await extractor(document_type, filename, pdf_mode)
+
+    @classmethod
+    async def extract_text_from_pdf_async(cls, filename: DocumentSource, page_numbers: list[int] | None = None, max_pages: int = 0,
+                                          pdf_mode: str = PDFUtil.MODE_ACCURATE) -> str:
+        """PDFからテキストを非同期で抽出する
+
+        ページ数が多い場合はページを分割し、共有のExtractorExecutorのワーカーで並列に抽出します。
+        PDFごとにプロセスプールは作成しません。サニタイズは行いません。
+
+        Args:
+            filename: PDFファイルのパスまたはバイト列
+            page_numbers: 抽出するページ番号(0始まり)のリスト。Noneの場合は全ページ
+            max_pages: 抽出する最大ページ数。0の場合は制限なし
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
+
+        Returns:
+            str: 抽出されたテキスト。ページの区切りは改ページ文字(\\f)
+        """
+        executor = ExtractorExecutor.get_instance()
+        if executor.mode == ExtractorExecutor.MODE_INLINE:
+            return await executor.run(PDFUtil.extract_text_from_pdf, filename, page_numbers, max_pages, mode=pdf_mode)
+
+        max_workers = min(PDFUtil.get_max_workers(), executor.worker_count)
+        # ワーカープロセスに渡せるように、ストリームやmemoryviewはバイト列に変換する
+        source = SourceUtil.to_picklable(filename)
+        if max_workers <= 1:
+            return await executor.run(PDFUtil.extract_text_from_pdf, source, page_numbers, max_pages, 1, pdf_mode)
+        if page_numbers is not None:
+            pagenos = PDFUtil.get_target_pages(source, page_numbers, max_pages)
+        else:
+            pagenos = await executor.run(PDFUtil.get_target_pages, source, None, max_pages)
+        if len(pagenos) < PDFUtil.PARALLEL_MIN_PAGES:
+            return await executor.run(PDFUtil.extract_text_from_pdf, source, pagenos, 0, 1, pdf_mode)
 
-        return cls.sanitize_text(result if result is not None else "")
+        tasks = [asyncio.ensure_future(executor.run(PDFUtil.extract_page_texts, source, chunk, pdf_mode))
+                 for chunk in PDFUtil.split_pages(pagenos, max_workers)]
+        try:
+            pages: dict[int, str] = {}
+            for page_texts in await asyncio.gather(*tasks):
+                pages.update(page_texts)
+        finally:
+            for task in tasks:
+                task.cancel()
+        # 指定したページが文書にない場合や、ページ数の宣言が実際より多い場合は、逐次処理と同じく該当ページを空にする
+        return "".join(pages.get(pageno, "") for pageno in pagenos)
+
+    @classmethod
+    def __get_size(cls, document: FileUtilDocument) -> int | None:
+        try:
+            return document.size
+        except OSError:
+            return None
+
+    @classmethod
+    async def iter_text_from_file_async(cls, filename: str, pdf_mode: str = PDFUtil.MODE_ACCURATE) -> AsyncIterator[FileUtilTextChunk]:
+        """ファイルからテキストを抽出しながら、抽出できた部分から順に返す
+
+        PDFは数ページずつワーカーで抽出し、次のページの抽出と並行して返します。
+        Word、PowerPoint、Excel、テキスト(XMLを除く)は段落・行・一定のバイト数ごとに読み込み、一定の文字数ごとに返します。
+        抽出結果がキャッシュにある場合はキャッシュから返します。ストリーミング抽出の結果はキャッシュしません。
+
+        Args:
+            filename: 抽出対象のファイルパス
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
+
+        Yields:
+            FileUtilTextChunk: テキストの断片。サニタイズ済み。断片を連結するとextract_text_from_file_asyncの結果と一致する
+        """
+        cache = ExtractionCache.get_instance()
+        if cache is not None:
+            _, entry = await asyncio.to_thread(cls.__get_text_cache_entry, cache, filename, pdf_mode)
+            cached_text = entry.text if entry is not None else None
+            if cached_text is not None:
+                size = cls.STREAM_CHUNK_CHARS
+                total = max(1, -(-len(cached_text) // size))
+                for index in range(total):
+                    yield FileUtilTextChunk(index=index, text=cached_text[index * size:(index + 1) * size], progress=index + 1, total=total)
+                return
+
+        document = await cls.get_document_async(filename)
+        index = 0
+        progress, total = 0, None
+        # 断片の境界をまたぐ改行・空白の連続も正規化の中でまとめる
+        normalizer = cls.create_normalizer(document.mime_type)
+        with FileUtilMetrics.track_in_flight("stream_extraction"):
+            async for text, progress, total in cls.__iter_raw_text_async(document, pdf_mode):
+                text = normalizer.feed(text)
+                if not text:
+                    continue
+                yield FileUtilTextChunk(index=index, text=text, progress=progress, total=total)
+                index += 1
+            text = normalizer.flush()
+            if text:
+                yield FileUtilTextChunk(index=index, text=text, progress=progress, total=total)
+
+    @classmethod
+    async def __iter_raw_text_async(cls, document: FileUtilDocument, pdf_mode: str) -> AsyncIterator[tuple[str, int, int | None]]:
+        filename = document.path
+        executor = ExtractorExecutor.get_instance()
+        if document.is_pdf():
+            page_count = await executor.run(PDFUtil.get_page_count, filename)
+            batches = [list(range(i, min(i + cls.STREAM_PDF_PAGES, page_count))) for i in range(0, page_count, cls.STREAM_PDF_PAGES)]
+            # 返している間に次のページの抽出を進めておく
+            pending = [asyncio.ensure_future(executor.run(PDFUtil.extract_page_texts, filename, batch, pdf_mode)) for batch in batches[:2]]
+            try:
+                for i, batch in enumerate(batches):
+                    pages = await pending[i]
+                    if i + 2 < len(batches):
+                        pending.append(asyncio.ensure_future(executor.run(PDFUtil.extract_page_texts, filename, batches[i + 2], pdf_mode)))
+                    yield "".join(pages.get(pageno, "") for pageno in batch), batch[-1] + 1, page_count
+            finally:
+                for future in pending:
+                    future.cancel()
+            return
+
+        if document.is_word():
+            iterator = WordUtil.iter_text_from_docx(filename)
+        elif document.is_ppt():
+            iterator = PPTUtil.iter_text_from_pptx(filename)
+        elif document.is_excel():
+            iterator = ExcelUtil.iter_sheet_text(filename)
+        elif document.is_text() and document.mime_type != "text/xml":
+            iterator = TextUtil.iter_text(filename, document.mime_type, document.encoding)
+        else:
+            # XML(整形式でない場合に一括で解析し直すため)と非対応形式は一括で抽出して分割する
+            text = await cls.extract_text_from_document_async(document, pdf_mode)
+            size = cls.STREAM_CHUNK_CHARS
+            total = -(-len(text) // size)
+            for i in range(total):
+                yield text[i * size:(i + 1) * size], i + 1, total
+            return
+
+        # パーサーのジェネレーターをスレッドで少しずつ進める
+        try:
+            progress = 0
+            while (text := await asyncio.to_thread(cls.__take_chars, iterator, cls.STREAM_CHUNK_CHARS)) is not None:
+                progress += 1
+                yield text, progress, None
+        finally:
+            await asyncio.to_thread(iterator.close)
+
+    @classmethod
+    def __take_chars(cls, iterator, size: int) -> str | None:
+        texts = []
+        length = 0
+        for text in iterator:
+            texts.append(text)
+            length += len(text)
+            if length >= size:
+                break
+        return "".join(texts) if texts else None
+
+    @classmethod
+    async def get_text_chunk_async(cls, filename: str | None = None, cursor: str | None = None, chunk_size: int = 4000,
+                                   overlap: int = 200, unit: str = ChunkUtil.UNIT_CHARS,
+                                   pdf_mode: str = PDFUtil.MODE_ACCURATE) -> FileUtilTextChunkPage:
+        """ファイルから抽出したテキストをチャンクに分割し、1チャンクずつ返す
+
+        最初の呼び出しではファイルと分割方法を指定し、先頭のチャンクを返します。
+        以降は前回の結果のnext_cursorを指定すると、同じ分割方法で次のチャンクを返します。
+        分割したテキストはサーバー側でキャッシュし、続きのチャンクの取得時に抽出をやり直しません。
+
+        Args:
+            filename: 抽出対象のファイルパス。cursorを指定する場合は不要
+            cursor: 前回の結果のnext_cursor。指定した場合は他の引数より優先する
+            chunk_size: チャンクの最大の長さ。unitで指定した単位
+            overlap: 前のチャンクと重複させる長さ。unitで指定した単位
+            unit: 長さの単位。"chars"(文字数)または"tokens"(見積もりのトークン数)
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
+
+        Returns:
+            FileUtilTextChunkPage: チャンクと次のチャンクのカーソル
+
+        Raises:
+            ValueError: カーソルが不正な場合、カーソルの発行後にファイルが変更された場合、分割方法が不正な場合
+        """
+        index = 0
+        fingerprint = None
+        if cursor:
+            state = ChunkUtil.decode_cursor(cursor)
+            try:
+                filename = str(state["path"])
+                chunk_size, overlap, unit = int(state["size"]), int(state["overlap"]), str(state["unit"])
+                pdf_mode, index, fingerprint = str(state["pdf_mode"]), int(state["index"]), str(state["file"])
+            except (KeyError, TypeError, ValueError) as e:
+                raise ValueError(f"Invalid cursor: {cursor}") from e
+        if not filename:
+            raise ValueError("Either file_path or cursor must be specified")
+
+        stat = os.stat(filename)
+        current_fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
+        if fingerprint is not None and fingerprint != current_fingerprint:
+            raise ValueError(f"File has been modified since the cursor was issued: {filename}")
+
+        chunk_cache = TextChunkCache.get_instance()
+        key = cls.__text_cache_key(f"{filename}:{current_fingerprint}", pdf_mode) + f"|chunk={unit}:{chunk_size}:{overlap}"
+        chunked = chunk_cache.get(key) if chunk_cache is not None else None
+        if chunked is None:
+            text = await cls.extract_text_from_file_async(filename, pdf_mode)
+            spans = await asyncio.to_thread(ChunkUtil.split_text, text, chunk_size, overlap, unit)
+            chunked = ChunkedText(text, spans)
+            if chunk_cache is not None:
+                chunk_cache.put(key, chunked)
+
+        total_chunks = len(chunked.spans)
+        if total_chunks == 0:
+            return FileUtilTextChunkPage(path=filename, index=0, total_chunks=0, start=0, end=0, tokens=0)
+        if not 0 <= index < total_chunks:
+            raise ValueError(f"Chunk index out of range: {index}")
+
+        start, end = chunked.spans[index]
+        text = chunked.text[start:end]
+        next_cursor = None
+        if index + 1 < total_chunks:
+            next_cursor = ChunkUtil.encode_cursor({
+                "path": filename, "file": current_fingerprint, "pdf_mode": pdf_mode,
+                "unit": unit, "size": chunk_size, "overlap": overlap, "index": index + 1,
+            })
+        return FileUtilTextChunkPage(
+            path=filename, text=text, index=index, total_chunks=total_chunks, start=start, end=end,
+            tokens=ChunkUtil.count_tokens(text), next_cursor=next_cursor,
+        )
+
+    @classmethod
+    def list_files(cls, directory: str, pattern: str = "*", recursive: bool = True) -> list[str]:
+        """ディレクトリ内のファイルを列挙する
+
+        Args:
+            directory: 対象のディレクトリ
+            pattern: ファイル名のglobパターン
+            recursive: サブディレクトリも対象にするかどうか
+
+        Returns:
+            list[str]: ファイルパスのリスト
+        """
+        if recursive:
+            pattern = os.path.join("**", pattern)
+        paths = glob.glob(pattern, root_dir=directory, recursive=recursive)
+        return sorted(
+            os.path.join(directory, path) for path in paths if os.path.isfile(os.path.join(directory, path))
+        )
+
+    @classmethod
+    async def extract_texts_from_paths_async(cls, file_paths: list[str], concurrency: int = 8) -> AsyncIterator[FileUtilExtractionResult]:
+        """複数のファイルからテキストを並行して抽出し、完了したものから順に返す
+
+        1ファイルの失敗や遅延は他のファイルの処理に影響しません。
+
+        Args:
+            file_paths: 抽出対象のファイルパスのリスト
+            concurrency: 同時に処理するファイル数の上限
+
+        Yields:
+            FileUtilExtractionResult: ファイルごとの抽出結果。完了順
+        """
+        paths: asyncio.Queue[str] = asyncio.Queue()
+        for path in file_paths:
+            paths.put_nowait(path)
+        results: asyncio.Queue[FileUtilExtractionResult] = asyncio.Queue()
+
+        async def worker():
+            while True:
+                try:
+                    path = paths.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await results.put(await cls.__extract_text_result_async(path))
+
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(concurrency, len(file_paths))))]
+        try:
+            for _ in range(len(file_paths)):
+                yield await results.get()
+        finally:
+            for task in workers:
+                task.cancel()
+
+    @classmethod
+    async def __extract_text_result_async(cls, path: str) -> FileUtilExtractionResult:
+        start = time.perf_counter()
+        result = FileUtilExtractionResult(path=path)
+        try:
+            # 種類の判定と抽出で同じドキュメントを使用する
+            document, key, text = await cls.__open_file_async(path, PDFUtil.MODE_ACCURATE)
+            result.mime_type = document.mime_type
+            result.text = text if text is not None else await cls.__extract_file_async(document, key, PDFUtil.MODE_ACCURATE)
+        except Exception as e:
+            logger.error(f"Failed to extract text from {path}: {e}")
+            result.error = f"{type(e).__name__}: {e}"
+        result.elapsed_ms = (time.perf_counter() - start) * 1000
+        return result
+
+    @classmethod
+    async def extract_text_from_zip_async(cls, source: DocumentSource, password: str | None = None,
+                                          max_depth: int | None = None,
+                                          pdf_mode: str = PDFUtil.MODE_ACCURATE) -> AsyncIterator[FileUtilExtractionResult]:
+        """ZIPファイルの各メンバーからテキストを抽出し、メンバーごとに結果を返す
+
+        メンバーはディスクに展開せずにメモリ上に読み込み、種類を判定して抽出します。
+        ネストしたZIPはmax_depthの深さまで再帰的に処理します。
+        1メンバーの失敗は他のメンバーの処理に影響しません。
+
+        Args:
+            source: ZIPファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+            password: ZIPファイルのパスワード。ネストしたZIPにも使用する
+            max_depth: 展開するネストしたZIPの深さ。Noneの場合は設定値。0の場合はネストしたZIPを展開しない
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
+
+        Yields:
+            FileUtilExtractionResult: メンバーごとの抽出結果。格納順。
+                pathはZIP内のパスで、ネストしたZIPのメンバーは"/"で連結する
+        """
+        config = FileUtilConfig()
+        if max_depth is None:
+            max_depth = config.zip_extract_max_depth
+        zip_ref = await asyncio.to_thread(ZipUtil.open_archive, source, password)
+        async for result in cls.__extract_texts_from_archive_async(
+                zip_ref, "", password, max_depth, config.zip_extract_max_member_size, pdf_mode):
+            yield result
+
+    @classmethod
+    async def __extract_texts_from_archive_async(cls, zip_ref, prefix: str, password: str | None, depth: int,
+                                                 max_member_size: int, pdf_mode: str) -> AsyncIterator[FileUtilExtractionResult]:
+        try:
+            for name, info in ZipUtil.iter_file_members(zip_ref):
+                start = time.perf_counter()
+                result = FileUtilExtractionResult(path=prefix + name)
+                nested_zip_ref = None
+                try:
+                    if max_member_size > 0 and info.file_size > max_member_size:
+                        raise ValueError(f"Member size {info.file_size} exceeds the limit of {max_member_size} bytes")
+                    document = await asyncio.to_thread(cls.__read_member, zip_ref, info, result.path)
+                    result.mime_type = document.mime_type
+                    if not document.is_zip():
+                        result.text = await cls.__extract_text_from_data_async(document, pdf_mode)
+                    elif depth > 0:
+                        nested_zip_ref = await asyncio.to_thread(ZipUtil.open_archive, document.data, password)
+                    else:
+                        raise ValueError("Nested archive depth limit exceeded")
+                except Exception as e:
+                    logger.error(f"Failed to extract text from {result.path}: {e}")
+                    result.error = f"{type(e).__name__}: {e}"
+
+                if nested_zip_ref is not None:
+                    async for nested_result in cls.__extract_texts_from_archive_async(
+                            nested_zip_ref, result.path + "/", password, depth - 1, max_member_size, pdf_mode):
+                        yield nested_result
+                    continue
+                result.elapsed_ms = (time.perf_counter() - start) * 1000
+                yield result
+        finally:
+            zip_ref.close()
+
+    @classmethod
+    def __read_member(cls, zip_ref, info, identifier: str) -> FileUtilDocument:
+        start = time.perf_counter()
+        document = FileUtilDocument(data=zip_ref.read(info), identifier=identifier)
+        read_seconds = time.perf_counter() - start
+        # 種類の判定もイベントループ外で行う
+        FileUtilMetrics.observe_stage(FileUtilMetrics.STAGE_READ, document.mime_type, read_seconds)
+        return document
+
+    @classmethod
+    async def __extract_text_from_data_async(cls, document: FileUtilDocument, pdf_mode: str, sha256: str | None = None) -> str:
+        # 同じ内容のデータはキャッシュから返す
+        cache = ExtractionCache.get_instance()
+        if cache is None:
+            return await cls.extract_text_from_document_async(document, pdf_mode)
+        # 内容のハッシュの計算とSQLiteの読み書きはイベントループ外で行う
+        key, cached_text = await asyncio.to_thread(cls.__get_data_cache_text, cache, document, pdf_mode, sha256)
+        if cached_text is not None:
+            return cached_text
+        text = await cls.extract_text_from_document_async(document, pdf_mode)
+        await asyncio.to_thread(cache.put, key, document.mime_type, document.encoding, text)
+        return text
+
+    @classmethod
+    def __get_data_cache_text(cls, cache: ExtractionCache, document: FileUtilDocument, pdf_mode: str,
+                              sha256: str | None) -> tuple[str, str | None]:
+        key = cls.__text_cache_key(cache.key_for_sha256(sha256) if sha256 else cache.key_for_bytes(document.data), pdf_mode)
+        return key, cache.get_text(key)
+
+    @classmethod
+    async def extract_text_from_bytes_async(cls, data: bytes | bytearray | memoryview | IO[bytes], identifier: str = "",
+                                            pdf_mode: str = PDFUtil.MODE_ACCURATE) -> str:
+        """バイト列からテキストを非同期で抽出する
+
+        一時ファイルを作成せずに、メモリ上のデータを種類の判定と抽出処理へ直接渡します。
+        抽出結果は内容のハッシュをキーにキャッシュされます。
+
+        Args:
+            data: ファイルの内容。bytes、bytearray、memoryviewまたはバイナリストリーム
+            identifier: ログなどに使用するドキュメントの識別子
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
+
+        Returns:
+            str: 抽出されたテキスト。サニタイズ済み。非対応形式の場合は空文字列
+        """
+        document = FileUtilDocument(data=SourceUtil.read_bytes(data), identifier=identifier)
+        if document.size == 0:
+            return ""
+        return await cls.__extract_text_from_data_async(document, pdf_mode)
+
+    @classmethod
+    async def extract_text_from_upload_async(cls, spool: UploadSpool, pdf_mode: str = PDFUtil.MODE_ACCURATE) -> str:
+        """受信済みのアップロードデータからテキストを非同期で抽出する
+
+        メモリに保持しているデータはバイト列のまま、一時ファイルに書き出したデータはファイルから抽出します。
+        キャッシュのキーには受信時に計算した内容のハッシュを使用します。
+
+        Args:
+            spool: 受信を完了したアップロードデータ
+            pdf_mode: PDFの抽出モード。"accurate"または"fast"
+
+        Returns:
+            str: 抽出されたテキスト。サニタイズ済み。非対応形式の場合は空文字列
+        """
+        if spool.size == 0:
+            return ""
+        spool.finish()
+        if spool.path is None:
+            document = FileUtilDocument(data=spool.getvalue(), identifier=spool.identifier)
+        else:
+            document = FileUtilDocument(path=spool.path, identifier=spool.identifier)
+        return await cls.__extract_text_from_data_async(document, pdf_mode, spool.sha256)
 
     @classmethod
     async def extract_base64_to_text(cls, extension: str, base64_data: str) -> str:
+        """base64でエンコードされたデータからテキストを抽出する
+
+        base64は一定の文字数ごとに逐次デコードし、一時ファイルを作成せずに抽出します。
+
+        Args:
+            extension: ファイルの拡張子。種類は内容から判定するため、識別子としてのみ使用する
+            base64_data: base64でエンコードされたデータ
 
+        Returns:
+            str: 抽出されたテキスト。サニタイズ済み。非対応形式の場合は空文字列
+        """
         # サイズが0の場合は空文字を返す
-        if not base64_data or len(base64_data) == 0:
+        if not base64_data:
             return ""
 
-        # base64からバイナリデータに変換
-        base64_data_bytes = base64.b64decode(base64_data)
-
-        # 拡張子の指定。extensionがNoneまたは空の場合は設定しない.空でない場合は"."を先頭に付与
-        suffix = ""
-        if extension is not None and extension != "":
-            suffix = "." + extension
-        # base64データから一時ファイルを生成
-        import aiofiles.tempfile
-        async with aiofiles.tempfile.NamedTemporaryFile(mode="wb", delete=False, suffix=suffix) as temp:
-            await temp.write(base64_data_bytes)
-            await temp.close()
-            # 一時ファイルからテキストを抽出
-            temp_path = temp.name if isinstance(temp.name, str) else str(temp.name)
-            text = await FileUtil.extract_text_from_file_async(temp_path)
-            # 一時ファイルを削除
-            os.remove(temp_path)
-            return text
+        data = SourceUtil.decode_base64(base64_data)
+        identifier = f"base64.{extension}" if extension else "base64"
+        return await cls.extract_text_from_bytes_async(data, identifier)
 
-        return text
+
+async def _extract_text_async(document: FileUtilDocument, source: DocumentSource, pdf_mode: str) -> str | None:
+    if isinstance(source, str):
+        return await TextUtil.process_text_async(source, document.mime_type, document.encoding)
+    return await asyncio.to_thread(TextUtil.process_text_bytes, source, document.mime_type, document.encoding)
+
+
+async def _extract_pdf_async(document: FileUtilDocument, source: DocumentSource, pdf_mode: str) -> str | None:
+    return await FileUtil.extract_text_from_pdf_async(source, pdf_mode=pdf_mode)
+
+
+def _run_in_executor(func: Callable[[DocumentSource], str]) -> Extractor:
+    # CPU負荷の高い抽出処理はワーカーで実行し、イベントループを止めない
+    async def extract(document: FileUtilDocument, source: DocumentSource, pdf_mode: str) -> str | None:
+        return await ExtractorExecutor.get_instance().run(func, source)
+    return extract
+
+
+# 既定の抽出処理
+FileUtil.register_extractor("text/*", _extract_text_async)
+FileUtil.register_extractor(MIME_PDF, _extract_pdf_async)
+FileUtil.register_extractor(MIME_EXCEL, _run_in_executor(ExcelUtil.extract_text_from_sheet))
+FileUtil.register_extractor(MIME_WORD, _run_in_executor(WordUtil.extract_text_from_docx))
+FileUtil.register_extractor(MIME_PPT, _run_in_executor(PPTUtil.extract_text_from_pptx))
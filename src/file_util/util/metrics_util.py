@@ -0,0 +1,355 @@
+import bisect
+import heapq
+import itertools
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Iterator
+
+from file_util.config.file_util_config import FileUtilConfig
+
+# 処理時間のヒストグラムのバケット(秒)
+DEFAULT_BUCKETS: tuple[float, ...] = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                      1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+def _escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    """メトリクスの共通部分。ラベルの値の組ごとに値を保持する"""
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = label_names
+        self._values: dict[tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        """Prometheusのテキスト形式の行を返す"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+    def _render_samples(self, items: list) -> list[str]:
+        return [f"{self.name}{self._format_labels(labels)} {_format_value(value)}" for labels, value in items]  # type: ignore
+
+    def _format_labels(self, labels: tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(self.label_names, labels)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(_Metric):
+    """単調に増加する値"""
+    type_name = "counter"
+
+    def inc(self, labels: tuple[str, ...] = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount  # type: ignore
+
+    def get(self, labels: tuple[str, ...] = ()) -> float:
+        with self._lock:
+            return self._values.get(labels, 0)  # type: ignore
+
+    def items(self) -> list[tuple[tuple[str, ...], float]]:
+        with self._lock:
+            return list(self._values.items())  # type: ignore
+
+
+class Gauge(Counter):
+    """増減する値。実行中の処理数などに使用する"""
+    type_name = "gauge"
+
+    def dec(self, labels: tuple[str, ...] = (), amount: float = 1):
+        self.inc(labels, -amount)
+
+
+class Histogram(_Metric):
+    """値の分布。バケットごとの件数、合計、件数、最大値を保持する"""
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, label_names)
+        self.buckets = buckets
+
+    def observe(self, labels: tuple[str, ...], value: float):
+        # バケットの上限以下の値をそのバケットに数える。最後の要素は+Inf
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0, 0.0]
+            entry[0][index] += 1  # type: ignore
+            entry[1] += value  # type: ignore
+            entry[2] += 1  # type: ignore
+            entry[3] = max(entry[3], value)  # type: ignore
+
+    def summary(self) -> dict[tuple[str, ...], dict]:
+        """ラベルの値の組ごとの件数、合計、平均、推定パーセンタイル、最大値を返す(ミリ秒)"""
+        with self._lock:
+            items = [(labels, ([*entry[0]], entry[1], entry[2], entry[3])) for labels, entry in self._values.items()]  # type: ignore
+        result = {}
+        for labels, (counts, total, count, maximum) in items:
+            result[labels] = {
+                "count": count,
+                "total_ms": round(total * 1000, 3),
+                "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+                "p50_ms": round(self.__estimate_quantile(counts, count, maximum, 0.5) * 1000, 3),
+                "p95_ms": round(self.__estimate_quantile(counts, count, maximum, 0.95) * 1000, 3),
+                "max_ms": round(maximum * 1000, 3),
+            }
+        return result
+
+    def _render_samples(self, items: list) -> list[str]:
+        lines = []
+        for labels, (counts, total, count, _) in items:
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, math.inf), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{self._format_labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{self._format_labels(labels)} {count}")
+        return lines
+
+    def __estimate_quantile(self, counts: list[int], count: int, maximum: float, q: float) -> float:
+        # バケット内で値が一様に分布しているとみなして線形補間する
+        if count == 0:
+            return 0.0
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else maximum
+                estimate = lower + (upper - lower) * (rank - cumulative) / bucket_count
+                return min(estimate, maximum)
+            cumulative += bucket_count
+        return maximum
+
+
+class FileUtilMetrics:
+    """抽出処理のメトリクス
+
+    処理段階(stage)ごとの処理時間をMIMEタイプ別のヒストグラムで記録します。
+    * read: ファイル・ZIPのメンバーをメモリに読み込む時間
+    * signature: 先頭のシグネチャによる種類の判定。判定できなかった場合のMIMEタイプは空文字列
+    * detect: Magikaによる種類の判定
+    * encoding: エンコーディングの判定
+    * extract: 形式ごとの抽出処理。ファイルパスから抽出する場合は読み込みを含む
+    * sanitize: 抽出したテキストの正規化
+    * serialize: APIのストリーミングレスポンスのシリアライズ
+    加えて、入力のバイト数・出力の文字数、成功・失敗の件数、実行中の処理数、処理時間の長いドキュメントを記録します。
+    ストリーミング抽出は処理時間が受信側の速度に左右されるため、実行中の処理数のみを記録します。
+    Prometheusのテキスト形式(render)と、集計済みの辞書(stats)で取得できます。
+    """
+    _instance: "FileUtilMetrics | None" = None
+    _initialized = False
+    _instance_lock = threading.Lock()
+
+    STAGE_READ = "read"
+    STAGE_SIGNATURE = "signature"
+    STAGE_DETECT = "detect"
+    STAGE_ENCODING = "encoding"
+    STAGE_EXTRACT = "extract"
+    STAGE_SANITIZE = "sanitize"
+    STAGE_SERIALIZE = "serialize"
+
+    def __init__(self, slowest_documents: int = 10):
+        """
+        Args:
+            slowest_documents: 記録する処理時間の長いドキュメントの件数。0の場合は記録しない
+        """
+        self.slowest_documents = slowest_documents
+        self.started_at = time.time()
+        self.stage_duration = Histogram(
+            "file_util_stage_duration_seconds", "Time spent in each extraction stage.", ("stage", "mime_type"))
+        self.documents = Counter(
+            "file_util_documents_total", "Number of documents processed by the extractor.", ("mime_type", "status"))
+        self.input_bytes = Counter(
+            "file_util_input_bytes_total", "Bytes of documents passed to the extractor.", ("mime_type",))
+        self.output_chars = Counter(
+            "file_util_output_chars_total", "Characters of text extracted from documents.", ("mime_type",))
+        self.in_flight = Gauge(
+            "file_util_in_flight", "Number of operations currently in progress.", ("operation",))
+        self.http_duration = Histogram(
+            "file_util_http_request_duration_seconds", "Time spent handling API requests.", ("route", "status"))
+        self._metrics: tuple[_Metric, ...] = (
+            self.stage_duration, self.documents, self.input_bytes, self.output_chars, self.in_flight, self.http_duration)
+        # (処理時間, 連番, ドキュメントの情報)の最小ヒープ
+        self._slowest: list[tuple[float, int, dict]] = []
+        self._sequence = itertools.count()
+        self._slowest_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls) -> "FileUtilMetrics | None":
+        """設定に基づくプロセス共有のメトリクスを取得する
+
+        Returns:
+            FileUtilMetrics | None: メトリクス。無効化されている場合はNone
+        """
+        if not cls._initialized:
+            with cls._instance_lock:
+                if not cls._initialized:
+                    config = FileUtilConfig()
+                    if config.enable_metrics:
+                        cls._instance = cls(slowest_documents=config.metrics_slowest_documents)
+                    cls._initialized = True
+        return cls._instance
+
+    @classmethod
+    @contextmanager
+    def measure(cls, stage: str, mime_type: str = "") -> Iterator[None]:
+        """withブロックの処理時間を処理段階の時間として記録する
+
+        Args:
+            stage: 処理段階
+            mime_type: 対象のMIMEタイプ
+        """
+        metrics = cls.get_instance()
+        if metrics is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            metrics.stage_duration.observe((stage, mime_type), time.perf_counter() - start)
+
+    @classmethod
+    @contextmanager
+    def track_in_flight(cls, operation: str) -> Iterator[None]:
+        """withブロックの実行中、実行中の処理数に数える
+
+        Args:
+            operation: 処理の種類
+        """
+        metrics = cls.get_instance()
+        if metrics is None:
+            yield
+            return
+        metrics.in_flight.inc((operation,))
+        try:
+            yield
+        finally:
+            metrics.in_flight.dec((operation,))
+
+    @classmethod
+    def observe_stage(cls, stage: str, mime_type: str, seconds: float):
+        """処理段階の時間を記録する
+
+        Args:
+            stage: 処理段階
+            mime_type: 対象のMIMEタイプ
+            seconds: 処理時間(秒)
+        """
+        metrics = cls.get_instance()
+        if metrics is not None:
+            metrics.stage_duration.observe((stage, mime_type), seconds)
+
+    @classmethod
+    def record_document(cls, identifier: str, mime_type: str, seconds: float, size: int | None,
+                        chars: int | None, error: str | None = None):
+        """1ドキュメント分の抽出結果を記録する
+
+        Args:
+            identifier: ドキュメントの識別子(ファイルパスなど)
+            mime_type: MIMEタイプ
+            seconds: 抽出処理全体の時間(秒)
+            size: 入力のバイト数。不明な場合はNone
+            chars: 抽出した文字数。失敗した場合はNone
+            error: 失敗した場合のエラー
+        """
+        metrics = cls.get_instance()
+        if metrics is None:
+            return
+        metrics.documents.inc((mime_type, "error" if error else "ok"))
+        if size:
+            metrics.input_bytes.inc((mime_type,), size)
+        if chars:
+            metrics.output_chars.inc((mime_type,), chars)
+        if metrics.slowest_documents <= 0:
+            return
+        with metrics._slowest_lock:
+            if len(metrics._slowest) >= metrics.slowest_documents and seconds <= metrics._slowest[0][0]:
+                return
+            document = {"identifier": identifier, "mime_type": mime_type, "elapsed_ms": round(seconds * 1000, 3),
+                        "bytes": size, "chars": chars, "error": error}
+            entry = (seconds, next(metrics._sequence), document)
+            if len(metrics._slowest) < metrics.slowest_documents:
+                heapq.heappush(metrics._slowest, entry)
+            else:
+                heapq.heapreplace(metrics._slowest, entry)
+
+    @classmethod
+    def observe_http_request(cls, route: str, status: int, seconds: float):
+        """APIのリクエストの処理時間を記録する
+
+        Args:
+            route: ルートのパス
+            status: レスポンスのステータスコード
+            seconds: 処理時間(秒)
+        """
+        metrics = cls.get_instance()
+        if metrics is not None:
+            metrics.http_duration.observe((route, str(status)), seconds)
+
+    def render(self) -> str:
+        """Prometheusのテキスト形式でメトリクスを返す
+
+        Returns:
+            str: text/plain; version=0.0.4 形式のメトリクス
+        """
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        lines.append("# HELP file_util_uptime_seconds Seconds since the metrics were initialized.")
+        lines.append("# TYPE file_util_uptime_seconds gauge")
+        lines.append(f"file_util_uptime_seconds {_format_value(round(time.time() - self.started_at, 3))}")
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> dict:
+        """メトリクスを集計して返す
+
+        Returns:
+            dict: 処理段階・MIMEタイプごとの処理時間(件数、平均、推定p50/p95、最大)、
+                MIMEタイプごとの件数・バイト数・文字数、実行中の処理数、処理時間の長いドキュメント
+        """
+        stages: dict[str, dict] = {}
+        for (stage, mime_type), summary in sorted(self.stage_duration.summary().items()):
+            stages.setdefault(stage, {})[mime_type] = summary
+
+        documents: dict[str, dict] = {}
+        for (mime_type, status), count in self.documents.items():
+            documents.setdefault(mime_type, {"ok": 0, "error": 0, "bytes": 0, "chars": 0})[status] = int(count)
+        for counter, field in ((self.input_bytes, "bytes"), (self.output_chars, "chars")):
+            for (mime_type,), value in counter.items():
+                documents.setdefault(mime_type, {"ok": 0, "error": 0, "bytes": 0, "chars": 0})[field] = int(value)
+
+        with self._slowest_lock:
+            slowest = [document for _, _, document in sorted(self._slowest, reverse=True)]
+        return {
+            "uptime_seconds": round(time.time() - self.started_at, 3),
+            "in_flight": {operation: int(value) for (operation,), value in sorted(self.in_flight.items())},
+            "stages": stages,
+            "documents": dict(sorted(documents.items())),
+            "http_requests": {f"{route} {status}": summary for (route, status), summary in sorted(self.http_duration.summary().items())},
+            "slowest_documents": slowest,
+        }
@@ -0,0 +1,200 @@
+import re
+import unicodedata
+from collections import Counter
+
+# 連続する改行・空白を1回の走査でまとめるパターン
+# 直後に同じ文字が続く改行・空白を削除し、連続の最後の1文字だけを残す
+# (置換文字列にグループ参照を使うと一致ごとの展開が遅くなるため、空文字列で置換できる形にしている)
+_COLLAPSE_PATTERN = re.compile(r"\n(?=\n)| (?= )")
+
+# 削除する制御文字。タブ、改行、改ページは残す
+_CONTROL_CHARS = {
+    code: None
+    for code in [*range(0x00, 0x20), 0x7f, *range(0x80, 0xa0), 0xfeff]
+    if chr(code) not in "\t\n\f"
+}
+
+# ヘッダー・フッターの比較時に同一視する、行末のページ番号のパターン
+# "3"、"- 3 -"、"(3)"、"3 / 10"、"Page 3 of 10"、"p. 3"、"3ページ"など。"Total: 3"のような本文の数字は対象外
+_PAGE_NUMBER_PATTERN = re.compile(
+    r"(?:^[\s\-–—(\[]*\d+|\b(?:page|p\.)\s*\d+|\d+\s*(?:/|of)\s*\d+|\d+\s*(?:ページ|頁))"
+    r"(?:\s*(?:/|of)\s*\d+)?[\s\-–—)\]]*$",
+    re.IGNORECASE,
+)
+
+
+class TextNormalizer:
+    """抽出したテキストを正規化するフィルター
+
+    テキストを任意の位置で分割した断片として順にfeedでき、ストリーミング抽出の途中に挟めます。
+    断片は行(ヘッダー・フッターの削除が有効な場合はページ)単位で処理し、
+    途中までの行は次の断片と合わせて処理します。
+    ただし改行を含まない長い行は、末尾の空白と最後の文字(結合文字を含む)を除いて断片ごとに処理します。
+
+    以下の段階を順に適用します。
+    * NFKC正規化(任意)
+    * 制御文字の削除(任意)
+    * ページをまたいで繰り返されるヘッダー・フッターの削除(任意。ページの区切りは改ページ文字)
+    * 連続する改行・空白を1つにまとめる(既定で有効)
+    """
+
+    # ヘッダー・フッターの候補とする、ページの先頭・末尾からの行数
+    HEADER_FOOTER_LINES = 2
+    # ヘッダー・フッターを判定するために先読みするページ数
+    HEADER_FOOTER_SAMPLE_PAGES = 8
+    # ヘッダー・フッターとみなす、同じ行が現れるページの割合
+    HEADER_FOOTER_MIN_RATIO = 0.6
+
+    def __init__(self, collapse_whitespace: bool = True, nfkc: bool = False, strip_control: bool = False,
+                 remove_headers_footers: bool = False):
+        """
+        Args:
+            collapse_whitespace: 連続する改行・空白を1つにまとめる
+            nfkc: Unicode NFKC正規化を行う(全角英数字・半角カナなどを統一する)
+            strip_control: タブ・改行・改ページ以外の制御文字とBOMを削除する
+            remove_headers_footers: ページの先頭・末尾で繰り返される行を削除する
+        """
+        self.collapse_whitespace = collapse_whitespace
+        self.nfkc = nfkc
+        self.strip_control = strip_control
+        self.remove_headers_footers = remove_headers_footers
+        self._separator = "\f" if remove_headers_footers else "\n"
+        # 未処理の断片。区切りが現れるまで連結し直さずに保持する
+        self._pending: list[str] = []
+        self._last_char = ""
+        self._sample_pages: list[str] | None = [] if remove_headers_footers else None
+        self._repeated_lines: frozenset[str] = frozenset()
+
+    def normalize(self, text: str) -> str:
+        """テキスト全体を正規化する
+
+        Args:
+            text: 正規化するテキスト
+
+        Returns:
+            str: 正規化したテキスト
+        """
+        return self.feed(text) + self.flush()
+
+    def feed(self, text: str) -> str:
+        """テキストの断片を追加し、正規化が確定した部分を返す
+
+        Args:
+            text: テキストの断片
+
+        Returns:
+            str: 正規化したテキスト。最後の区切り以降は次のfeedまたはflushで返す
+        """
+        if self._separator not in text:
+            self._pending.append(text)
+            if self.remove_headers_footers:
+                # ページ単位で判定するため、改ページ文字が現れるまで保持する
+                return ""
+            # 改行がない場合も、続く断片の影響を受けない部分は返してバッファが伸び続けないようにする
+            data = "".join(self._pending)
+            cut = self.__stable_length(data)
+            self._pending = [data[cut:]] if cut < len(data) else []
+            return self.__process(data[:cut]) if cut > 0 else ""
+        data = "".join(self._pending) + text if self._pending else text
+        cut = data.rfind(self._separator) + 1
+        self._pending = [data[cut:]] if cut < len(data) else []
+        return self.__process(data[:cut])
+
+    def flush(self) -> str:
+        """残りのテキストを正規化して返す
+
+        Returns:
+            str: 正規化したテキスト
+        """
+        data, self._pending = "".join(self._pending), []
+        return self.__process(data, final=True)
+
+    def __stable_length(self, data: str) -> int:
+        # 末尾の空白の連続と最後の文字は、続く断片とまとめて処理する必要があるため残す
+        cut = len(data.rstrip(" ")) - 1
+        if self.nfkc:
+            # NFKC正規化では前の文字と合成される文字(結合文字、半角の濁点、ハングルの字母など)があるため、
+            # 前の文字と合成されない文字まで戻る
+            while cut > 0 and self.__composes_with_previous(data[cut - 1], data[cut]):
+                cut -= 1
+        return max(cut, 0)
+
+    @staticmethod
+    def __composes_with_previous(previous: str, char: str) -> bool:
+        if unicodedata.combining(char) or unicodedata.combining(unicodedata.normalize("NFKD", char)[:1] or " "):
+            return True
+        return unicodedata.normalize("NFKC", previous + char) != unicodedata.normalize("NFKC", previous) + unicodedata.normalize("NFKC", char)
+
+    def __process(self, text: str, final: bool = False) -> str:
+        if self.nfkc:
+            text = unicodedata.normalize("NFKC", text)
+        if self.strip_control:
+            text = text.translate(_CONTROL_CHARS)
+        if self.remove_headers_footers:
+            text = self.__remove_headers_footers(text, final)
+        if self.collapse_whitespace:
+            text = self.__collapse(text)
+        return text
+
+    def __collapse(self, text: str) -> str:
+        if not text:
+            return text
+        text = _COLLAPSE_PATTERN.sub("", text)
+        # 前回の出力の末尾から続く改行・空白もまとめる
+        if self._last_char and text[0] == self._last_char and self._last_char in "\n ":
+            text = text.lstrip(self._last_char)
+        if text:
+            self._last_char = text[-1]
+        return text
+
+    def __remove_headers_footers(self, text: str, final: bool) -> str:
+        pages = text.split("\f")
+        complete_pages = [page + "\f" for page in pages[:-1]]
+        if pages[-1]:
+            # flushで渡された最後のページ(改ページ文字なし)
+            complete_pages.append(pages[-1])
+
+        if self._sample_pages is None:
+            return "".join(self.__strip_repeated_lines(page) for page in complete_pages)
+
+        self._sample_pages.extend(complete_pages)
+        # 先読み中のまま終わった場合は、それまでのページで判定する
+        if len(self._sample_pages) < self.HEADER_FOOTER_SAMPLE_PAGES and not final:
+            return ""
+        return self.__release_sample_pages()
+
+    def __release_sample_pages(self) -> str:
+        pages = self._sample_pages or []
+        self._sample_pages = None
+        if len(pages) >= 2:
+            counts: Counter[str] = Counter()
+            for page in pages:
+                counts.update({self.__line_key(line) for line in self.__edge_lines(page)})
+            min_count = max(2, int(len(pages) * self.HEADER_FOOTER_MIN_RATIO + 0.5))
+            self._repeated_lines = frozenset(key for key, count in counts.items() if count >= min_count and key)
+        return "".join(self.__strip_repeated_lines(page) for page in pages)
+
+    def __strip_repeated_lines(self, page: str) -> str:
+        if not self._repeated_lines:
+            return page
+        # 改ページ文字はフッターの行と一緒に削除しないように分けておく
+        body, form_feed = (page[:-1], "\f") if page.endswith("\f") else (page, "")
+        lines = body.split("\n")
+        # 空行を除いた先頭・末尾の数行のみを対象にする
+        content_indexes = [i for i, line in enumerate(lines) if line.strip()]
+        n = self.HEADER_FOOTER_LINES
+        edge_indexes = set(content_indexes[:n] + content_indexes[-n:])
+        removed = {i for i in edge_indexes if self.__line_key(lines[i]) in self._repeated_lines}
+        # 本文の行が残らない場合は、本文を誤って削除しないようにページをそのまま返す
+        if not removed or len(removed) == len(content_indexes):
+            return page
+        return "\n".join(line for i, line in enumerate(lines) if i not in removed) + form_feed
+
+    def __edge_lines(self, page: str) -> set[str]:
+        lines = [line for line in page.rstrip("\f").split("\n") if line.strip()]
+        n = self.HEADER_FOOTER_LINES
+        return set(lines[:n] + lines[-n:])
+
+    @classmethod
+    def __line_key(cls, line: str) -> str:
+        return _PAGE_NUMBER_PATTERN.sub("#", line.strip(" \t\f"), count=1)
@@ -0,0 +1,143 @@
+import posixpath
+import zipfile
+from typing import IO, Iterator
+from xml.etree import ElementTree
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+A_NS = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+P_NS = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+MC_NS = "{http://schemas.openxmlformats.org/markup-compatibility/2006}"
+
+
+class OOXMLUtil:
+    """Officeドキュメント(docx, pptx)のXMLを直接読み込んでテキストを抽出するユーティリティ
+
+    python-docx、python-pptxのオブジェクトモデルを構築せずに、
+    zip内のXMLをiterparseで先頭から順に読み込み、処理済みの要素は破棄します。
+    """
+
+    @classmethod
+    def iter_docx_text(cls, source: str | IO[bytes]) -> Iterator[str]:
+        """docxファイルのテキストを段落ごとに返す
+
+        ヘッダー、本文(表を含む)、フッターの順に出力します。
+
+        Args:
+            source: docxファイルのパスまたはバイナリストリーム
+
+        Yields:
+            str: 段落のテキスト。末尾に改行を含む
+        """
+        with zipfile.ZipFile(source) as archive:
+            document_part = cls.__get_main_part(archive, "word/document.xml")
+            relationships = cls.__read_relationships(archive, document_part)
+            headers = [target for rel_type, target in relationships.values() if rel_type.endswith("/header")]
+            footers = [target for rel_type, target in relationships.values() if rel_type.endswith("/footer")]
+
+            for part in headers + [document_part] + footers:
+                with archive.open(part) as f:
+                    yield from cls.__iter_paragraphs(f, W_NS + "p", W_NS + "t", W_NS + "body")
+
+    @classmethod
+    def iter_pptx_text(cls, source: str | IO[bytes]) -> Iterator[str]:
+        """pptxファイルのテキストを段落ごとに返す
+
+        スライドはプレゼンテーションでの表示順に出力します。
+
+        Args:
+            source: pptxファイルのパスまたはバイナリストリーム
+
+        Yields:
+            str: 段落のテキスト。末尾に改行を含む
+        """
+        with zipfile.ZipFile(source) as archive:
+            for part in cls.__get_slide_parts(archive):
+                with archive.open(part) as f:
+                    yield from cls.__iter_paragraphs(f, A_NS + "p", A_NS + "t", P_NS + "spTree")
+
+    @classmethod
+    def __iter_paragraphs(cls, f: IO[bytes], paragraph_tag: str, text_tag: str, container_tag: str) -> Iterator[str]:
+        texts: list[str] = []
+        container = None
+        depth = 0
+        container_depth = -1
+        # mc:Fallbackの中身はmc:Choiceと同じ内容の代替表現のため読み飛ばす
+        fallback_depth = 0
+        for event, elem in ElementTree.iterparse(f, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                if container is None and elem.tag == container_tag:
+                    container = elem
+                    container_depth = depth
+                elif elem.tag == MC_NS + "Fallback":
+                    fallback_depth += 1
+                continue
+
+            tag = elem.tag
+            if tag == MC_NS + "Fallback":
+                fallback_depth -= 1
+            elif fallback_depth > 0:
+                pass
+            elif tag == text_tag:
+                if elem.text:
+                    texts.append(elem.text)
+            elif tag == W_NS + "tab":
+                texts.append("\t")
+            elif tag in (W_NS + "br", W_NS + "cr", A_NS + "br"):
+                texts.append("\n")
+            elif tag == paragraph_tag:
+                yield "".join(texts) + "\n"
+                texts.clear()
+                elem.clear()
+
+            # 処理済みの要素を破棄して、メモリ使用量を一定に保つ
+            if depth == container_depth + 1 and container is not None:
+                container.clear()
+            depth -= 1
+
+    @classmethod
+    def __get_main_part(cls, archive: zipfile.ZipFile, default: str) -> str:
+        relationships = cls.__read_relationships(archive, "")
+        for rel_type, target in relationships.values():
+            if rel_type.endswith("/officeDocument"):
+                return target
+        return default
+
+    @classmethod
+    def __get_slide_parts(cls, archive: zipfile.ZipFile) -> list[str]:
+        presentation_part = cls.__get_main_part(archive, "ppt/presentation.xml")
+        relationships = cls.__read_relationships(archive, presentation_part)
+        slides = []
+        with archive.open(presentation_part) as f:
+            for _, elem in ElementTree.iterparse(f, events=("end",)):
+                if elem.tag == P_NS + "sldId":
+                    relationship = relationships.get(elem.get(R_NS + "id", ""))
+                    if relationship is not None:
+                        slides.append(relationship[1])
+                elif elem.tag == P_NS + "sldIdLst":
+                    break
+        return slides
+
+    @classmethod
+    def __read_relationships(cls, archive: zipfile.ZipFile, part: str) -> dict[str, tuple[str, str]]:
+        """パーツのリレーションシップをId -> (Type, zip内のパス)の辞書で返す"""
+        base_dir, name = posixpath.split(part)
+        rels_part = posixpath.join(base_dir, "_rels", name + ".rels")
+        relationships: dict[str, tuple[str, str]] = {}
+        try:
+            f = archive.open(rels_part)
+        except KeyError:
+            return relationships
+        with f:
+            for _, elem in ElementTree.iterparse(f, events=("end",)):
+                if elem.tag != REL_NS + "Relationship" or elem.get("TargetMode") == "External":
+                    continue
+                target = elem.get("Target", "")
+                if target.startswith("/"):
+                    target = target.lstrip("/")
+                else:
+                    target = posixpath.normpath(posixpath.join(base_dir, target))
+                relationships[elem.get("Id", "")] = (elem.get("Type", ""), target)
+        return relationships
@@ -0,0 +1,77 @@
+from io import StringIO
+
+from pdfminer.pdfdevice import PDFTextDevice
+from pdfminer.pdffont import PDFUnicodeNotDefined
+from pdfminer.pdfinterp import PDFResourceManager
+from pdfminer.utils import apply_matrix_pt, mult_matrix
+
+
+class PDFFastTextDevice(PDFTextDevice):
+    """レイアウト解析を行わずにテキストを出力するpdfminerのデバイス
+
+    文字ごとのLTCharの生成とLAParamsによるレイアウト解析を省略し、
+    コンテンツストリームの描画順にテキストを出力します。
+    前の文字列の終端からの位置の変化で改行・空白を補います。
+    """
+
+    def __init__(self, rsrcmgr: PDFResourceManager, outfp: StringIO):
+        super().__init__(rsrcmgr)
+        self.outfp = outfp
+        self._end: tuple[float, float] | None = None
+        # フォントごとのcidから(文字, 文字幅)へのキャッシュ
+        self._glyphs: dict = {}
+
+    def begin_page(self, page, ctm):
+        super().begin_page(page, ctm)
+        self._end = None
+
+    def end_page(self, page):
+        self.outfp.write("\n\f")
+
+    def render_string(self, textstate, seq, ncs, graphicstate):
+        font = textstate.font
+        if font is None or self.ctm is None:
+            return
+        matrix = mult_matrix(textstate.matrix, self.ctm)
+        fontsize = textstate.fontsize
+        scaling = textstate.scaling * 0.01
+        charspace = textstate.charspace * scaling
+        wordspace = 0 if font.is_multibyte() else textstate.wordspace * scaling
+        dxscale = 0.001 * fontsize * scaling
+        glyphs = self._glyphs.setdefault(font, {})
+
+        (x, y) = textstate.linematrix
+        chars = []
+        for obj in seq:
+            if isinstance(obj, (int, float)):
+                x -= obj * dxscale
+                # TJの大きな字間調整は単語の区切りとみなす
+                if obj < -300:
+                    chars.append(" ")
+                continue
+            if not isinstance(obj, bytes):
+                continue
+            for cid in font.decode(obj):
+                glyph = glyphs.get(cid)
+                if glyph is None:
+                    try:
+                        text = font.to_unichr(cid)
+                    except PDFUnicodeNotDefined:
+                        text = "(cid:%d)" % cid
+                    glyph = glyphs[cid] = (text, font.char_width(cid))
+                chars.append(glyph[0])
+                x += glyph[1] * fontsize * scaling + charspace
+                if cid == 32:
+                    x += wordspace
+
+        (start_x, start_y) = apply_matrix_pt(matrix, textstate.linematrix)
+        textstate.linematrix = (x, y)
+        if self._end is not None:
+            (end_x, end_y) = self._end
+            height = abs(fontsize * matrix[3]) or fontsize
+            if abs(start_y - end_y) > height * 0.5:
+                self.outfp.write("\n")
+            elif start_x - end_x > height * 0.25 or start_x < end_x - height:
+                self.outfp.write(" ")
+        self.outfp.write("".join(chars))
+        self._end = apply_matrix_pt(matrix, (x, y))
@@ -1,16 +1,208 @@
-from pdfminer.high_level import extract_text
+import multiprocessing
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import StringIO
+from typing import Iterator
+
+from file_util.config.file_util_config import FileUtilConfig
+from file_util.util.source_util import DocumentSource, SourceUtil
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
 
 
 class PDFUtil:
+    # 抽出モード
+    # accurate: pdfminerのレイアウト解析で読み順を再構成する(既定)
+    # fast: レイアウト解析を省略する。検索インデックス用途向け
+    MODE_ACCURATE = "accurate"
+    MODE_FAST = "fast"
+
+    # ページ単位の並列抽出に切り替える最小ページ数
+    PARALLEL_MIN_PAGES = 32
+    # 1ワーカーに渡す1回あたりの最大ページ数
+    PARALLEL_CHUNK_PAGES = 16
+
     @classmethod
-    def extract_text_from_pdf(cls, filename: str) -> str:
+    def extract_text_from_pdf(cls, filename: DocumentSource, page_numbers: list[int] | None = None, max_pages: int = 0,
+                              max_workers: int | None = None, mode: str = MODE_ACCURATE) -> str:
         """
         PDFファイルからテキストを抽出する。
+        ページ数が多い場合はページを分割して複数プロセスで並列に抽出し、ページ順に結合します。
+        ワーカープロセス内で呼び出された場合は、プロセスを増やさずに順に抽出します。
+        非同期の処理からは、共有のワーカーでページを分割して抽出するFileUtil.extract_text_from_pdf_asyncを使用してください。
+        Args:
+            filename (str | bytes | IO[bytes]): PDFファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+            page_numbers (list[int] | None): 抽出するページ番号(0始まり)のリスト。Noneの場合は全ページ
+            max_pages (int): 抽出する最大ページ数。0の場合は制限なし
+            max_workers (int | None): 並列抽出のワーカー数。Noneの場合は設定値
+            mode (str): 抽出モード。"accurate"または"fast"
+        Returns:
+            str: 抽出されたテキスト。ページの区切りは改ページ文字(\\f)
+        """
+        return "".join(text for _, text in cls.iter_pages(filename, page_numbers, max_pages, max_workers, mode))
+
+    @classmethod
+    def iter_pages(cls, filename: DocumentSource, page_numbers: list[int] | None = None, max_pages: int = 0,
+                   max_workers: int | None = None, mode: str = MODE_ACCURATE) -> Iterator[tuple[int, str]]:
+        """
+        PDFファイルのページごとのテキストを、抽出が完了したものからページ順に返す。
+        Args:
+            filename (str | bytes | IO[bytes]): PDFファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+            page_numbers (list[int] | None): 抽出するページ番号(0始まり)のリスト。Noneの場合は全ページ
+            max_pages (int): 抽出する最大ページ数。0の場合は制限なし
+            max_workers (int | None): 並列抽出のワーカー数。Noneの場合は設定値
+            mode (str): 抽出モード。"accurate"または"fast"
+        Yields:
+            tuple[int, str]: ページ番号(0始まり)とそのページのテキスト
+        """
+        if mode not in (cls.MODE_ACCURATE, cls.MODE_FAST):
+            raise ValueError(f"Unsupported PDF extraction mode: {mode}")
+        pagenos = cls.get_target_pages(filename, page_numbers, max_pages)
+        if max_workers is None:
+            max_workers = cls.get_max_workers()
+        # ExtractorExecutorなどのワーカープロセス内でプールを作成すると、ワーカー数×CPU数のプロセスが起動するため順に抽出する
+        if multiprocessing.parent_process() is not None:
+            max_workers = 1
+
+        if max_workers <= 1 or len(pagenos) < cls.PARALLEL_MIN_PAGES:
+            yield from cls.__iter_page_texts(filename, pagenos, mode)
+            return
+
+        # ワーカープロセスに渡せるように、ストリームやmemoryviewはバイト列に変換する
+        filename = SourceUtil.to_picklable(filename)
+        chunks = cls.split_pages(pagenos, max_workers)
+        done_pages: dict[int, str] = {}
+        next_index = 0
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+            pending = {executor.submit(cls.extract_page_texts, filename, chunk, mode) for chunk in chunks}
+            try:
+                while pending:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        done_pages.update(future.result())
+                    # ページ順に揃った分から返す
+                    while next_index < len(pagenos) and pagenos[next_index] in done_pages:
+                        pageno = pagenos[next_index]
+                        yield pageno, done_pages.pop(pageno)
+                        next_index += 1
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    @classmethod
+    def get_max_workers(cls) -> int:
+        """
+        1つのPDFを並列に抽出する最大ワーカー数を取得する。
+        Returns:
+            int: PDF_MAX_WORKERSの設定値。0の場合はCPU数
+        """
+        return FileUtilConfig().pdf_max_workers or os.cpu_count() or 1
+
+    @classmethod
+    def split_pages(cls, pagenos: list[int], max_workers: int) -> list[list[int]]:
+        """
+        並列抽出のために、ページをワーカー数に対して十分な数のチャンクに分割する。
+        Args:
+            pagenos (list[int]): 抽出するページ番号(0始まり)のリスト
+            max_workers (int): 並列抽出のワーカー数
+        Returns:
+            list[list[int]]: ページ順のチャンクのリスト。1チャンクは最大PARALLEL_CHUNK_PAGESページ
+        """
+        chunk_size = max(1, min(cls.PARALLEL_CHUNK_PAGES, -(-len(pagenos) // (max_workers * 2))))
+        return [pagenos[i:i + chunk_size] for i in range(0, len(pagenos), chunk_size)]
+
+    @classmethod
+    def extract_page_texts(cls, filename: DocumentSource, pagenos: list[int], mode: str = MODE_ACCURATE) -> dict[int, str]:
+        """
+        指定したページのテキストを抽出する。並列抽出のワーカーから呼び出される。
+        Args:
+            filename (str | bytes | IO[bytes]): PDFファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+            pagenos (list[int]): 抽出するページ番号(0始まり)のリスト
+            mode (str): 抽出モード。"accurate"または"fast"
+        Returns:
+            dict[int, str]: ページ番号とテキストの辞書
+        """
+        return dict(cls.__iter_page_texts(filename, pagenos, mode))
+
+    @classmethod
+    def get_page_count(cls, filename: DocumentSource) -> int:
+        """
+        PDFファイルのページ数を取得する。
+        Args:
+            filename (str | bytes | IO[bytes]): PDFファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+        Returns:
+            int: ページ数
+        """
+        # pdfminerは読み込みに時間がかかるため、使用する時点で読み込む
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+        from pdfminer.pdftypes import resolve1
+        with SourceUtil.open_binary(filename) as fp:
+            document = PDFDocument(PDFParser(fp))
+            count = resolve1(document.catalog.get("Pages", {})).get("Count")
+            if isinstance(count, int):
+                return count
+            # ページツリーにCountがない場合は数える
+            return sum(1 for _ in PDFPage.create_pages(document))
+
+    @classmethod
+    def get_target_pages(cls, filename: DocumentSource, page_numbers: list[int] | None = None, max_pages: int = 0) -> list[int]:
+        """
+        抽出するページ番号を取得する。
         Args:
-            filename (str): PDFファイルのパス
+            filename (str | bytes | IO[bytes]): PDFファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+            page_numbers (list[int] | None): 抽出するページ番号(0始まり)のリスト。Noneの場合は全ページ
+            max_pages (int): 抽出する最大ページ数。0の場合は制限なし
         Returns:
-            str: 抽出されたテキスト
+            list[int]: 昇順のページ番号(0始まり)のリスト
         """
-        text = extract_text(filename)
-        return text
+        if page_numbers is not None:
+            pagenos = sorted(set(page_numbers))
+        else:
+            page_count = cls.get_page_count(filename)
+            if max_pages > 0:
+                page_count = min(page_count, max_pages)
+            pagenos = list(range(page_count))
+        if max_pages > 0:
+            pagenos = pagenos[:max_pages]
+        return pagenos
 
+    @classmethod
+    def __iter_page_texts(cls, filename: DocumentSource, pagenos: list[int], mode: str) -> Iterator[tuple[int, str]]:
+        if not pagenos:
+            return
+        from pdfminer.converter import TextConverter
+        from pdfminer.layout import LAParams
+        from pdfminer.pdfdocument import PDFDocument
+        from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+        from pdfminer.pdfpage import PDFPage
+        from pdfminer.pdfparser import PDFParser
+        from file_util.util.pdf_device_util import PDFFastTextDevice
+        targets = set(pagenos)
+        last_pageno = max(targets)
+        output = StringIO()
+        with SourceUtil.open_binary(filename) as fp:
+            document = PDFDocument(PDFParser(fp))
+            # pdfminer.high_levelと同様に、抽出を許可しない指定は警告のみで抽出を続ける
+            if not document.is_extractable:
+                logger.warning("The PDF contains a metadata field indicating that it should not allow text extraction. "
+                               "Ignoring this field and proceeding.")
+            rsrcmgr = PDFResourceManager(caching=True)
+            if mode == cls.MODE_FAST:
+                device = PDFFastTextDevice(rsrcmgr, output)
+            else:
+                device = TextConverter(rsrcmgr, output, laparams=LAParams())
+            interpreter = PDFPageInterpreter(rsrcmgr, device)
+            try:
+                for pageno, page in enumerate(PDFPage.create_pages(document)):
+                    if pageno > last_pageno:
+                        break
+                    if pageno not in targets:
+                        continue
+                    interpreter.process_page(page)
+                    yield pageno, output.getvalue()
+                    output.seek(0)
+                    output.truncate(0)
+            finally:
+                device.close()
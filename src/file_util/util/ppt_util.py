@@ -1,21 +1,72 @@
-import pptx
+import zipfile
 from io import StringIO
+from typing import Iterator
+from xml.etree import ElementTree
+
+from file_util.util.ooxml_util import OOXMLUtil
+from file_util.util.source_util import DocumentSource, SourceUtil
+
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
 
 class PPTUtil:
 
     @classmethod
-    def extract_text_from_pptx(cls, filename):
+    def extract_text_from_pptx(cls, filename: DocumentSource):
         """PowerPoint(PPTX)からテキストを抽出する
 
+        スライドのXMLを直接読み込みます。読み込めない場合はpython-pptxによる抽出に切り替えます。
+
         Args:
-            filename: PPTXファイルパス
+            filename: PPTXファイルパス、ファイルの内容またはシーク可能なバイナリストリーム
+
+        Returns:
+            str: 抽出されたテキスト
+        """
+        try:
+            return "".join(OOXMLUtil.iter_pptx_text(SourceUtil.to_path_or_stream(filename)))
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+            logger.warning(f"Falling back to python-pptx: {e}")
+            return cls.extract_text_from_pptx_object_model(filename)
+
+    @classmethod
+    def iter_text_from_pptx(cls, filename: DocumentSource) -> Iterator[str]:
+        """PowerPoint(PPTX)のテキストを段落ごとに返す。ストリーミング出力で使用する
+
+        何も出力する前に読み込めないことがわかった場合のみ、python-pptxによる抽出に切り替えます。
+
+        Args:
+            filename: PPTXファイルパス、ファイルの内容またはシーク可能なバイナリストリーム
+
+        Yields:
+            str: 段落のテキスト
+        """
+        paragraphs = OOXMLUtil.iter_pptx_text(SourceUtil.to_path_or_stream(filename))
+        try:
+            first = next(paragraphs, None)
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+            logger.warning(f"Falling back to python-pptx: {e}")
+            yield cls.extract_text_from_pptx_object_model(filename)
+            return
+        if first is not None:
+            yield first
+            yield from paragraphs
+
+    @classmethod
+    def extract_text_from_pptx_object_model(cls, filename: DocumentSource):
+        """python-pptxのオブジェクトモデルを使用して、PowerPoint(PPTX)からテキストを抽出する
+
+        Args:
+            filename: PPTXファイルパス、ファイルの内容またはシーク可能なバイナリストリーム
 
         Returns:
             str: 抽出されたテキスト
         """
         # 出力用のストリームを作成
         output = StringIO()
-        prs = pptx.Presentation(filename)
+        # フォールバック用のため、使用する時点で読み込む
+        import pptx
+        prs = pptx.Presentation(SourceUtil.to_path_or_stream(filename))
         for slide in prs.slides:
             for shape in slide.shapes:
                 if hasattr(shape, "text"):
@@ -23,4 +74,3 @@ class PPTUtil:
                     output.write("\n")
         
         return output.getvalue()
-
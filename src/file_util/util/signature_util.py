@@ -0,0 +1,129 @@
+import io
+import os
+import zipfile
+from typing import IO
+from xml.etree import ElementTree
+
+from file_util.config.file_util_config import FileUtilConfig
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+MIME_PDF = "application/pdf"
+MIME_EXCEL = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+MIME_WORD = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+MIME_PPT = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+MIME_PNG = "image/png"
+MIME_JPEG = "image/jpeg"
+MIME_GIF = "image/gif"
+
+# 先頭のバイト列(マジックナンバー)とMIMEタイプの対応
+_MAGIC_NUMBERS: tuple[tuple[bytes, str], ...] = (
+    (b"%PDF-", MIME_PDF),
+    (b"\x89PNG\r\n\x1a\n", MIME_PNG),
+    (b"\xff\xd8\xff", MIME_JPEG),
+    (b"GIF87a", MIME_GIF),
+    (b"GIF89a", MIME_GIF),
+)
+
+# ZIPのローカルファイルヘッダー
+_ZIP_SIGNATURE = b"PK\x03\x04"
+
+# OOXMLのメインパートのコンテンツタイプとMIMEタイプの対応
+# マクロ有効ブック・テンプレートなどはコンテンツタイプが異なるため、Magikaで判定する
+_OOXML_MAIN_CONTENT_TYPES = {
+    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml": MIME_EXCEL,
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml": MIME_WORD,
+    "application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml": MIME_PPT,
+}
+
+
+class SignatureUtil:
+    """ファイルの先頭のシグネチャ(マジックナンバー)から種類を判定するユーティリティ
+
+    以下の形式はシグネチャで種類が一意に決まるため、Magikaのモデル推論を行わずに判定します。
+    * PDF、PNG、JPEG、GIF: 先頭のバイト列
+    * xlsx、docx、pptx: ZIPの末尾のセントラルディレクトリから[Content_Types].xmlを探し、メインパートのコンテンツタイプで判定する
+
+    判定できない場合(テキスト、OOXML以外のZIP、データの途中までのZIPなど)はNoneを返し、Magikaで判定します。
+    STRICT_TYPE_DETECTIONが有効な場合は使用しません。
+    """
+
+    # マジックナンバーの判定に使用する先頭のバイト数
+    HEADER_SIZE = 8
+    # 読み込む[Content_Types].xmlの最大サイズ(バイト)。超える場合はMagikaで判定する
+    MAX_CONTENT_TYPES_SIZE = 1024 * 1024
+
+    _enabled: bool | None = None
+
+    @classmethod
+    def is_enabled(cls) -> bool:
+        """シグネチャによる判定を行うかどうかを取得する
+
+        Returns:
+            bool: STRICT_TYPE_DETECTIONが無効な場合はTrue
+        """
+        if cls._enabled is None:
+            cls._enabled = not FileUtilConfig().strict_type_detection
+        return cls._enabled
+
+    @classmethod
+    def identify_file(cls, filename: str | os.PathLike) -> str | None:
+        """ファイルの種類をシグネチャから判定する
+
+        先頭のバイト列と、ZIPの場合はセントラルディレクトリと[Content_Types].xmlのみを読み込みます。
+
+        Args:
+            filename: 判定対象のファイルパス
+
+        Returns:
+            str | None: MIMEタイプ。シグネチャで判定できない場合はNone
+        """
+        try:
+            with open(filename, "rb") as f:
+                return cls.__identify(f, f.read(cls.HEADER_SIZE))
+        except OSError as e:
+            logger.debug(e)
+            return None
+
+    @classmethod
+    def identify_bytes(cls, data: bytes | bytearray | memoryview) -> str | None:
+        """バイト列の種類をシグネチャから判定する
+
+        Args:
+            data: 判定対象のバイト列
+
+        Returns:
+            str | None: MIMEタイプ。シグネチャで判定できない場合はNone
+        """
+        header = bytes(memoryview(data)[:cls.HEADER_SIZE])
+        if not header.startswith(_ZIP_SIGNATURE):
+            return cls.__identify(None, header)
+        return cls.__identify(io.BytesIO(data), header)
+
+    @classmethod
+    def __identify(cls, f: IO[bytes] | None, header: bytes) -> str | None:
+        for magic, mime_type in _MAGIC_NUMBERS:
+            if header.startswith(magic):
+                return mime_type
+        if f is not None and header.startswith(_ZIP_SIGNATURE):
+            return cls.__identify_ooxml(f)
+        return None
+
+    @classmethod
+    def __identify_ooxml(cls, f: IO[bytes]) -> str | None:
+        try:
+            # ZipFileはファイルの末尾のセントラルディレクトリのみを読み込む
+            with zipfile.ZipFile(f) as archive:
+                info = archive.getinfo("[Content_Types].xml")
+                if info.file_size > cls.MAX_CONTENT_TYPES_SIZE or info.flag_bits & 0x1:
+                    return None
+                root = ElementTree.fromstring(archive.read(info))
+        except Exception as e:
+            # ZIPでない、データの途中まで、[Content_Types].xmlがないなど
+            logger.debug(e)
+            return None
+
+        mime_types = {_OOXML_MAIN_CONTENT_TYPES[content_type] for elem in root
+                      if (content_type := elem.get("ContentType")) in _OOXML_MAIN_CONTENT_TYPES}
+        # メインパートが1種類のみの場合に判定する
+        return mime_types.pop() if len(mime_types) == 1 else None
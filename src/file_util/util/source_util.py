@@ -0,0 +1,152 @@
+import binascii
+import io
+from contextlib import contextmanager
+from typing import IO, Iterable, Iterator, Union
+
+# 抽出処理の入力。ファイルパス、ファイルの内容のバイト列、またはバイナリストリーム
+DocumentSource = Union[str, bytes, bytearray, memoryview, IO[bytes]]
+
+
+class SourceUtil:
+    """抽出処理の入力(ファイルパス、バイト列、バイナリストリーム)を扱うユーティリティ"""
+
+    # base64を逐次デコードする際の1回あたりの文字数(4の倍数)
+    BASE64_CHUNK_SIZE = 64 * 1024
+
+    @classmethod
+    def to_path_or_stream(cls, source: DocumentSource) -> str | IO[bytes]:
+        """ファイルパスとファイルオブジェクトの両方を受け付けるライブラリに渡す形式に変換する
+
+        Args:
+            source: ファイルパス、バイト列またはバイナリストリーム
+
+        Returns:
+            str | IO[bytes]: ファイルパスとストリームの場合はそのまま、バイト列の場合はBytesIO
+        """
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return io.BytesIO(source)
+        return source
+
+    @classmethod
+    @contextmanager
+    def open_binary(cls, source: DocumentSource) -> Iterator[IO[bytes]]:
+        """入力を読み込み用のバイナリストリームとして開く
+
+        ファイルパスの場合のみファイルを開いて閉じます。ストリームは閉じません。
+
+        Args:
+            source: ファイルパス、バイト列またはバイナリストリーム
+
+        Yields:
+            IO[bytes]: バイナリストリーム
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                yield f
+            return
+        yield cls.to_path_or_stream(source) # type: ignore
+
+    @classmethod
+    def read_bytes(cls, source: DocumentSource) -> bytes:
+        """入力の内容をバイト列として取得する
+
+        Args:
+            source: ファイルパス、バイト列またはバイナリストリーム
+
+        Returns:
+            bytes: 入力の内容。bytesの場合はコピーせずにそのまま返す。シーク可能なストリームは先頭から読み込む
+        """
+        if isinstance(source, bytes):
+            return source
+        if isinstance(source, (bytearray, memoryview)):
+            return bytes(source)
+        if isinstance(source, io.BytesIO):
+            return source.getvalue()
+        with cls.open_binary(source) as f:
+            if f.seekable():
+                f.seek(0)
+            return f.read()
+
+    @classmethod
+    def to_picklable(cls, source: DocumentSource) -> str | bytes:
+        """プロセス間で受け渡しできる形式に変換する
+
+        memoryviewやファイルオブジェクトはpickleできないため、バイト列に変換します。
+
+        Args:
+            source: ファイルパス、バイト列またはバイナリストリーム
+
+        Returns:
+            str | bytes: ファイルパスまたはバイト列
+        """
+        if isinstance(source, str):
+            return source
+        return cls.read_bytes(source)
+
+    @classmethod
+    def decode_base64(cls, data: str | bytes | Iterable[str | bytes]) -> bytes:
+        """base64を逐次デコードする
+
+        入力全体のASCIIバイト列や空白を除いた文字列を作らずに、一定の文字数ごとにデコードして書き出します。
+        改行などの空白は無視します。
+
+        Args:
+            data: base64文字列、またはその断片のイテラブル
+
+        Returns:
+            bytes: デコードしたバイト列
+        """
+        decoder = Base64StreamDecoder()
+        output = io.BytesIO()
+        if isinstance(data, (str, bytes)):
+            chunks: Iterable[str | bytes] = (
+                data[i:i + cls.BASE64_CHUNK_SIZE] for i in range(0, len(data), cls.BASE64_CHUNK_SIZE)
+            )
+        else:
+            chunks = data
+        for chunk in chunks:
+            output.write(decoder.feed(chunk))
+        output.write(decoder.flush())
+        return output.getvalue()
+
+
+class Base64StreamDecoder:
+    """任意の位置で分割されたbase64の断片を順にデコードするデコーダー"""
+
+    # base64の1ブロックの文字数
+    BLOCK_SIZE = 4
+    _WHITESPACE = b" \t\r\n\v\f"
+
+    def __init__(self):
+        self._pending = b""
+
+    def feed(self, chunk: str | bytes) -> bytes:
+        """断片を追加し、デコードできた分のバイト列を返す
+
+        Args:
+            chunk: base64の断片
+
+        Returns:
+            bytes: デコードしたバイト列。4文字に満たない端数は次の断片と合わせてデコードする
+        """
+        if isinstance(chunk, str):
+            chunk = chunk.encode("ascii")
+        data = self._pending + chunk.translate(None, self._WHITESPACE)
+        usable = len(data) - len(data) % self.BLOCK_SIZE
+        self._pending = data[usable:]
+        return binascii.a2b_base64(data[:usable]) if usable else b""
+
+    def flush(self) -> bytes:
+        """残りの端数をデコードする
+
+        Returns:
+            bytes: デコードしたバイト列
+
+        Raises:
+            binascii.Error: 端数がbase64として不正な場合
+        """
+        data, self._pending = self._pending, b""
+        if not data:
+            return b""
+        # 末尾のパディングが省略されている場合は補う
+        return binascii.a2b_base64(data + b"=" * (-len(data) % self.BLOCK_SIZE))
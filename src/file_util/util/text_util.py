@@ -1,42 +1,278 @@
-import aiofiles
+import asyncio
+import codecs
+import html
+import locale
+import re
+from html.parser import HTMLParser
+from typing import Iterator
+from xml.etree import ElementTree
+
+from file_util.util.source_util import DocumentSource, SourceUtil
+
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+# HTMLの宣言されたエンコーディングを探すパターン(<meta charset>と<meta http-equiv>の両方)
+_HTML_CHARSET_PATTERN = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([A-Za-z0-9_.:-]+)""", re.IGNORECASE)
+
+# Markdownの記法を取り除くパターン
+_MD_FENCE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+_MD_HEADING_PATTERN = re.compile(r"^ {0,3}#{1,6}(?:[ \t]+|$)(.*?)(?:[ \t]+#+)?[ \t]*$")
+_MD_SETEXT_OR_RULE_PATTERN = re.compile(r"^ {0,3}(?:=+|-+|(?:[-*_][ \t]*){3,})[ \t]*$")
+_MD_BLOCKQUOTE_PATTERN = re.compile(r"^(?: {0,3}>[ \t]?)+")
+_MD_LIST_PATTERN = re.compile(r"^([ \t]*)(?:[-*+]|\d{1,9}[.)])[ \t]+(?:\[[ xX]\][ \t]+)?")
+_MD_REFERENCE_PATTERN = re.compile(r"^ {0,3}\[[^\]]+\]:[ \t]*\S+.*$")
+_MD_TABLE_DELIMITER_PATTERN = re.compile(r"^[ \t]*\|?[ \t]*:?-+:?[ \t]*(?:\|[ \t]*:?-+:?[ \t]*)+\|?[ \t]*$")
+_MD_INLINE_PATTERNS: tuple[tuple[re.Pattern, str], ...] = (
+    # 画像・リンクは代替テキスト・リンクテキストを残す
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),
+    (re.compile(r"\[([^\]]+)\](?:\([^)]*\)|\[[^\]]*\])"), r"\1"),
+    # 自動リンクはURLを残し、その他のHTMLタグは取り除く
+    (re.compile(r"<((?:https?|ftp|mailto):[^>\s]+)>"), r"\1"),
+    (re.compile(r"</?[A-Za-z][^>]*>"), ""),
+    # インラインコード、強調、取り消し線
+    (re.compile(r"(`+)(.+?)\1"), r"\2"),
+    (re.compile(r"(\*\*|__)(?=\S)(.+?)(?<=\S)\1"), r"\2"),
+    (re.compile(r"(?<![\w*])\*(?=\S)(.+?)(?<=\S)\*(?![\w*])|(?<![\w_])_(?=\S)(.+?)(?<=\S)_(?![\w_])"), r"\1\2"),
+    (re.compile(r"~~(?=\S)(.+?)(?<=\S)~~"), r"\1"),
+    # バックスラッシュによるエスケープ
+    (re.compile(r"\\([\\`*_{}\[\]()#+\-.!|>~])"), r"\1"),
+)
+
 
 class TextUtil:
+    """text/*のファイルからテキストを抽出するユーティリティ
+
+    ファイル全体を読み込まずに、一定のバイト数ずつ読み込みながら逐次デコード・解析します。
+    HTML・XMLは文書のツリーを構築せずに、インクリメンタルなパーサーでテキストだけを取り出します。
+    MarkdownはHTMLに変換せずに、行ごとに記法を取り除きます。
+    """
+
+    # 1回に読み込むバイト数
+    READ_CHUNK_SIZE = 1024 * 1024
+    # HTMLの宣言されたエンコーディングを探す先頭のバイト数
+    HTML_HEAD_SIZE = 4096
+
     # text/*のファイルを読み込んで文字列として返す関数
     @classmethod
     async def process_text_async(cls, filename, mime_type, encoding):
-        result = ""
-        if mime_type == "text/html":
-            # text/htmlの場合
-            from bs4 import BeautifulSoup
-            # テキストを取得
-            async with aiofiles.open(filename, "rb") as f:
-                text_data = await f.read()
-                soup = BeautifulSoup(text_data, "html.parser")
-            result = soup.get_text()
-
-        elif mime_type == "text/xml":
-            # text/xmlの場合
-            from bs4 import BeautifulSoup
-            # テキストを取得
-            async with aiofiles.open(filename, "rb") as f:
-                text_data = await f.read()
-                soup = BeautifulSoup(text_data, features="xml")
-            result = soup.get_text()
-
-        elif mime_type == "text/markdown":
-            # markdownの場合
-            from bs4 import BeautifulSoup
-            from markdown import markdown # type: ignore
-            # テキストを取得
-            async with aiofiles.open(filename, "r" ,encoding=encoding, errors='ignore') as f:
-                text_data = await f.read()
-                md = markdown(text_data)
-                soup = BeautifulSoup(md, "html.parser")
-            result = soup.get_text()
+        return await asyncio.to_thread(cls.process_text_bytes, filename, mime_type, encoding)
+
+    # text/*のバイト列(bytes、memoryview、BytesIOなど)を文字列として返す関数
+    @classmethod
+    def process_text_bytes(cls, source: DocumentSource, mime_type, encoding):
+        if mime_type == "text/xml":
+            try:
+                return "".join(cls.iter_text(source, mime_type, encoding))
+            except ElementTree.ParseError as e:
+                # 整形式でないXMLは、エラーを回復しながら解析できるBeautifulSoupで処理する
+                logger.debug(f"Falling back to BeautifulSoup for malformed XML: {e}")
+                from bs4 import BeautifulSoup
+                soup = BeautifulSoup(SourceUtil.read_bytes(source), features="xml")
+                return soup.get_text()
+        return "".join(cls.iter_text(source, mime_type, encoding))
+
+    @classmethod
+    def iter_text(cls, source: DocumentSource, mime_type: str, encoding: str | None) -> Iterator[str]:
+        """text/*のファイルのテキストを先頭から順に返す
+
+        Args:
+            source: ファイルパス、バイト列またはバイナリストリーム
+            mime_type: MIMEタイプ。text/html、text/xml、text/markdown、その他のtext/*
+            encoding: エンコーディング。Noneの場合はロケールの既定値。XMLは文書の宣言に従う
+
+        Yields:
+            str: テキストの断片。改行コードは\\nに揃える
+
+        Raises:
+            xml.etree.ElementTree.ParseError: XMLが整形式でない場合
+        """
+        with SourceUtil.open_binary(source) as f:
+            if f.seekable():
+                f.seek(0)
+            chunks = iter(lambda: f.read(cls.READ_CHUNK_SIZE), b"")
+            if mime_type == "text/html":
+                yield from cls.__iter_html_text(chunks, encoding)
+            elif mime_type == "text/xml":
+                yield from cls.__iter_xml_text(chunks)
+            elif mime_type == "text/markdown":
+                yield from cls.__iter_markdown_text(cls.__iter_decoded(chunks, encoding))
+            else:
+                yield from cls.__iter_decoded(chunks, encoding)
+
+    @classmethod
+    def __iter_decoded(cls, chunks: Iterator[bytes], encoding: str | None) -> Iterator[str]:
+        # テキストモードでファイルを開いた場合と同様に、改行コードを\nに揃える
+        decoder = codecs.getincrementaldecoder(encoding or locale.getpreferredencoding(False))(errors="ignore")
+        pending_cr = False
+        for chunk in chunks:
+            text = decoder.decode(chunk)
+            if pending_cr:
+                text = "\r" + text
+            # \r\nがチャンクの境界で分かれた場合に備えて、末尾の\rは次のチャンクと合わせて処理する
+            pending_cr = text.endswith("\r")
+            if pending_cr:
+                text = text[:-1]
+            if text:
+                yield text.replace("\r\n", "\n").replace("\r", "\n")
+        text = decoder.decode(b"", final=True)
+        if pending_cr:
+            text = "\r" + text
+        if text:
+            yield text.replace("\r\n", "\n").replace("\r", "\n")
+
+    @classmethod
+    def __iter_html_text(cls, chunks: Iterator[bytes], encoding: str | None) -> Iterator[str]:
+        # 文書で宣言されたエンコーディングを優先する
+        head = b""
+        for chunk in chunks:
+            head += chunk
+            if len(head) >= cls.HTML_HEAD_SIZE:
+                break
+        encoding = cls.__get_html_encoding(head) or encoding or "utf-8"
+        parser = _HTMLTextParser()
+
+        def iter_all() -> Iterator[bytes]:
+            yield head
+            yield from chunks
+
+        for text in cls.__iter_decoded(iter_all(), encoding):
+            parser.feed(text)
+            if parser.texts:
+                yield "".join(parser.texts)
+                parser.texts.clear()
+        parser.close()
+        if parser.texts:
+            yield "".join(parser.texts)
+
+    @classmethod
+    def __get_html_encoding(cls, head: bytes) -> str | None:
+        if head.startswith(codecs.BOM_UTF8):
+            return "utf-8-sig"
+        if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+            return "utf-16"
+        match = _HTML_CHARSET_PATTERN.search(head[:cls.HTML_HEAD_SIZE])
+        if match is None:
+            return None
+        declared = match.group(1).decode("ascii")
+        try:
+            return codecs.lookup(declared).name
+        except LookupError:
+            return None
+
+    @classmethod
+    def __iter_xml_text(cls, chunks: Iterator[bytes]) -> Iterator[str]:
+        # 要素のテキストと後続テキスト(tail)を文書の順に返す
+        # 処理済みの要素は親から取り除き、メモリ使用量を一定に保つ
+        parser = ElementTree.XMLPullParser(events=("start", "end"))
+        # [要素, 最後に開始した子要素]
+        stack: list[list] = []
+
+        def handle_events() -> Iterator[str]:
+            for event, elem in parser.read_events():
+                if event == "start":
+                    if stack:
+                        entry = stack[-1]
+                        parent, previous = entry
+                        if previous is None:
+                            text = parent.text
+                        else:
+                            text = previous.tail
+                            parent.remove(previous)
+                        if text:
+                            yield text
+                        entry[1] = elem
+                    stack.append([elem, None])
+                else:
+                    _, last_child = stack.pop()
+                    if last_child is None:
+                        text = elem.text
+                    else:
+                        text = last_child.tail
+                        elem.remove(last_child)
+                    if text:
+                        yield text
+
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from handle_events()
+        parser.close()
+        yield from handle_events()
+
+    @classmethod
+    def __iter_markdown_text(cls, texts: Iterator[str]) -> Iterator[str]:
+        pending = ""
+        fence = None
+        for text in texts:
+            lines = (pending + text).split("\n")
+            pending = lines.pop()
+            output = []
+            for line in lines:
+                line, fence = cls.__strip_markdown_line(line, fence)
+                if line is not None:
+                    output.append(line + "\n")
+            if output:
+                yield "".join(output)
+        if pending:
+            line, _ = cls.__strip_markdown_line(pending, fence)
+            if line is not None:
+                yield line
+
+    @classmethod
+    def __strip_markdown_line(cls, line: str, fence: str | None) -> tuple[str | None, str | None]:
+        # 1行分のMarkdownの記法を取り除く。Noneの行は出力しない
+        fence_match = _MD_FENCE_PATTERN.match(line)
+        if fence is not None:
+            # コードブロックの中は記法として解釈しない
+            if fence_match is not None and fence_match.group(1)[0] == fence[0] and len(fence_match.group(1)) >= len(fence):
+                return None, None
+            return line, fence
+        if fence_match is not None:
+            return None, fence_match.group(1)
+        if _MD_REFERENCE_PATTERN.match(line) or _MD_TABLE_DELIMITER_PATTERN.match(line) or _MD_SETEXT_OR_RULE_PATTERN.match(line):
+            return None, None
+
+        line = _MD_BLOCKQUOTE_PATTERN.sub("", line)
+        heading = _MD_HEADING_PATTERN.match(line)
+        if heading is not None:
+            line = heading.group(1)
         else:
-            # その他のtext/*の場合
-            async with aiofiles.open(filename, "r", encoding=encoding, errors='ignore') as f:
-                result = await f.read()
-            
-        return result
+            line = _MD_LIST_PATTERN.sub(r"\1", line, count=1)
+        if "|" in line and line.strip().startswith("|"):
+            # 表の行はセルをタブで区切る
+            line = "\t".join(cell.strip() for cell in line.strip().strip("|").split("|"))
+        for pattern, replacement in _MD_INLINE_PATTERNS:
+            line = pattern.sub(replacement, line)
+        return html.unescape(line), None
+
+
+class _HTMLTextParser(HTMLParser):
+    """HTMLのテキストノードを順に集めるパーサー
+
+    BeautifulSoupのget_textと同様に、script、style、templateの中身とコメントは含めません。
+    """
+
+    # 中身をテキストとして扱わない要素
+    SKIP_TAGS = frozenset(("script", "style", "template"))
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.texts: list[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self._skip_depth > 0:
+            self._skip_depth -= 1
+
+    def handle_data(self, data):
+        if self._skip_depth == 0:
+            self.texts.append(data)
 
+    def unknown_decl(self, data):
+        # <![CDATA[...]]>の中身はテキストとして扱う
+        if data.startswith("CDATA[") and self._skip_depth == 0:
+            self.texts.append(data[len("CDATA["):])
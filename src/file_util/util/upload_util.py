@@ -0,0 +1,213 @@
+import hashlib
+import io
+import os
+import tempfile
+
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+
+class UploadTooLargeError(ValueError):
+    """アップロードされたデータがサイズの上限を超えた場合の例外"""
+
+
+class UploadSpool:
+    """受信中のアップロードデータを一時的に保持するスプール
+
+    チャンクを受信した順に書き込み、max_memory_sizeまではメモリに保持し、
+    超えた時点で一時ファイルへ書き出します。
+    受信と同時に内容のハッシュを計算するため、受信後にデータを読み直さずにキャッシュを参照できます。
+    """
+
+    # 種類の判定に使用する先頭部分のバイト数
+    HEAD_SIZE = 64 * 1024
+
+    def __init__(self, max_size: int = 0, max_memory_size: int = 8 * 1024 * 1024, identifier: str = ""):
+        """
+        Args:
+            max_size: 受け付ける最大バイト数。0以下の場合は制限なし
+            max_memory_size: メモリに保持する最大バイト数。超えた場合は一時ファイルに書き出す
+            identifier: ログなどに使用するアップロードデータの識別子
+        """
+        self.max_size = max_size
+        self.max_memory_size = max_memory_size
+        self.identifier = identifier
+        self._buffer: io.BytesIO | None = io.BytesIO()
+        self._file = None
+        self._size = 0
+        self._head = b""
+        self._hash = hashlib.sha256()
+
+    def __enter__(self) -> "UploadSpool":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def size(self) -> int:
+        """受信済みのバイト数"""
+        return self._size
+
+    @property
+    def head(self) -> bytes:
+        """受信済みのデータの先頭HEAD_SIZEバイト"""
+        return self._head
+
+    @property
+    def sha256(self) -> str:
+        """受信済みのデータのSHA-256(16進数)"""
+        return self._hash.hexdigest()
+
+    @property
+    def path(self) -> str | None:
+        """一時ファイルのパス。メモリに保持している場合はNone"""
+        return self._file.name if self._file is not None else None
+
+    def write(self, chunk: bytes):
+        """受信したチャンクを書き込む
+
+        Args:
+            chunk: 受信したデータ
+
+        Raises:
+            UploadTooLargeError: 受信済みのバイト数がmax_sizeを超えた場合
+        """
+        if not chunk:
+            return
+        self._size += len(chunk)
+        if self.max_size > 0 and self._size > self.max_size:
+            raise UploadTooLargeError(f"Upload exceeds the limit of {self.max_size} bytes")
+        if len(self._head) < self.HEAD_SIZE:
+            self._head += chunk[:self.HEAD_SIZE - len(self._head)]
+        self._hash.update(chunk)
+
+        if self._buffer is not None and self._size > self.max_memory_size:
+            self.__rollover()
+        if self._buffer is not None:
+            self._buffer.write(chunk)
+        else:
+            self._file.write(chunk) # type: ignore
+
+    def getvalue(self) -> bytes:
+        """メモリに保持しているデータを取得する
+
+        Returns:
+            bytes: 受信したデータ
+
+        Raises:
+            ValueError: データを一時ファイルに書き出している場合
+        """
+        if self._buffer is None:
+            raise ValueError("Upload is spooled to a temporary file")
+        return self._buffer.getvalue()
+
+    def finish(self):
+        """受信を完了する。一時ファイルに書き出している場合はフラッシュして閉じる"""
+        if self._file is not None and not self._file.closed:
+            self._file.close()
+
+    def close(self):
+        """保持しているデータと一時ファイルを破棄する"""
+        self._buffer = None
+        if self._file is not None:
+            self.finish()
+            try:
+                os.remove(self._file.name)
+            except FileNotFoundError:
+                pass
+            self._file = None
+
+    def __rollover(self):
+        logger.debug(f"Spooling upload to disk: {self.identifier}")
+        self._file = tempfile.NamedTemporaryFile(mode="wb", prefix="file_util_upload_", delete=False)
+        self._file.write(self._buffer.getvalue()) # type: ignore
+        self._buffer = None
+
+
+class MultipartFileReader:
+    """multipart/form-dataの本文から、最初のファイルパートのデータを逐次取り出すリーダー
+
+    本文をチャンクごとにfeedし、ファイルパートのデータを受信した順に取り出します。
+    本文全体やパート全体をメモリに保持しません。
+    """
+
+    def __init__(self, content_type: str):
+        """
+        Args:
+            content_type: リクエストのContent-Typeヘッダー。boundaryを含む
+
+        Raises:
+            ValueError: boundaryが指定されていない場合
+        """
+        from python_multipart.multipart import MultipartParser, parse_options_header
+        self._parse_options_header = parse_options_header
+        _, params = parse_options_header(content_type)
+        boundary = params.get(b"boundary")
+        if not boundary:
+            raise ValueError("Missing boundary in multipart/form-data")
+
+        self.filename: str | None = None
+        self.found = False
+        self.done = False
+        self._in_file_part = False
+        self._header_field = b""
+        self._header_value = b""
+        self._headers: dict[bytes, bytes] = {}
+        self._chunks: list[bytes] = []
+        self._parser = MultipartParser(boundary, {
+            "on_part_begin": self.__on_part_begin,
+            "on_header_field": self.__on_header_field,
+            "on_header_value": self.__on_header_value,
+            "on_header_end": self.__on_header_end,
+            "on_headers_finished": self.__on_headers_finished,
+            "on_part_data": self.__on_part_data,
+            "on_part_end": self.__on_part_end,
+        })
+
+    def feed(self, data: bytes) -> list[bytes]:
+        """本文のチャンクを追加し、取り出せたファイルパートのデータを返す
+
+        Args:
+            data: 本文のチャンク
+
+        Returns:
+            list[bytes]: ファイルパートのデータのチャンク
+        """
+        if not self.done:
+            self._parser.write(data)
+        chunks, self._chunks = self._chunks, []
+        return chunks
+
+    def __on_part_begin(self):
+        self._headers = {}
+
+    def __on_header_field(self, data: bytes, start: int, end: int):
+        self._header_field += data[start:end]
+
+    def __on_header_value(self, data: bytes, start: int, end: int):
+        self._header_value += data[start:end]
+
+    def __on_header_end(self):
+        self._headers[self._header_field.lower()] = self._header_value
+        self._header_field = b""
+        self._header_value = b""
+
+    def __on_headers_finished(self):
+        if self.found:
+            return
+        _, params = self._parse_options_header(self._headers.get(b"content-disposition"))
+        filename = params.get(b"filename")
+        if filename is not None:
+            self.found = True
+            self._in_file_part = True
+            self.filename = filename.decode("utf-8", errors="replace")
+
+    def __on_part_data(self, data: bytes, start: int, end: int):
+        if self._in_file_part:
+            self._chunks.append(bytes(data[start:end]))
+
+    def __on_part_end(self):
+        if self._in_file_part:
+            self._in_file_part = False
+            self.done = True
@@ -1,22 +1,72 @@
-import docx
+import zipfile
 from io import StringIO
+from typing import Iterator
+from xml.etree import ElementTree
+
+from file_util.util.ooxml_util import OOXMLUtil
+from file_util.util.source_util import DocumentSource, SourceUtil
+
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
 
 class WordUtil:
     @classmethod
-    def extract_text_from_docx(cls, filename):
+    def extract_text_from_docx(cls, filename: DocumentSource):
         """
         指定された.docxファイルからテキストを抽出します。
+        ヘッダー、本文(表を含む)、フッターのXMLを直接読み込みます。
+        読み込めない場合はpython-docxによる抽出に切り替えます。
+
+        Args:
+            filename (str | bytes | IO[bytes]): .docxファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+        Returns:
+            str: 抽出されたテキスト
+        """
+        try:
+            return "".join(OOXMLUtil.iter_docx_text(SourceUtil.to_path_or_stream(filename)))
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+            logger.warning(f"Falling back to python-docx: {e}")
+            return cls.extract_text_from_docx_object_model(filename)
+
+    @classmethod
+    def iter_text_from_docx(cls, filename: DocumentSource) -> Iterator[str]:
+        """
+        指定された.docxファイルのテキストを段落ごとに返します。ストリーミング出力で使用します。
+        何も出力する前に読み込めないことがわかった場合のみ、python-docxによる抽出に切り替えます。
+
+        Args:
+            filename (str | bytes | IO[bytes]): .docxファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+        Yields:
+            str: 段落のテキスト
+        """
+        paragraphs = OOXMLUtil.iter_docx_text(SourceUtil.to_path_or_stream(filename))
+        try:
+            first = next(paragraphs, None)
+        except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as e:
+            logger.warning(f"Falling back to python-docx: {e}")
+            yield cls.extract_text_from_docx_object_model(filename)
+            return
+        if first is not None:
+            yield first
+            yield from paragraphs
+
+    @classmethod
+    def extract_text_from_docx_object_model(cls, filename: DocumentSource):
+        """
+        python-docxのオブジェクトモデルを使用して、.docxファイルの本文の段落からテキストを抽出します。
 
         Args:
-            filename (str): .docxファイルのパス
+            filename (str | bytes | IO[bytes]): .docxファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
         Returns:
             str: 抽出されたテキスト
         """
         # 出力用のストリームを作成
         output = StringIO()
-        doc = docx.Document(filename)
+        # フォールバック用のため、使用する時点で読み込む
+        import docx
+        doc = docx.Document(SourceUtil.to_path_or_stream(filename))
         for para in doc.paragraphs:
             output.write(para.text)
             output.write("\n")
             
-        return output.getvalue()
\ No newline at end of file
+        return output.getvalue()
@@ -1,10 +1,64 @@
+import fnmatch
 import locale, os
-import pyzipper as zipfile
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+import zipfile
+from typing import TYPE_CHECKING, Iterator
+
+# pyzipperはAES暗号化のためにpycryptodomexを読み込み、読み込みに時間がかかるため、使用する時点で読み込む
+if TYPE_CHECKING:
+    import pyzipper
+
+from file_util.util.source_util import DocumentSource, SourceUtil
+import file_util.log.log_settings as log_settings
+logger = log_settings.getLogger(__name__)
+
+# 圧縮済みのデータ形式のシグネチャ(オフセット, 先頭バイト列)
+# これらの形式は再圧縮してもほとんど小さくならないため、無圧縮で格納する
+COMPRESSED_SIGNATURES: list[tuple[int, bytes]] = [
+    (0, b"%PDF-"),
+    (0, b"PK\x03\x04"),              # zip, docx/xlsx/pptx, jar, epub
+    (0, b"\x1f\x8b"),                 # gzip
+    (0, b"BZh"),                      # bzip2
+    (0, b"\xfd7zXZ\x00"),             # xz
+    (0, b"7z\xbc\xaf\x27\x1c"),       # 7z
+    (0, b"Rar!\x1a\x07"),             # rar
+    (0, b"\x28\xb5\x2f\xfd"),         # zstd
+    (0, b"\xff\xd8\xff"),             # jpeg
+    (0, b"\x89PNG\r\n\x1a\n"),        # png
+    (0, b"GIF8"),                     # gif
+    (8, b"WEBP"),                     # webp
+    (4, b"ftyp"),                     # mp4, mov, heic
+    (0, b"ID3"),                      # mp3
+    (0, b"OggS"),                     # ogg
+    (0, b"fLaC"),                     # flac
+    (0, b"wOFF"),                     # woff
+    (0, b"wOF2"),                     # woff2
+]
+
+# 圧縮方式の値は標準ライブラリのzipfileとpyzipperで共通
+COMPRESSION_METHODS = {
+    "stored": zipfile.ZIP_STORED,
+    "deflated": zipfile.ZIP_DEFLATED,
+    "bzip2": zipfile.ZIP_BZIP2,
+    "lzma": zipfile.ZIP_LZMA,
+}
+
+# ローカルファイルヘッダー(シグネチャ、展開に必要なバージョン、フラグ、圧縮方式、更新時刻、更新日付、CRC32、
+# 圧縮後のサイズ、元のサイズ、ファイル名の長さ、拡張フィールドの長さ)
+_LOCAL_FILE_HEADER = struct.Struct("<4sHHHHHLLLHH")
 
 class ZipUtil:
 
+    # メモリ上で並列に圧縮するファイルの最大サイズ。これより大きいファイルは書き込み時に逐次圧縮する
+    PARALLEL_MAX_FILE_SIZE = 64 * 1024 * 1024
+    # 圧縮時に読み込むチャンクのサイズ
+    COMPRESS_CHUNK_SIZE = 1024 * 1024
+
     @classmethod
-    def __check_utf8_flag(cls, zip_ref: zipfile.ZipFile):
+    def __check_utf8_flag(cls, zip_ref: "pyzipper.ZipFile"):
         # 1つでもUTF-8フラグが立っていればTrueを返す
         for info in zip_ref.infolist():
             if bool(info.flag_bits & 0x800):
@@ -12,21 +66,106 @@ class ZipUtil:
         return False
 
     @classmethod
-    def extract_zip(cls, file_path, extract_to, password=None) -> bool:
-        with zipfile.ZipFile(file_path, 'r') as zip_ref:
-            system_encoding = cls.__get_system_encoding()
-            is_utf = cls.__check_utf8_flag(zip_ref)
+    def extract_zip(cls, file_path, extract_to, password=None, members: list[str] | None = None,
+                    include: list[str] | None = None, exclude: list[str] | None = None,
+                    max_workers: int | None = None, use_processes: bool = False) -> bool:
+        """ZIPファイルを展開する
+
+        展開対象のメンバーを複数のワーカーに分けて並列に展開します。
+        各ワーカーはZIPファイルを個別に開くため、ファイルハンドルは共有しません。
+
+        Args:
+            file_path: ZIPファイルのパス
+            extract_to: 展開先のディレクトリ
+            password: ZIPファイルのパスワード
+            members: 展開するメンバー名のリスト。Noneの場合は全メンバー
+            include: 展開するメンバー名のglobパターンのリスト。いずれかに一致するメンバーのみ展開する
+            exclude: 展開しないメンバー名のglobパターンのリスト
+            max_workers: ワーカー数。Noneの場合はCPU数。1の場合は並列化しない
+            use_processes: Trueの場合はスレッドではなくプロセスで並列化する
+
+        Returns:
+            bool: 展開に成功した場合はTrue
+        """
+        import pyzipper
+        with pyzipper.ZipFile(file_path, 'r') as zip_ref:
+            names = cls.__get_decoded_names(zip_ref)
+            infos = zip_ref.infolist()
+
+        targets = [
+            index for index, name in enumerate(names)
+            if cls.__match_member(name, members, include, exclude)
+        ]
+        if not targets:
+            return True
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        max_workers = min(max_workers, len(targets))
+        if max_workers <= 1:
+            cls.extract_members(file_path, extract_to, [(index, names[index]) for index in targets], password)
+            return True
+
+        # サイズの大きいメンバーから順に各ワーカーへ振り分ける
+        targets.sort(key=lambda index: infos[index].file_size, reverse=True)
+        chunks = [
+            [(index, names[index]) for index in targets[i::max_workers]]
+            for i in range(max_workers)
+        ]
+        executor_class = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+        with executor_class(max_workers=max_workers) as executor:
+            futures = [executor.submit(cls.extract_members, file_path, extract_to, chunk, password) for chunk in chunks]
+            for future in futures:
+                future.result()
+
+        return True
+
+    @classmethod
+    def extract_members(cls, file_path, extract_to, members: list[tuple[int, str]], password=None):
+        """ZIPファイルを開き、指定したメンバーを展開する。並列展開のワーカーから呼び出される。
+
+        Args:
+            file_path: ZIPファイルのパス
+            extract_to: 展開先のディレクトリ
+            members: 展開するメンバーのインデックスとデコード済みの名前のタプルのリスト
+            password: ZIPファイルのパスワード
+        """
+        import pyzipper
+        # AES暗号化したZIPファイル(create_zipでパスワードを指定した場合など)も展開できるようにAESZipFileで開く
+        with pyzipper.AESZipFile(file_path, 'r') as zip_ref:
             if password:
                 zip_ref.setpassword(password.encode())
-            for info in zip_ref.infolist():
-                name = info.filename
-                if not is_utf:
-                    name = name.encode('cp437').decode(system_encoding, errors='replace')
+            infos = zip_ref.infolist()
+            for index, name in members:
+                info = infos[index]
                 info.filename = name
-                zip_ref.extract(info, path=extract_to)
+                try:
+                    zip_ref.extract(info, path=extract_to)
+                except FileExistsError:
+                    # 他のワーカーが同じ親ディレクトリを同時に作成した場合は再試行する
+                    zip_ref.extract(info, path=extract_to)
 
-        return True
+    @classmethod
+    def __get_decoded_names(cls, zip_ref: "pyzipper.ZipFile") -> list[str]:
+        system_encoding = cls.__get_system_encoding()
+        is_utf = cls.__check_utf8_flag(zip_ref)
+        names = []
+        for info in zip_ref.infolist():
+            name = info.filename
+            if not is_utf:
+                name = name.encode('cp437').decode(system_encoding, errors='replace')
+            names.append(name)
+        return names
 
+    @classmethod
+    def __match_member(cls, name: str, members: list[str] | None, include: list[str] | None, exclude: list[str] | None) -> bool:
+        if members is not None and name not in members:
+            return False
+        if include and not any(fnmatch.fnmatchcase(name, pattern) for pattern in include):
+            return False
+        if exclude and any(fnmatch.fnmatchcase(name, pattern) for pattern in exclude):
+            return False
+        return True
 
     @classmethod
     def __get_system_encoding(cls):
@@ -34,30 +173,250 @@ class ZipUtil:
 
     @classmethod
     def list_zip_contents(cls, file_path) -> list[str]:
-        result = []
-        with zipfile.ZipFile(file_path, 'r') as zip_ref:
-            is_utf = cls.__check_utf8_flag(zip_ref)
-            system_encoding = cls.__get_system_encoding()
-            for info in zip_ref.infolist():
-                name = info.filename
-                if not is_utf:
-                    name = name.encode('cp437').decode(system_encoding, errors='replace')
-                result.append(name)
-        return result
-
-    @classmethod
-    def create_zip(cls, file_paths: list[str], output_zip: str, password=None) -> bool:
-        with zipfile.ZipFile(output_zip, 'w') as zip_ref:
-            if password:
-                zip_ref.setpassword(password.encode())
-            for file_path in file_paths:
-                # ファイルかディレクトリかを確認
-                if os.path.isdir(file_path):
-                    for root, _, files in os.walk(file_path):
-                        for file in files:
-                            full_path = os.path.join(root, file)
-                            arcname = os.path.relpath(full_path, start=os.path.dirname(file_path))
-                            zip_ref.write(full_path, arcname=arcname)
-                else:
-                    zip_ref.write(file_path, arcname=os.path.basename(file_path))
+        import pyzipper
+        with pyzipper.ZipFile(file_path, 'r') as zip_ref:
+            return cls.__get_decoded_names(zip_ref)
+
+    @classmethod
+    def open_archive(cls, source: DocumentSource, password=None) -> "pyzipper.AESZipFile":
+        """ZIPファイルを読み込み用に開く
+
+        ZipCryptoとAESのどちらで暗号化されたメンバーも読み込めます。呼び出し側でcloseしてください。
+
+        Args:
+            source: ZIPファイルのパス、ファイルの内容またはシーク可能なバイナリストリーム
+            password: ZIPファイルのパスワード
+
+        Returns:
+            pyzipper.AESZipFile: 開いたZIPファイル
+        """
+        import pyzipper
+        zip_ref = pyzipper.AESZipFile(SourceUtil.to_path_or_stream(source), 'r')
+        if password:
+            zip_ref.setpassword(password.encode())
+        return zip_ref
+
+    @classmethod
+    def iter_file_members(cls, zip_ref: "pyzipper.ZipFile") -> Iterator[tuple[str, "pyzipper.ZipInfo"]]:
+        """ディレクトリを除くメンバーを、デコード済みの名前とともに格納順に返す
+
+        Args:
+            zip_ref: 開いたZIPファイル
+
+        Yields:
+            tuple[str, pyzipper.ZipInfo]: デコード済みのメンバー名とメンバーの情報
+        """
+        for name, info in zip(cls.__get_decoded_names(zip_ref), zip_ref.infolist()):
+            if not info.is_dir():
+                yield name, info
+
+    @classmethod
+    def create_zip(cls, file_paths: list[str], output_zip: str, password=None, compression: str = "stored",
+                   compresslevel: int | None = None, store_compressed: bool = True,
+                   max_workers: int | None = None) -> bool:
+        """ZIPファイルを作成する
+
+        JPEG、PDF、ZIPなどの圧縮済みの形式は、store_compressedがTrueの場合は無圧縮で格納します。
+        パスワードを指定しない場合は、標準ライブラリのzipfileの公開APIで各メンバーを順に書き込みます。
+        パスワードを指定した場合はAES暗号化したZIPファイル(pyzipper)を作成し、各メンバーの圧縮と暗号化を
+        複数のスレッドで並列に行ってから順番に書き込みます。この書き込みにはpyzipperの内部APIを使用するため、
+        requirements.txtで固定したバージョン以外で内部APIが見つからない場合は、並列化せずにAESZipFile.writeで書き込みます。
+        並列に書き込んだ場合は、各メンバーのローカルファイルヘッダーがセントラルディレクトリと一致することを確認します。
+
+        Args:
+            file_paths: ZIPに含めるファイルまたはディレクトリのパスのリスト
+            output_zip: 出力するZIPファイルのパス
+            password: ZIPファイルのパスワード。指定した場合はAES-256で暗号化する
+            compression: 圧縮方式。"stored"(既定。従来どおり無圧縮)、"deflated"、"bzip2"、"lzma"のいずれか
+            compresslevel: 圧縮レベル。Noneの場合は圧縮方式の既定値
+            store_compressed: Trueの場合は圧縮済みの形式のファイルを無圧縮で格納する
+            max_workers: パスワード付きの場合の圧縮・暗号化のワーカー数。Noneの場合はCPU数。1の場合は並列化しない
+
+        Returns:
+            bool: 作成に成功した場合はTrue
+
+        Raises:
+            zipfile.BadZipFile: 書き込んだZIPファイルのヘッダーが一致しない場合
+        """
+        compress_type = COMPRESSION_METHODS.get(compression)
+        if compress_type is None:
+            raise ValueError(f"Unsupported compression method: {compression}")
+        entries = cls.__collect_entries(file_paths)
+
+        if not password:
+            with zipfile.ZipFile(output_zip, 'w', compression=compress_type, compresslevel=compresslevel) as zip_ref:
+                for full_path, arcname in entries:
+                    zip_ref.write(full_path, arcname=arcname,
+                                  compress_type=cls.__select_compress_type(full_path, compress_type, store_compressed))
+            return True
+
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        import pyzipper
+        with pyzipper.AESZipFile(output_zip, 'w', compression=compress_type, compresslevel=compresslevel,
+                                 encryption=pyzipper.WZ_AES) as zip_ref:
+            zip_ref.setpassword(password.encode())
+            if max_workers <= 1 or not cls.__supports_precompressed_write(zip_ref):
+                if max_workers > 1:
+                    logger.warning("pyzipper internals for writing precompressed members are not available, writing ZIP members serially")
+                for full_path, arcname in entries:
+                    zip_ref.write(full_path, arcname=arcname,
+                                  compress_type=cls.__select_compress_type(full_path, compress_type, store_compressed))
+                return True
+
+            with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="file_util_zip") as executor:
+                # 書き込み待ちのメンバーを一定数に抑えて、メモリ使用量を制限する
+                pending: deque[tuple[str, str, Future | None]] = deque()
+                for full_path, arcname in entries:
+                    future = None
+                    if os.path.getsize(full_path) <= cls.PARALLEL_MAX_FILE_SIZE:
+                        future = executor.submit(cls.compress_member, full_path, compress_type, compresslevel,
+                                                 store_compressed, zip_ref.get_encrypter())
+                    pending.append((full_path, arcname, future))
+                    if len(pending) >= max_workers * 2:
+                        cls.__write_member(zip_ref, *pending.popleft(), compress_type, store_compressed)
+                while pending:
+                    cls.__write_member(zip_ref, *pending.popleft(), compress_type, store_compressed)
+        cls.__verify_local_headers(output_zip)
         return True
+
+    @classmethod
+    def __supports_precompressed_write(cls, zip_ref: "pyzipper.AESZipFile") -> bool:
+        # __write_member、compress_memberが使用するpyzipperの内部API
+        from pyzipper import zipfile as pyzipper_zipfile
+        return (all(hasattr(zip_ref, name) for name in ("fp", "start_dir", "_writecheck", "_didModify", "filelist",
+                                                         "NameToInfo", "zipinfo_cls", "get_encrypter"))
+                and hasattr(pyzipper_zipfile.ZipInfo, "FileHeader")
+                and hasattr(pyzipper_zipfile, "_get_compressor")
+                and hasattr(pyzipper_zipfile, "ZIP64_LIMIT"))
+
+    @classmethod
+    def __verify_local_headers(cls, output_zip: str):
+        # 内部APIで書き込んだメンバーのローカルファイルヘッダーを、セントラルディレクトリと照合する
+        # 圧縮データは読み込まないため、ZIPファイルのサイズに関わらずメンバー数に比例した時間で終わる
+        with zipfile.ZipFile(output_zip) as archive, open(output_zip, "rb") as f:
+            for info in archive.infolist():
+                f.seek(info.header_offset)
+                header = f.read(_LOCAL_FILE_HEADER.size)
+                if len(header) != _LOCAL_FILE_HEADER.size:
+                    raise zipfile.BadZipFile(f"Truncated local file header: {info.filename}")
+                signature, _, flag_bits, compress_type, _, _, crc, _, _, name_length, _ = _LOCAL_FILE_HEADER.unpack(header)
+                name = f.read(name_length)
+                if (signature != b"PK\x03\x04" or compress_type != info.compress_type
+                        or name.decode("utf-8" if flag_bits & 0x800 else "cp437") != info.orig_filename):
+                    raise zipfile.BadZipFile(f"Local file header does not match the central directory: {info.filename}")
+                # データディスクリプターを使用しない場合はCRCもローカルファイルヘッダーにある
+                if not flag_bits & 0x08 and crc != info.CRC:
+                    raise zipfile.BadZipFile(f"CRC in the local file header does not match: {info.filename}")
+
+    @classmethod
+    def compress_member(cls, file_path: str, compress_type: int, compresslevel: int | None = None,
+                        store_compressed: bool = True, encrypter=None) -> tuple[int, int, int, list[bytes], object]:
+        """ファイルを読み込み、ZIPのメンバーとして格納するデータに圧縮・暗号化する
+
+        zlib、bz2、lzmaの圧縮処理とAES暗号化はGILを解放するため、複数のスレッドから並列に呼び出せます。
+
+        Args:
+            file_path: ファイルのパス
+            compress_type: 圧縮方式(ZIP_STOREDなど)
+            compresslevel: 圧縮レベル
+            store_compressed: Trueの場合は圧縮済みの形式のファイルを無圧縮で格納する
+            encrypter: pyzipperのAESZipFile.get_encrypterで作成した暗号化処理。Noneの場合は暗号化しない
+
+        Returns:
+            tuple[int, int, int, list[bytes], object]: 実際の圧縮方式、CRC32、元のサイズ、格納するデータ、暗号化処理
+        """
+        from pyzipper.zipfile import _get_compressor
+        if store_compressed and cls.is_compressed_file(file_path):
+            compress_type = zipfile.ZIP_STORED
+        compressor = _get_compressor(compress_type, compresslevel)
+        crc = 0
+        file_size = 0
+        chunks: list[bytes] = [encrypter.encryption_header()] if encrypter else []
+        with open(file_path, "rb") as f:
+            while chunk := f.read(cls.COMPRESS_CHUNK_SIZE):
+                crc = zlib.crc32(chunk, crc)
+                file_size += len(chunk)
+                data = compressor.compress(chunk) if compressor else chunk
+                chunks.append(encrypter.encrypt(data) if encrypter else data)
+        if compressor:
+            data = compressor.flush()
+            chunks.append(encrypter.encrypt(data) if encrypter else data)
+        if encrypter:
+            # 末尾の認証コード(HMAC)
+            chunks.append(encrypter.flush())
+        return compress_type, crc, file_size, chunks, encrypter
+
+    @classmethod
+    def is_compressed_file(cls, file_path: str) -> bool:
+        """ファイルの先頭のシグネチャから、圧縮済みの形式かどうかを判定する
+
+        Args:
+            file_path: ファイルのパス
+
+        Returns:
+            bool: 圧縮済みの形式の場合はTrue
+        """
+        with open(file_path, "rb") as f:
+            header = f.read(16)
+        return any(header.startswith(signature, offset) for offset, signature in COMPRESSED_SIGNATURES)
+
+    @classmethod
+    def __select_compress_type(cls, file_path: str, compress_type: int, store_compressed: bool) -> int:
+        if store_compressed and cls.is_compressed_file(file_path):
+            return zipfile.ZIP_STORED
+        return compress_type
+
+    @classmethod
+    def __write_member(cls, zip_ref: "pyzipper.AESZipFile", full_path: str, arcname: str, future: Future | None,
+                       compress_type: int, store_compressed: bool):
+        if future is None:
+            # 大きなファイルはZipFileの書き込み処理で逐次圧縮する
+            zip_ref.write(full_path, arcname=arcname,
+                          compress_type=cls.__select_compress_type(full_path, compress_type, store_compressed))
+            return
+
+        from pyzipper.zipfile import ZIP64_LIMIT
+        member_compress_type, crc, file_size, chunks, encrypter = future.result()
+        zinfo = zip_ref.zipinfo_cls.from_file(full_path, arcname)
+        zinfo.compress_type = member_compress_type
+        zinfo.CRC = crc
+        zinfo.file_size = file_size
+        zinfo.compress_size = sum(len(chunk) for chunk in chunks)
+        zinfo.flag_bits = 0
+        if encrypter is not None:
+            # AES暗号化の拡張フィールドの情報を設定する。AE-2の場合はヘッダーのCRCは0になる
+            zinfo.flag_bits |= 0x01
+            encrypter.update_zipinfo(zinfo)
+            encrypter.finalize_zipinfo(zinfo)
+        if member_compress_type == zipfile.ZIP_LZMA:
+            # LZMAの圧縮データは終端マーカーを含む
+            zinfo.flag_bits |= 0x02
+        zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+
+        # 圧縮・暗号化済みのデータをローカルファイルヘッダーに続けて書き込む
+        zip_ref.fp.seek(zip_ref.start_dir)
+        zinfo.header_offset = zip_ref.fp.tell()
+        zip_ref._writecheck(zinfo)
+        zip_ref._didModify = True
+        zip_ref.fp.write(zinfo.FileHeader(zip64))
+        for chunk in chunks:
+            zip_ref.fp.write(chunk)
+        zip_ref.start_dir = zip_ref.fp.tell()
+        zip_ref.filelist.append(zinfo)
+        zip_ref.NameToInfo[zinfo.filename] = zinfo
+
+    @classmethod
+    def __collect_entries(cls, file_paths: list[str]) -> list[tuple[str, str]]:
+        entries = []
+        for file_path in file_paths:
+            # ファイルかディレクトリかを確認
+            if os.path.isdir(file_path):
+                for root, _, files in os.walk(file_path):
+                    for file in files:
+                        full_path = os.path.join(root, file)
+                        arcname = os.path.relpath(full_path, start=os.path.dirname(file_path))
+                        entries.append((full_path, arcname))
+            else:
+                entries.append((file_path, os.path.basename(file_path)))
+        return entries
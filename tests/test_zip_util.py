@@ -0,0 +1,70 @@
+import os
+import zipfile
+
+import pytest
+import pyzipper
+
+from file_util.util.zip_util import COMPRESSION_METHODS, ZipUtil
+
+PASSWORD = "secret"
+
+
+@pytest.fixture
+def source_dir(tmp_path):
+    """圧縮しやすいテキスト、圧縮済みの形式、空ファイル、日本語名のファイルを含むディレクトリ"""
+    root = tmp_path / "src"
+    (root / "sub").mkdir(parents=True)
+    (root / "a.txt").write_text("hello world\n" * 5000)
+    (root / "b.bin").write_bytes(os.urandom(200_000))
+    (root / "c.pdf").write_bytes(b"%PDF-1.4\n" + os.urandom(50_000))
+    (root / "empty.txt").write_bytes(b"")
+    (root / "sub" / "日本語.txt").write_text("テキスト\n" * 300, encoding="utf-8")
+    return root
+
+
+def read_tree(root) -> dict[str, bytes]:
+    return {
+        os.path.relpath(os.path.join(dirpath, name), root).replace(os.sep, "/"): open(os.path.join(dirpath, name), "rb").read()
+        for dirpath, _, names in os.walk(root) for name in names
+    }
+
+
+@pytest.mark.parametrize("compression", ["stored", "deflated", "bzip2", "lzma"])
+@pytest.mark.parametrize("max_workers", [4, 1])
+def test_create_zip_aes_round_trip(tmp_path, source_dir, compression, max_workers):
+    output_zip = str(tmp_path / "out.zip")
+    assert ZipUtil.create_zip([str(source_dir)], output_zip, password=PASSWORD, compression=compression,
+                              max_workers=max_workers)
+
+    expected = {f"src/{name}": data for name, data in read_tree(source_dir).items()}
+    with pyzipper.AESZipFile(output_zip) as archive:
+        archive.setpassword(PASSWORD.encode())
+        infos = archive.infolist()
+        assert all(info.flag_bits & 0x01 for info in infos)
+        assert {info.filename: archive.read(info) for info in infos} == expected
+        # 圧縮済みの形式は無圧縮で格納する
+        assert archive.getinfo("src/c.pdf").compress_type == zipfile.ZIP_STORED
+
+    with pyzipper.AESZipFile(output_zip) as archive:
+        archive.setpassword(b"wrong")
+        with pytest.raises(RuntimeError):
+            archive.read("src/a.txt")
+
+    extract_to = tmp_path / "extracted"
+    assert ZipUtil.extract_zip(output_zip, str(extract_to), password=PASSWORD)
+    assert read_tree(extract_to) == expected
+
+
+@pytest.mark.parametrize("compression", ["stored", "deflated", "bzip2", "lzma"])
+def test_create_zip_without_password(tmp_path, source_dir, compression):
+    output_zip = str(tmp_path / "out.zip")
+    assert ZipUtil.create_zip([str(source_dir)], output_zip, compression=compression)
+
+    expected = {f"src/{name}": data for name, data in read_tree(source_dir).items()}
+    with zipfile.ZipFile(output_zip) as archive:
+        assert archive.testzip() is None
+        assert not any(info.flag_bits & 0x01 for info in archive.infolist())
+        assert {info.filename: archive.read(info) for info in archive.infolist()} == expected
+        assert archive.getinfo("src/c.pdf").compress_type == zipfile.ZIP_STORED
+        assert archive.getinfo("src/a.txt").compress_type == COMPRESSION_METHODS[compression]
+